@@ -0,0 +1,303 @@
+"""
+Alertas vigentes materializadas (tabla alertas_activas)
+
+Cada préstamo tiene a lo más una fila por tipo de alerta:
+  - VENCIDO: préstamo activo con fecha de vencimiento pasada
+  - POR_VENCER: préstamo ASIGNADO que vence dentro de DIAS_POR_VENCER días
+  - DESPIDO: préstamo activo de un trabajador inactivo
+  - PROBLEMA: préstamo devuelto sin cargador o con el equipo en mal estado
+
+Los endpoints de préstamos y trabajadores la actualizan antes de hacer commit
+(igual que equipos_estado). Las alertas que dependen del reloj las mueve la
+tarea de vencimientos (sincronizar_vencimientos); entre ejecuciones, una fila
+POR_VENCER cuya fecha ya pasó se informa como VENCIDO. reconstruir() la calcula
+completa desde préstamos y trabajadores (scripts/reconstruir_alertas.py).
+
+Las alertas nuevas emiten ALERTAS_CREADAS (una por obra) para el stream SSE.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import and_, or_, exists, func, literal, select, union_all, update, delete
+from sqlalchemy.orm import Session
+from .models import AlertaActiva, Prestamo, Trabajador, Equipo, EstadoPrestamo, ESTADOS_ACTIVOS
+from .problemas_devolucion import condicion_problema_pendiente, problemas
+from . import eventos
+
+VENCIDO = "VENCIDO"
+POR_VENCER = "POR_VENCER"
+DESPIDO = "DESPIDO"
+PROBLEMA = "PROBLEMA"
+
+# Días antes del vencimiento en que un préstamo pasa a "por vencer"
+DIAS_POR_VENCER = 3
+
+_COLUMNAS = ["tipo", "prestamo_id", "obra", "fecha_vencimiento"]
+
+
+# ============ CÁLCULO DESDE PRÉSTAMOS ============
+
+def _condiciones(ahora: datetime) -> Dict[str, object]:
+    return {
+        VENCIDO: and_(
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS),
+            Prestamo.fecha_vencimiento < ahora
+        ),
+        POR_VENCER: and_(
+            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
+            Prestamo.fecha_vencimiento >= ahora,
+            Prestamo.fecha_vencimiento < ahora + timedelta(days=DIAS_POR_VENCER)
+        ),
+        DESPIDO: and_(
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS),
+            Trabajador.activo == False
+        ),
+        PROBLEMA: condicion_problema_pendiente(),
+    }
+
+
+def _seleccion(tipo: str, condicion):
+    """SELECT con las columnas de alertas_activas para un tipo de alerta"""
+    return select(
+        literal(tipo).label("tipo"),
+        Prestamo.id.label("prestamo_id"),
+        Trabajador.obra.label("obra"),
+        Prestamo.fecha_vencimiento.label("fecha_vencimiento"),
+    ).select_from(Prestamo).join(
+        Trabajador, Trabajador.rut == Prestamo.trabajador_rut
+    ).where(condicion)
+
+
+def consulta_calculada(ahora: datetime):
+    """Todas las alertas calculadas desde préstamos y trabajadores, en un solo UNION ALL"""
+    return union_all(*[
+        _seleccion(tipo, condicion) for tipo, condicion in _condiciones(ahora).items()
+    ])
+
+
+def _sin_alerta(tipo: str):
+    return ~exists().where(and_(AlertaActiva.prestamo_id == Prestamo.id, AlertaActiva.tipo == tipo))
+
+
+def _insertar_calculadas(db: Session, tipo: str, condicion) -> int:
+    """INSERT ... SELECT de las alertas de un tipo que aún no tienen fila"""
+    filas = db.execute(
+        AlertaActiva.__table__.insert().from_select(
+            _COLUMNAS, _seleccion(tipo, and_(condicion, _sin_alerta(tipo)))
+        ).returning(AlertaActiva.tipo, AlertaActiva.prestamo_id, AlertaActiva.obra)
+    ).all()
+    _emitir_creadas(db, [fila._asdict() for fila in filas])
+    return len(filas)
+
+
+def _emitir_creadas(db: Session, filas: List[dict]) -> None:
+    """Un evento de alertas nuevas por obra"""
+    por_obra: Dict[str, List[dict]] = {}
+    for fila in filas:
+        por_obra.setdefault(fila["obra"], []).append(fila)
+    for obra, alertas in por_obra.items():
+        eventos.emitir(
+            db, eventos.ALERTAS_CREADAS, obra=obra,
+            alertas=[{"tipo": a["tipo"], "prestamo_id": a["prestamo_id"]} for a in alertas]
+        )
+
+
+# ============ ACTUALIZACIÓN ============
+
+def _insertar(db: Session, filas: List[dict]) -> None:
+    if filas:
+        db.execute(AlertaActiva.__table__.insert(), [
+            {"creada_en": datetime.utcnow(), **fila} for fila in filas
+        ])
+        _emitir_creadas(db, filas)
+
+
+def _resolver(db: Session, prestamo_ids: List[int], tipos: Optional[List[str]] = None) -> None:
+    """Elimina las alertas de esos préstamos (opcionalmente solo de algunos tipos)"""
+    if not prestamo_ids:
+        return
+    sentencia = delete(AlertaActiva).where(AlertaActiva.prestamo_id.in_(prestamo_ids))
+    if tipos:
+        sentencia = sentencia.where(AlertaActiva.tipo.in_(tipos))
+    db.execute(sentencia, execution_options={"synchronize_session": False})
+
+
+def _alertas_vencimiento(prestamo_id: int, obra: str, fecha_vencimiento: datetime, ahora: datetime) -> List[dict]:
+    if fecha_vencimiento < ahora:
+        tipo = VENCIDO
+    elif fecha_vencimiento < ahora + timedelta(days=DIAS_POR_VENCER):
+        tipo = POR_VENCER
+    else:
+        return []
+    return [{"tipo": tipo, "prestamo_id": prestamo_id, "obra": obra, "fecha_vencimiento": fecha_vencimiento}]
+
+
+def registrar_prestamos(db: Session, prestamos: List[dict]) -> None:
+    """Préstamos nuevos (dicts con prestamo_id, obra y fecha_vencimiento; requiere flush)"""
+    ahora = datetime.utcnow()
+    filas = []
+    for p in prestamos:
+        filas += _alertas_vencimiento(p["prestamo_id"], p["obra"], p["fecha_vencimiento"], ahora)
+    _insertar(db, filas)
+
+
+def registrar_devoluciones(db: Session, devoluciones: List[dict]) -> None:
+    """Préstamos devueltos (dicts con prestamo_id, obra y problema): se resuelven sus
+    alertas y se crea la de problema de devolución si corresponde"""
+    _resolver(db, [d["prestamo_id"] for d in devoluciones])
+    _insertar(db, [
+        {"tipo": PROBLEMA, "prestamo_id": d["prestamo_id"], "obra": d["obra"], "fecha_vencimiento": None}
+        for d in devoluciones if d["problema"]
+    ])
+
+
+def registrar_cargador_devuelto(db: Session, prestamo: Prestamo) -> None:
+    """Se entregó el cargador después: la alerta de problema se resuelve si no queda otro"""
+    if not problemas(prestamo):
+        _resolver(db, [prestamo.id], [PROBLEMA])
+
+
+def registrar_eliminacion_prestamo(db: Session, prestamo: Prestamo) -> None:
+    _resolver(db, [prestamo.id])
+
+
+def registrar_eliminacion_equipo(db: Session, equipo_id: int) -> None:
+    db.execute(
+        delete(AlertaActiva).where(
+            AlertaActiva.prestamo_id.in_(select(Prestamo.id).where(Prestamo.equipo_id == equipo_id))
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def _prestamos_activos_de(rut: str):
+    return select(Prestamo.id).where(
+        and_(Prestamo.trabajador_rut == rut, Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS))
+    )
+
+
+def registrar_cambio_activo(db: Session, rut: str, activo: bool) -> None:
+    """Despido (alerta por cada préstamo activo) o reintegro (se resuelven)"""
+    if activo:
+        db.execute(
+            delete(AlertaActiva).where(
+                and_(AlertaActiva.tipo == DESPIDO, AlertaActiva.prestamo_id.in_(_prestamos_activos_de(rut)))
+            ),
+            execution_options={"synchronize_session": False}
+        )
+    else:
+        _insertar_calculadas(db, DESPIDO, and_(
+            Prestamo.trabajador_rut == rut,
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
+        ))
+
+
+def registrar_cambio_obra(db: Session, rut: str, obra: str) -> None:
+    """El trabajador cambió de obra: sus alertas pasan a esa obra"""
+    db.execute(
+        update(AlertaActiva).where(
+            AlertaActiva.prestamo_id.in_(select(Prestamo.id).where(Prestamo.trabajador_rut == rut))
+        ).values(obra=obra),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def sincronizar_vencimientos(db: Session, ahora: Optional[datetime] = None) -> int:
+    """Alertas que dependen del reloj: por vencer que ya vencieron y préstamos que entran en las ventanas"""
+    ahora = ahora or datetime.utcnow()
+    reclasificadas = db.execute(
+        update(AlertaActiva).where(
+            and_(AlertaActiva.tipo == POR_VENCER, AlertaActiva.fecha_vencimiento < ahora)
+        ).values(tipo=VENCIDO).returning(AlertaActiva.prestamo_id, AlertaActiva.obra),
+        execution_options={"synchronize_session": False}
+    ).all()
+    # Para los clientes, una por vencer que venció es una alerta de vencido nueva
+    _emitir_creadas(db, [
+        {"tipo": VENCIDO, "prestamo_id": fila.prestamo_id, "obra": fila.obra} for fila in reclasificadas
+    ])
+    condiciones = _condiciones(ahora)
+    return (
+        _insertar_calculadas(db, VENCIDO, condiciones[VENCIDO])
+        + _insertar_calculadas(db, POR_VENCER, condiciones[POR_VENCER])
+    )
+
+
+# ============ LECTURA ============
+
+def tipo_vigente(tipo: str, fecha_vencimiento: Optional[datetime], ahora: datetime) -> str:
+    """Tipo a informar (una fila POR_VENCER vencida desde la última sincronización es VENCIDO)"""
+    if tipo == POR_VENCER and fecha_vencimiento is not None and fecha_vencimiento < ahora:
+        return VENCIDO
+    return tipo
+
+
+def consulta(db: Session, tipos: List[str], obra: Optional[str] = None):
+    """Alertas de esos tipos con serie del equipo y nombre del trabajador"""
+    query = db.query(
+        AlertaActiva.tipo,
+        AlertaActiva.obra,
+        AlertaActiva.fecha_vencimiento,
+        Equipo.serie.label("equipo_serie"),
+        Trabajador.nombre.label("trabajador_nombre"),
+    ).join(
+        Prestamo, Prestamo.id == AlertaActiva.prestamo_id
+    ).join(
+        Equipo, Equipo.id == Prestamo.equipo_id
+    ).join(
+        Trabajador, Trabajador.rut == Prestamo.trabajador_rut
+    ).filter(AlertaActiva.tipo.in_(tipos))
+    if obra:
+        query = query.filter(AlertaActiva.obra == obra)
+    return query
+
+
+def condicion_pendiente(ahora: datetime):
+    """Condición SQL: alerta que cuenta como pendiente (vencido, despido o problema)"""
+    return or_(
+        AlertaActiva.tipo.in_([VENCIDO, DESPIDO, PROBLEMA]),
+        and_(AlertaActiva.tipo == POR_VENCER, AlertaActiva.fecha_vencimiento < ahora)
+    )
+
+
+def contar_pendientes(db: Session, ahora: Optional[datetime] = None) -> int:
+    """Vencidos, despidos y problemas de devolución (badge del dashboard)"""
+    ahora = ahora or datetime.utcnow()
+    return db.query(func.count(AlertaActiva.id)).filter(condicion_pendiente(ahora)).scalar() or 0
+
+
+# ============ RECONSTRUCCIÓN Y VERIFICACIÓN ============
+
+def verificar(db: Session) -> List[dict]:
+    """Diferencias entre la tabla y las alertas calculadas (faltantes y sobrantes)"""
+    ahora = datetime.utcnow()
+    esperadas = {(fila.prestamo_id, fila.tipo): fila.obra for fila in db.execute(consulta_calculada(ahora))}
+    actuales = {
+        (fila.prestamo_id, tipo_vigente(fila.tipo, fila.fecha_vencimiento, ahora)): fila.obra
+        for fila in db.query(AlertaActiva.prestamo_id, AlertaActiva.tipo, AlertaActiva.obra, AlertaActiva.fecha_vencimiento)
+    }
+    diferencias = []
+    for clave in esperadas.keys() | actuales.keys():
+        if esperadas.get(clave) != actuales.get(clave):
+            diferencias.append({
+                "prestamo_id": clave[0], "tipo": clave[1],
+                "esperado": esperadas.get(clave), "actual": actuales.get(clave)
+            })
+    return diferencias
+
+
+def reconstruir(db: Session) -> int:
+    """Reconstruye por completo la tabla. Retorna la cantidad de alertas."""
+    db.query(AlertaActiva).delete(synchronize_session=False)
+    calculadas = consulta_calculada(datetime.utcnow()).subquery()
+    db.execute(AlertaActiva.__table__.insert().from_select(_COLUMNAS, select(calculadas)))
+    return db.query(func.count(AlertaActiva.id)).scalar() or 0
+
+
+def reconstruir_si_vacia(db: Session) -> Optional[int]:
+    """Reconstruye la tabla si está vacía y hay préstamos (primer despliegue)"""
+    if db.query(AlertaActiva.id).first() is not None:
+        return None
+    if db.query(Prestamo.id).first() is None:
+        return None
+    total = reconstruir(db)
+    db.commit()
+    return total
@@ -0,0 +1,110 @@
+"""
+Archivo de préstamos devueltos (tabla prestamos_historico)
+
+La tabla prestamos conserva los préstamos activos y los devueltos recientes;
+los devueltos hace más de PRESTAMOS_ARCHIVO_DIAS días se mueven por lotes a
+prestamos_historico, conservando su id. No se archivan:
+  - el último préstamo devuelto de cada equipo (lo referencia equipos_estado)
+  - los devueltos con problemas pendientes (sin cargador o en mal estado), que
+    siguen apareciendo en alertas, estadísticas y marcar-cargador-devuelto
+
+Los historiales por trabajador y por equipo leen ambas tablas con
+historial_prestamos(); el ranking de equipos más prestados del dashboard y el
+resumen diario (estadisticas_diarias) también cuentan los archivados.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Union
+from sqlalchemy import and_, not_, select, insert, delete
+from sqlalchemy.orm import Session, selectinload
+from .models import Prestamo, PrestamoHistorico, EquipoEstado, EstadoPrestamo
+from .problemas_devolucion import condicion_problema_pendiente
+
+TAREA_ARCHIVO = "archivar_prestamos"
+ARCHIVO_DIAS = int(os.getenv("PRESTAMOS_ARCHIVO_DIAS", "365"))
+ARCHIVO_LOTE = int(os.getenv("PRESTAMOS_ARCHIVO_LOTE", "1000"))
+INTERVALO_ARCHIVO = int(os.getenv("TAREA_ARCHIVO_INTERVALO", "86400"))
+
+# Columnas que se copian tal cual de prestamos a prestamos_historico
+_COLUMNAS = [columna.name for columna in Prestamo.__table__.columns]
+
+
+def condicion_archivable(antes_de: datetime):
+    """Préstamos devueltos antes de `antes_de` que se pueden mover al archivo"""
+    ultimos_devueltos = select(EquipoEstado.ultimo_prestamo_devuelto_id).where(
+        EquipoEstado.ultimo_prestamo_devuelto_id.isnot(None)
+    )
+    return and_(
+        Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
+        Prestamo.fecha_devolucion < antes_de,
+        not_(condicion_problema_pendiente()),
+        Prestamo.id.notin_(ultimos_devueltos)
+    )
+
+
+def archivar_prestamos(
+    db: Session,
+    dias: int = ARCHIVO_DIAS,
+    lote: int = ARCHIVO_LOTE,
+    max_lotes: Optional[int] = None
+) -> int:
+    """Mueve los préstamos archivables por lotes, con un commit por lote. Retorna la cantidad."""
+    antes_de = datetime.utcnow() - timedelta(days=dias)
+    columnas_origen = [Prestamo.__table__.c[nombre] for nombre in _COLUMNAS]
+    total = 0
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        ids = db.execute(
+            select(Prestamo.id).where(condicion_archivable(antes_de)).order_by(Prestamo.id).limit(lote)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(
+            insert(PrestamoHistorico).from_select(
+                _COLUMNAS, select(*columnas_origen).where(Prestamo.id.in_(ids))
+            )
+        )
+        db.execute(
+            delete(Prestamo).where(Prestamo.id.in_(ids)),
+            execution_options={"synchronize_session": False}
+        )
+        db.commit()
+        total += len(ids)
+        lotes += 1
+    return total
+
+
+def _historial(db: Session, modelo, columna: str, valor) -> list:
+    return db.query(modelo).options(
+        selectinload(modelo.equipo),
+        selectinload(modelo.trabajador)
+    ).filter(
+        getattr(modelo, columna) == valor
+    ).order_by(modelo.fecha_prestamo.desc(), modelo.id.desc()).all()
+
+
+def historial_prestamos(
+    db: Session,
+    rut: Optional[str] = None,
+    equipo_id: Optional[int] = None
+) -> List[Union[Prestamo, PrestamoHistorico]]:
+    """Préstamos de un trabajador o de un equipo en ambas tablas, del más reciente al más antiguo"""
+    columna, valor = ("trabajador_rut", rut) if rut is not None else ("equipo_id", equipo_id)
+    recientes = _historial(db, Prestamo, columna, valor)
+    archivados = _historial(db, PrestamoHistorico, columna, valor)
+    if not archivados:
+        return recientes
+    # Los archivados son devoluciones antiguas: casi siempre van al final
+    return sorted(
+        recientes + archivados,
+        key=lambda prestamo: (prestamo.fecha_prestamo, prestamo.id),
+        reverse=True
+    )
+
+
+def obtener_prestamo(db: Session, prestamo_id: int) -> Optional[Union[Prestamo, PrestamoHistorico]]:
+    """Préstamo por id, buscando también en el archivo"""
+    prestamo = db.query(Prestamo).filter(Prestamo.id == prestamo_id).first()
+    if prestamo is None:
+        prestamo = db.get(PrestamoHistorico, prestamo_id)
+    return prestamo
@@ -111,11 +111,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Usuario:
-    """Obtiene usuario actual desde token JWT"""
+def usuario_desde_token(token: str, db: Session) -> Usuario:
+    """Valida el token JWT y retorna el usuario activo (401 si no es válido)"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
@@ -135,6 +132,14 @@ def get_current_user(
     return user
 
 
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Usuario:
+    """Obtiene usuario actual desde token JWT"""
+    return usuario_desde_token(token, db)
+
+
 def require_role(allowed_roles: list[RolUsuario]):
     """Dependency para verificar rol de usuario"""
     def role_checker(current_user: Usuario = Depends(get_current_user)):
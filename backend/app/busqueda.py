@@ -0,0 +1,187 @@
+"""
+Búsqueda por subcadena de equipos (serie, marca, modelo, tipo)
+
+En PostgreSQL las búsquedas ILIKE '%texto%' se apoyan en índices GIN de
+trigramas (pg_trgm). En otros motores (SQLite en desarrollo) se mantiene la
+tabla equipos_ngramas con los trigramas de cada campo, que reduce los
+candidatos antes de verificar la subcadena.
+"""
+from typing import Iterable, Mapping, Sequence
+from sqlalchemy import case, event, func, inspect, or_, select, text
+from sqlalchemy.orm import Query, Session
+from .models import Equipo, EquipoNgrama
+
+CAMPOS_SERIE = ("serie",)
+CAMPOS_NOMBRE = ("tipo", "marca", "modelo")
+CAMPOS_TODOS = ("serie", "tipo", "marca", "modelo")
+
+LARGO_NGRAMA = 3
+
+# Relevancia: menor es mejor
+RELEVANCIA_SERIE_EXACTA = 0
+RELEVANCIA_SERIE_PREFIJO = 1
+RELEVANCIA_SERIE_CONTIENE = 2
+RELEVANCIA_OTRO_PREFIJO = 3
+RELEVANCIA_OTRO_CONTIENE = 4
+
+
+def _usa_trigramas(bind) -> bool:
+    return bind.dialect.name == "postgresql"
+
+
+def ngramas(valor: str) -> set:
+    """Trigramas (en minúsculas) de un valor"""
+    valor = (valor or "").lower()
+    return {valor[i:i + LARGO_NGRAMA] for i in range(len(valor) - LARGO_NGRAMA + 1)}
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _columna(campo: str):
+    return getattr(Equipo, campo)
+
+
+def condicion(db: Session, texto: str, campos: Sequence[str] = CAMPOS_TODOS):
+    """Condición SQL: alguno de los campos contiene el texto (sin distinguir mayúsculas)"""
+    texto = texto.strip()
+    patron = f"%{_escapar_like(texto)}%"
+    contiene = or_(*[_columna(campo).ilike(patron, escape="\\") for campo in campos])
+
+    gramas = ngramas(texto)
+    if _usa_trigramas(db.get_bind()) or not gramas:
+        return contiene
+
+    # Candidatos: equipos que tienen todos los trigramas del texto en un mismo campo
+    candidatos = select(EquipoNgrama.equipo_id).where(
+        EquipoNgrama.campo.in_(campos),
+        EquipoNgrama.ngrama.in_(gramas)
+    ).group_by(
+        EquipoNgrama.equipo_id, EquipoNgrama.campo
+    ).having(func.count(func.distinct(EquipoNgrama.ngrama)) == len(gramas))
+    return Equipo.id.in_(candidatos) & contiene
+
+
+def relevancia(texto: str, campos: Sequence[str] = CAMPOS_TODOS):
+    """Expresión SQL de relevancia (0 = coincidencia exacta de serie)"""
+    texto = texto.strip()
+    prefijo = f"{_escapar_like(texto)}%"
+    contiene = f"%{_escapar_like(texto)}%"
+    condiciones = []
+    if "serie" in campos:
+        condiciones += [
+            (func.lower(Equipo.serie) == texto.lower(), RELEVANCIA_SERIE_EXACTA),
+            (Equipo.serie.ilike(prefijo, escape="\\"), RELEVANCIA_SERIE_PREFIJO),
+            (Equipo.serie.ilike(contiene, escape="\\"), RELEVANCIA_SERIE_CONTIENE),
+        ]
+    otros = [campo for campo in campos if campo != "serie"]
+    if otros:
+        condiciones.append((
+            or_(*[_columna(campo).ilike(prefijo, escape="\\") for campo in otros]),
+            RELEVANCIA_OTRO_PREFIJO
+        ))
+    return case(*condiciones, else_=RELEVANCIA_OTRO_CONTIENE)
+
+
+def calcular_relevancia(equipo: Equipo, texto: str, campos: Sequence[str] = CAMPOS_TODOS) -> int:
+    """Misma relevancia que relevancia(), calculada sobre un equipo ya cargado"""
+    texto = texto.strip().lower()
+    if "serie" in campos:
+        serie = (equipo.serie or "").lower()
+        if serie == texto:
+            return RELEVANCIA_SERIE_EXACTA
+        if serie.startswith(texto):
+            return RELEVANCIA_SERIE_PREFIJO
+        if texto in serie:
+            return RELEVANCIA_SERIE_CONTIENE
+    if any((getattr(equipo, campo) or "").lower().startswith(texto) for campo in campos if campo != "serie"):
+        return RELEVANCIA_OTRO_PREFIJO
+    return RELEVANCIA_OTRO_CONTIENE
+
+
+def buscar_equipos(db: Session, texto: str, campos: Sequence[str] = CAMPOS_TODOS) -> Query:
+    """Consulta de equipos que coinciden con el texto, ordenados por relevancia"""
+    return db.query(Equipo).filter(
+        condicion(db, texto, campos)
+    ).order_by(relevancia(texto, campos), Equipo.id)
+
+
+# ============ MANTENCIÓN DEL ÍNDICE ============
+
+def indexar_equipos(conexion, equipos: Iterable[Mapping]) -> None:
+    """Regenera los n-gramas de los equipos dados (dicts con id y campos).
+
+    No hace nada en PostgreSQL, donde el índice lo mantiene el propio motor.
+    """
+    if _usa_trigramas(conexion):
+        return
+    equipos = list(equipos)
+    if not equipos:
+        return
+    ids = [equipo["id"] for equipo in equipos]
+    conexion.execute(EquipoNgrama.__table__.delete().where(EquipoNgrama.equipo_id.in_(ids)))
+    filas = [
+        {"equipo_id": equipo["id"], "campo": campo, "ngrama": grama}
+        for equipo in equipos
+        for campo in CAMPOS_TODOS
+        for grama in ngramas(equipo.get(campo))
+    ]
+    if filas:
+        conexion.execute(EquipoNgrama.__table__.insert(), filas)
+
+
+def desindexar_equipos(conexion, equipo_ids: Iterable[int]) -> None:
+    if _usa_trigramas(conexion):
+        return
+    conexion.execute(EquipoNgrama.__table__.delete().where(EquipoNgrama.equipo_id.in_(list(equipo_ids))))
+
+
+def reindexar(db: Session) -> int:
+    """Reconstruye por completo la tabla de n-gramas. Retorna equipos indexados."""
+    filas = db.query(Equipo.id, *[_columna(campo) for campo in CAMPOS_TODOS]).all()
+    conexion = db.connection()
+    if _usa_trigramas(conexion):
+        return 0
+    conexion.execute(EquipoNgrama.__table__.delete())
+    indexar_equipos(conexion, [fila._asdict() for fila in filas])
+    return len(filas)
+
+
+def preparar_indices(engine) -> None:
+    """Crea los índices de búsqueda (idempotente)"""
+    with engine.begin() as conexion:
+        if _usa_trigramas(conexion):
+            conexion.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for campo in CAMPOS_TODOS:
+                conexion.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_equipos_{campo}_trgm "
+                    f"ON equipos USING gin ({campo} gin_trgm_ops)"
+                ))
+            return
+        # Indexar equipos existentes si la tabla de n-gramas está vacía
+        vacia = conexion.execute(select(EquipoNgrama.equipo_id).limit(1)).first() is None
+        if vacia:
+            filas = conexion.execute(select(Equipo.id, *[_columna(c) for c in CAMPOS_TODOS])).all()
+            indexar_equipos(conexion, [fila._asdict() for fila in filas])
+
+
+def datos_indice(equipo: Equipo) -> dict:
+    return {"id": equipo.id, **{campo: getattr(equipo, campo) for campo in CAMPOS_TODOS}}
+
+
+@event.listens_for(Equipo, "after_insert")
+def _indexar_equipo_nuevo(mapper, conexion, equipo):
+    indexar_equipos(conexion, [datos_indice(equipo)])
+
+
+@event.listens_for(Equipo, "after_update")
+def _indexar_equipo_modificado(mapper, conexion, equipo):
+    estado = inspect(equipo)
+    if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_TODOS):
+        indexar_equipos(conexion, [datos_indice(equipo)])
+
+
+@event.listens_for(Equipo, "after_delete")
+def _desindexar_equipo(mapper, conexion, equipo):
+    desindexar_equipos(conexion, [equipo.id])
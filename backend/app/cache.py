@@ -0,0 +1,115 @@
+"""
+Caché en memoria con expiración (TTL) y tamaño acotado
+
+obtener_o_calcular() agrupa los fallos concurrentes de una misma clave: solo
+el primero calcula el valor y el resto espera su resultado. Un cálculo que
+empezó antes de invalidar() o limpiar() entrega su valor a quienes lo
+esperaban pero no lo guarda.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class _Calculo:
+    """Cálculo en curso de una clave, que esperan los demás requests"""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.valor: Any = None
+        self.error: Optional[BaseException] = None
+
+    def esperar(self) -> Any:
+        self.listo.wait()
+        if self.error is not None:
+            raise self.error
+        return self.valor
+
+
+class CacheTTL:
+    """Caché LRU acotado cuyas entradas expiran después de `ttl` segundos"""
+
+    def __init__(self, ttl: float, maximo: int = 1000):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._datos: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._en_curso: Dict[Hashable, _Calculo] = {}
+        # Aumenta con cada invalidación (los cálculos anteriores no se guardan)
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.agrupados = 0
+
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] <= ahora:
+                if entrada is not None:
+                    del self._datos[clave]
+                self.fallos += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._guardar(clave, valor)
+
+    def _guardar(self, clave: Hashable, valor: Any) -> None:
+        self._datos[clave] = (time.monotonic() + self.ttl, valor)
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.maximo:
+            self._datos.popitem(last=False)
+
+    def obtener_o_calcular(self, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+        valor = self.obtener(clave)
+        if valor is not None:
+            return valor
+        with self._lock:
+            calculo = self._en_curso.get(clave)
+            propio = calculo is None
+            if propio:
+                calculo = self._en_curso[clave] = _Calculo()
+                generacion = self._generacion
+            else:
+                self.agrupados += 1
+        if not propio:
+            return calculo.esperar()
+        try:
+            calculo.valor = calcular()
+        except BaseException as e:
+            calculo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+                if calculo.error is None and calculo.valor is not None and generacion == self._generacion:
+                    self._guardar(clave, calculo.valor)
+            calculo.listo.set()
+        return calculo.valor
+
+    def invalidar(self, clave: Hashable) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+            self._generacion += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self._generacion += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "maximo": self.maximo,
+                "ttl_segundos": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "agrupados": self.agrupados,
+                "en_curso": len(self._en_curso),
+            }
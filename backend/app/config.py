@@ -17,6 +17,14 @@ class Settings(BaseSettings):
     # Gemini API (opcional para asistente IA)
     GEMINI_API_KEY: str = ""
     
+    # SMTP para el resumen diario de alertas (scripts/enviar_correos.py)
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 1025
+    SMTP_USUARIO: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_TLS: bool = False
+    SMTP_REMITENTE: str = "alertas@aura-mineria.local"
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -25,6 +25,21 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+def crear_indices_faltantes(tabla) -> list:
+    """Crea los índices declarados en el modelo que no existen en la base.
+
+    create_all no agrega índices nuevos a tablas ya creadas. Retorna los
+    errores (nombre del índice, excepción) sin detenerse en el primero.
+    """
+    errores = []
+    for indice in tabla.indexes:
+        try:
+            indice.create(bind=engine, checkfirst=True)
+        except Exception as e:
+            errores.append((indice.name, e))
+    return errores
+
+
 def get_db():
     """Dependency para obtener sesión de base de datos"""
     db = SessionLocal()
@@ -0,0 +1,115 @@
+"""
+Difusión de eventos a clientes conectados por SSE (/api/eventos/stream)
+
+Cada cliente tiene una cola acotada en el event loop; los eventos confirmados
+(ver eventos.py) se le entregan con call_soon_threadsafe porque los commits
+ocurren en hilos del threadpool. Si la cola de un cliente se llena, se vacía y
+se le envía un evento "resincronizar" para que recargue sus datos.
+
+Los clientes JEFE_OBRA solo reciben eventos de su obra. La difusión es por
+proceso: con varios workers cada uno atiende a sus propios clientes.
+"""
+import asyncio
+import os
+import threading
+from typing import Dict, Optional, Set
+
+from . import eventos
+from .models import RolUsuario
+
+COLA_MAXIMA = int(os.getenv("SSE_COLA_MAXIMA", "100"))
+MAX_CLIENTES = int(os.getenv("SSE_MAX_CLIENTES", "200"))
+
+RESINCRONIZAR = "resincronizar"
+
+# Eventos que se envían a los clientes
+TIPOS_DIFUNDIDOS = {
+    eventos.PRESTAMO_CREADO,
+    eventos.PRESTAMO_DEVUELTO,
+    eventos.PRESTAMO_ELIMINADO,
+    eventos.PRESTAMO_ACTUALIZADO,
+    eventos.PRESTAMOS_VENCIDOS,
+    eventos.TRABAJADOR_ACTUALIZADO,
+    eventos.TRABAJADOR_DESPEDIDO,
+    eventos.ALERTAS_CREADAS,
+    eventos.EQUIPO_ACTUALIZADO,
+    eventos.EQUIPO_ELIMINADO,
+    eventos.EQUIPOS_CREADOS,
+}
+
+
+class ClienteSSE:
+    """Conexión de un usuario: su cola y la obra a la que está acotado"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, rol: RolUsuario, obra: Optional[str], maximo: int):
+        self.loop = loop
+        self.rol = rol
+        self.obra = obra
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=maximo)
+        self.descartados = 0
+
+    def acepta(self, evento: Dict) -> bool:
+        if self.rol == RolUsuario.JEFE_OBRA:
+            return self.obra is not None and evento.get("obra") == self.obra
+        return True
+
+    def entregar(self, evento: Dict) -> None:
+        """Encolar un evento (se ejecuta en el event loop del cliente)"""
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # El cliente no alcanza a consumir: se descarta lo pendiente y debe recargar
+            self.descartados += self.cola.qsize()
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait({"tipo": RESINCRONIZAR})
+
+
+class Difusor:
+    def __init__(self, maximo_cola: int = COLA_MAXIMA, max_clientes: int = MAX_CLIENTES):
+        self.maximo_cola = maximo_cola
+        self.max_clientes = max_clientes
+        self._clientes: Set[ClienteSSE] = set()
+        self._lock = threading.Lock()
+        self._publicados = 0
+
+    def conectar(self, rol: RolUsuario, obra: Optional[str]) -> Optional[ClienteSSE]:
+        """Registrar un cliente (llamar desde el event loop). None si se alcanzó el máximo."""
+        cliente = ClienteSSE(asyncio.get_running_loop(), rol, obra, self.maximo_cola)
+        with self._lock:
+            if len(self._clientes) >= self.max_clientes:
+                return None
+            self._clientes.add(cliente)
+        return cliente
+
+    def desconectar(self, cliente: ClienteSSE) -> None:
+        with self._lock:
+            self._clientes.discard(cliente)
+
+    def publicar(self, evento: Dict) -> None:
+        """Entregar un evento a los clientes que corresponda (desde cualquier hilo)"""
+        if evento["tipo"] not in TIPOS_DIFUNDIDOS:
+            return
+        with self._lock:
+            clientes = [cliente for cliente in self._clientes if cliente.acepta(evento)]
+            self._publicados += 1
+        for cliente in clientes:
+            try:
+                cliente.loop.call_soon_threadsafe(cliente.entregar, evento)
+            except RuntimeError:
+                # Event loop cerrado (apagado del servidor)
+                self.desconectar(cliente)
+
+    def estadisticas(self) -> Dict:
+        with self._lock:
+            return {
+                "clientes": len(self._clientes),
+                "max_clientes": self.max_clientes,
+                "cola_maxima": self.maximo_cola,
+                "publicados": self._publicados,
+                "descartados": sum(cliente.descartados for cliente in self._clientes),
+            }
+
+
+difusor = Difusor()
+eventos.suscribir(difusor.publicar)
@@ -0,0 +1,388 @@
+"""
+Resumen diario de préstamos (tabla estadisticas_diarias)
+
+Una fila por día, obra y tipo de equipo con los préstamos creados, devueltos y
+vencidos ese día y los activos al cierre. Los gráficos históricos del dashboard
+leen esta tabla en vez de recorrer prestamos y prestamos_historico.
+
+Los endpoints de préstamos y equipos suman los contadores (prestados, devueltos,
+vencidos) antes de hacer commit, igual que alertas_activas; la tarea de
+vencimientos suma los vencidos que marca. La compactación (tarea diaria o
+scripts/compactar_estadisticas.py) recalcula los últimos días desde los
+préstamos, corrige diferencias y escribe activos; con --todo reconstruye todo
+el historial. La obra y el tipo son los actuales del trabajador y el equipo:
+al cambiar la obra de un trabajador o el tipo de un equipo se mueven los
+contadores de sus préstamos (los activos de días pasados se corrigen al
+recalcular esos días).
+"""
+import os
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, func, literal, or_, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from .models import EstadisticaDiaria, Prestamo, PrestamoHistorico, Equipo, Trabajador, EstadoPrestamo
+from . import series
+
+TAREA_COMPACTACION = "compactar_estadisticas"
+INTERVALO_COMPACTACION = int(os.getenv("TAREA_ESTADISTICAS_INTERVALO", "86400"))
+# Días hacia atrás que recalcula la compactación (incluye hoy)
+DIAS_COMPACTACION = int(os.getenv("ESTADISTICAS_DIAS_COMPACTACION", "2"))
+# Días por transacción al reconstruir todo el historial
+DIAS_POR_LOTE = 92
+
+CONTADORES = ("prestados", "devueltos", "vencidos")
+
+Clave = Tuple[date, str, str]
+
+
+# ============ ACTUALIZACIÓN INCREMENTAL ============
+
+def _sumar(db: Session, deltas: Dict[Clave, Dict[str, int]]) -> None:
+    """Suma los deltas a las filas del día (INSERT ... ON CONFLICT DO UPDATE)"""
+    filas = [
+        {"fecha": fecha, "obra": obra, "tipo": tipo, "activos": 0,
+         **{contador: valores.get(contador, 0) for contador in CONTADORES}}
+        for (fecha, obra, tipo), valores in deltas.items()
+        if any(valores.values())
+    ]
+    if not filas:
+        return
+    dialecto = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    tabla = EstadisticaDiaria.__table__
+    sentencia = dialecto.insert(tabla)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.fecha, tabla.c.obra, tabla.c.tipo],
+        set_={contador: tabla.c[contador] + sentencia.excluded[contador] for contador in CONTADORES}
+    )
+    db.execute(sentencia, filas)
+
+
+def _agregar(deltas: Dict[Clave, Dict[str, int]], fecha: datetime, obra: Optional[str], tipo: Optional[str], contador: str, cantidad: int = 1) -> None:
+    clave = (fecha.date(), obra or "", tipo or "")
+    valores = deltas.setdefault(clave, {})
+    valores[contador] = valores.get(contador, 0) + cantidad
+
+
+def vencido_sin_marcar(estado: EstadoPrestamo, fecha_vencimiento: datetime, ahora: datetime) -> bool:
+    """Préstamo ASIGNADO ya vencido que la tarea de vencimientos aún no cuenta"""
+    return estado == EstadoPrestamo.ASIGNADO and fecha_vencimiento < ahora
+
+
+def registrar_prestamos(db: Session, prestamos: List[Dict]) -> None:
+    """Préstamos creados: dicts con fecha, obra y tipo"""
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    for prestamo in prestamos:
+        _agregar(deltas, prestamo["fecha"], prestamo["obra"], prestamo["tipo"], "prestados")
+    _sumar(db, deltas)
+
+
+def registrar_devoluciones(db: Session, devoluciones: List[Dict]) -> None:
+    """Préstamos devueltos: dicts con fecha, obra, tipo, fecha_vencimiento y vencido_sin_marcar.
+
+    Un préstamo devuelto atrasado antes de que la tarea lo marque VENCIDO se
+    cuenta como vencido aquí.
+    """
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    for devolucion in devoluciones:
+        _agregar(deltas, devolucion["fecha"], devolucion["obra"], devolucion["tipo"], "devueltos")
+        if devolucion["vencido_sin_marcar"]:
+            _agregar(deltas, devolucion["fecha_vencimiento"], devolucion["obra"], devolucion["tipo"], "vencidos")
+    _sumar(db, deltas)
+
+
+def registrar_vencidos(db: Session, prestamo_ids: List[int]) -> None:
+    """Préstamos recién marcados VENCIDO (tarea de vencimientos)"""
+    if not prestamo_ids:
+        return
+    filas = db.query(Prestamo.fecha_vencimiento, Trabajador.obra, Equipo.tipo).join(
+        Equipo, Equipo.id == Prestamo.equipo_id
+    ).join(
+        Trabajador, Trabajador.rut == Prestamo.trabajador_rut
+    ).filter(Prestamo.id.in_(prestamo_ids))
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    for fila in filas:
+        _agregar(deltas, fila.fecha_vencimiento, fila.obra, fila.tipo, "vencidos")
+    _sumar(db, deltas)
+
+
+def registrar_eliminacion_prestamo(db: Session, prestamo) -> None:
+    """Descuenta un préstamo devuelto que se elimina del historial (Prestamo o PrestamoHistorico)"""
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    obra, tipo = prestamo.trabajador.obra, prestamo.equipo.tipo
+    _agregar(deltas, prestamo.fecha_prestamo, obra, tipo, "prestados", -1)
+    if prestamo.fecha_devolucion is not None:
+        _agregar(deltas, prestamo.fecha_devolucion, obra, tipo, "devueltos", -1)
+    if prestamo.fecha_vencimiento < (prestamo.fecha_devolucion or datetime.utcnow()):
+        _agregar(deltas, prestamo.fecha_vencimiento, obra, tipo, "vencidos", -1)
+    _sumar(db, deltas)
+
+
+def _registrados(db: Session, condicion_prestamos, condicion_historico):
+    """Préstamos vigentes y archivados con su estado, la obra del trabajador y el tipo del equipo
+    guardados (la sesión no hace autoflush: un cambio pendiente no se ve aquí)"""
+    def seleccion(modelo, condicion):
+        return select(
+            modelo.equipo_id,
+            modelo.estado_prestamo,
+            modelo.fecha_prestamo,
+            modelo.fecha_devolucion,
+            modelo.fecha_vencimiento,
+            Trabajador.obra,
+            Equipo.tipo,
+        ).join(Equipo, Equipo.id == modelo.equipo_id).join(
+            Trabajador, Trabajador.rut == modelo.trabajador_rut
+        ).where(condicion)
+    return db.execute(union_all(
+        seleccion(Prestamo, condicion_prestamos),
+        seleccion(PrestamoHistorico, condicion_historico)
+    )).all()
+
+
+def _mover(db: Session, filas, origen, destino) -> None:
+    """Pasa los contadores ya sumados de cada préstamo de origen(fila) a destino(fila) (obra, tipo).
+
+    Un ASIGNADO vencido aún no cuenta como vencido: lo suma la tarea de vencimientos.
+    """
+    ahora = datetime.utcnow()
+    deltas: Dict[Clave, Dict[str, int]] = {}
+    for fila in filas:
+        for (obra, tipo), cantidad in ((origen(fila), -1), (destino(fila), 1)):
+            _agregar(deltas, fila.fecha_prestamo, obra, tipo, "prestados", cantidad)
+            if fila.fecha_devolucion is not None:
+                _agregar(deltas, fila.fecha_devolucion, obra, tipo, "devueltos", cantidad)
+            if fila.estado_prestamo != EstadoPrestamo.ASIGNADO and fila.fecha_vencimiento < (fila.fecha_devolucion or ahora):
+                _agregar(deltas, fila.fecha_vencimiento, obra, tipo, "vencidos", cantidad)
+    _sumar(db, deltas)
+
+
+def registrar_cambio_obra(db: Session, rut: str, obra_anterior: Optional[str], obra_nueva: Optional[str]) -> None:
+    """Mueve a la nueva obra los contadores de los préstamos del trabajador"""
+    if (obra_anterior or "") == (obra_nueva or ""):
+        return
+    filas = _registrados(db, Prestamo.trabajador_rut == rut, PrestamoHistorico.trabajador_rut == rut)
+    _mover(db, filas, lambda fila: (obra_anterior, fila.tipo), lambda fila: (obra_nueva, fila.tipo))
+
+
+def registrar_cambio_tipo(db: Session, tipos_anteriores: Dict[int, Optional[str]], tipo_nuevo: str) -> None:
+    """Mueve al nuevo tipo los contadores de los préstamos de esos equipos (equipo_id -> tipo anterior)"""
+    if not tipos_anteriores:
+        return
+    ids = list(tipos_anteriores)
+    filas = _registrados(db, Prestamo.equipo_id.in_(ids), PrestamoHistorico.equipo_id.in_(ids))
+    _mover(db, filas, lambda fila: (fila.obra, tipos_anteriores[fila.equipo_id]), lambda fila: (fila.obra, tipo_nuevo))
+
+
+def registrar_eliminacion_equipo(db: Session, equipo_id: int) -> None:
+    """Descuenta todos los préstamos (vigentes y archivados) de un equipo que se elimina"""
+    prestamos = _prestamos(Prestamo.equipo_id == equipo_id, PrestamoHistorico.equipo_id == equipo_id)
+    conteos = _contar_por_dia(db, prestamos, None, None, datetime.utcnow())
+    _sumar(db, {
+        clave: {contador: -cantidad for contador, cantidad in valores.items()}
+        for clave, valores in conteos.items()
+    })
+
+
+# ============ CÁLCULO DESDE PRÉSTAMOS ============
+
+def _prestamos(condicion_prestamos=None, condicion_historico=None):
+    """Préstamos vigentes y archivados con la obra del trabajador y el tipo del equipo"""
+    def seleccion(modelo, condicion):
+        consulta = select(
+            modelo.fecha_prestamo,
+            modelo.fecha_devolucion,
+            modelo.fecha_vencimiento,
+            func.coalesce(Trabajador.obra, literal("")).label("obra"),
+            func.coalesce(Equipo.tipo, literal("")).label("tipo"),
+        ).join(Equipo, Equipo.id == modelo.equipo_id).join(Trabajador, Trabajador.rut == modelo.trabajador_rut)
+        return consulta.where(condicion) if condicion is not None else consulta
+    return union_all(
+        seleccion(Prestamo, condicion_prestamos),
+        seleccion(PrestamoHistorico, condicion_historico)
+    ).subquery()
+
+
+def _en_rango(columna, desde: Optional[date], hasta: Optional[date]):
+    condiciones = [columna.isnot(None)]
+    if desde is not None:
+        condiciones.append(columna >= datetime.combine(desde, datetime.min.time()))
+    if hasta is not None:
+        condiciones.append(columna < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    return and_(*condiciones)
+
+
+def _contar_por_dia(db: Session, prestamos, desde: Optional[date], hasta: Optional[date], ahora: datetime) -> Dict[Clave, Dict[str, int]]:
+    """Prestados, devueltos y vencidos por día, obra y tipo (una consulta agrupada por contador)"""
+    columnas = {
+        "prestados": (prestamos.c.fecha_prestamo, None),
+        "devueltos": (prestamos.c.fecha_devolucion, None),
+        "vencidos": (
+            prestamos.c.fecha_vencimiento,
+            prestamos.c.fecha_vencimiento < func.coalesce(prestamos.c.fecha_devolucion, ahora)
+        ),
+    }
+    conteos: Dict[Clave, Dict[str, int]] = {}
+    for contador, (columna, condicion) in columnas.items():
+        dia = series.expresion_periodo(db, columna, series.DIA).label("dia")
+        filtro = _en_rango(columna, desde, hasta)
+        if condicion is not None:
+            filtro = and_(filtro, condicion)
+        filas = db.execute(
+            select(dia, prestamos.c.obra, prestamos.c.tipo, func.count())
+            .where(filtro)
+            .group_by(dia, prestamos.c.obra, prestamos.c.tipo)
+        )
+        for valor, obra, tipo, cantidad in filas:
+            valores = conteos.setdefault((series.como_fecha(valor), obra, tipo), {})
+            valores[contador] = cantidad
+    return conteos
+
+
+def _activos_al_inicio(db: Session, prestamos, desde: date) -> Dict[Tuple[str, str], int]:
+    """Préstamos activos al comenzar el día `desde`, por obra y tipo"""
+    inicio = datetime.combine(desde, datetime.min.time())
+    filas = db.execute(
+        select(prestamos.c.obra, prestamos.c.tipo, func.count()).where(
+            and_(
+                prestamos.c.fecha_prestamo < inicio,
+                or_(prestamos.c.fecha_devolucion.is_(None), prestamos.c.fecha_devolucion >= inicio)
+            )
+        ).group_by(prestamos.c.obra, prestamos.c.tipo)
+    )
+    return {(obra, tipo): cantidad for obra, tipo, cantidad in filas}
+
+
+def recalcular(db: Session, desde: date, hasta: date, ahora: Optional[datetime] = None) -> int:
+    """Reemplaza las filas de [desde, hasta] con las calculadas desde los préstamos.
+
+    Retorna la cantidad de filas escritas. No hace commit.
+    """
+    ahora = ahora or datetime.utcnow()
+    prestamos = _prestamos()
+    conteos = _contar_por_dia(db, prestamos, desde, hasta, ahora)
+    activos = _activos_al_inicio(db, prestamos, desde)
+
+    por_dia: Dict[date, Dict[Tuple[str, str], Dict[str, int]]] = {}
+    for (fecha, obra, tipo), valores in conteos.items():
+        por_dia.setdefault(fecha, {})[(obra, tipo)] = valores
+
+    filas = []
+    dia = desde
+    while dia <= hasta:
+        del_dia = por_dia.get(dia, {})
+        for obra, tipo in sorted(set(activos) | set(del_dia)):
+            valores = del_dia.get((obra, tipo), {})
+            activos[(obra, tipo)] = activos.get((obra, tipo), 0) + valores.get("prestados", 0) - valores.get("devueltos", 0)
+            if activos[(obra, tipo)] or any(valores.values()):
+                filas.append({
+                    "fecha": dia, "obra": obra, "tipo": tipo, "activos": activos[(obra, tipo)],
+                    **{contador: valores.get(contador, 0) for contador in CONTADORES}
+                })
+        dia += timedelta(days=1)
+
+    db.query(EstadisticaDiaria).filter(
+        and_(EstadisticaDiaria.fecha >= desde, EstadisticaDiaria.fecha <= hasta)
+    ).delete(synchronize_session=False)
+    if filas:
+        db.execute(EstadisticaDiaria.__table__.insert(), filas)
+    return len(filas)
+
+
+def compactar(db: Session, dias: int = DIAS_COMPACTACION) -> int:
+    """Recalcula los últimos `dias` días (tarea nocturna). Retorna las filas escritas."""
+    hoy = datetime.utcnow().date()
+    return recalcular(db, hoy - timedelta(days=max(dias, 1) - 1), hoy)
+
+
+def _primer_dia(db: Session) -> Optional[date]:
+    fechas = [
+        db.query(func.min(Prestamo.fecha_prestamo)).scalar(),
+        db.query(func.min(PrestamoHistorico.fecha_prestamo)).scalar(),
+    ]
+    fechas = [fecha for fecha in fechas if fecha is not None]
+    return min(fechas).date() if fechas else None
+
+
+def reconstruir(db: Session, dias_por_lote: int = DIAS_POR_LOTE) -> int:
+    """Recalcula todo el historial por tramos de días, con un commit por tramo"""
+    inicio = _primer_dia(db)
+    if inicio is None:
+        db.query(EstadisticaDiaria).delete(synchronize_session=False)
+        db.commit()
+        return 0
+    hoy = datetime.utcnow().date()
+    db.query(EstadisticaDiaria).filter(EstadisticaDiaria.fecha < inicio).delete(synchronize_session=False)
+    total = 0
+    while inicio <= hoy:
+        fin = min(inicio + timedelta(days=dias_por_lote - 1), hoy)
+        total += recalcular(db, inicio, fin)
+        db.commit()
+        inicio = fin + timedelta(days=1)
+    return total
+
+
+def reconstruir_si_vacia(db: Session) -> Optional[int]:
+    """Reconstruye la tabla si está vacía y hay préstamos (primer despliegue)"""
+    if db.query(EstadisticaDiaria.fecha).first() is not None:
+        return None
+    if _primer_dia(db) is None:
+        return None
+    return reconstruir(db)
+
+
+def verificar(db: Session, desde: date, hasta: date) -> List[Dict]:
+    """Diferencias de prestados, devueltos y vencidos entre la tabla y lo calculado"""
+    esperadas = _contar_por_dia(db, _prestamos(), desde, hasta, datetime.utcnow())
+    actuales = {
+        (fila.fecha, fila.obra, fila.tipo): {contador: getattr(fila, contador) for contador in CONTADORES}
+        for fila in db.query(EstadisticaDiaria).filter(
+            and_(EstadisticaDiaria.fecha >= desde, EstadisticaDiaria.fecha <= hasta)
+        )
+    }
+    diferencias = []
+    for clave in sorted(esperadas.keys() | actuales.keys()):
+        esperado = {contador: esperadas.get(clave, {}).get(contador, 0) for contador in CONTADORES}
+        actual = actuales.get(clave, dict.fromkeys(CONTADORES, 0))
+        if esperado != actual:
+            diferencias.append({"fecha": clave[0], "obra": clave[1], "tipo": clave[2], "esperado": esperado, "actual": actual})
+    return diferencias
+
+
+# ============ LECTURA ============
+
+def por_periodo(db: Session, desde: date, hasta: date, granularidad: str, obra: Optional[str] = None) -> Dict[date, Dict[str, int]]:
+    """Contadores sumados por período (inicio del período -> contadores)"""
+    periodo = series.expresion_periodo(db, EstadisticaDiaria.fecha, granularidad).label("periodo")
+    query = db.query(
+        periodo,
+        *[func.sum(getattr(EstadisticaDiaria, contador)).label(contador) for contador in CONTADORES]
+    ).filter(and_(EstadisticaDiaria.fecha >= desde, EstadisticaDiaria.fecha <= hasta))
+    if obra:
+        query = query.filter(EstadisticaDiaria.obra == obra)
+    return {
+        series.como_fecha(fila.periodo): {contador: getattr(fila, contador) or 0 for contador in CONTADORES}
+        for fila in query.group_by(periodo)
+    }
+
+
+def prestamos_por_periodo(db: Session, desde: date, hasta: date, granularidad: str = series.DIA) -> List[Dict]:
+    """Préstamos creados, devueltos y vencidos por período entre desde y hasta (inclusive), con ceros"""
+    conteos = por_periodo(db, desde, hasta, granularidad)
+    vacio = dict.fromkeys(CONTADORES, 0)
+    return [
+        {
+            "periodo": inicio.isoformat(),
+            "cantidad": conteos.get(inicio, vacio)["prestados"],
+            "devueltos": conteos.get(inicio, vacio)["devueltos"],
+            "vencidos": conteos.get(inicio, vacio)["vencidos"],
+        }
+        for inicio in series.periodos(desde, hasta, granularidad)
+    ]
+
+
+def prestados_por_tipo(db: Session, desde: date, hasta: date, limite: int) -> List[Tuple[str, int]]:
+    """Tipos de equipo más prestados entre desde y hasta"""
+    total = func.sum(EstadisticaDiaria.prestados)
+    return db.query(EstadisticaDiaria.tipo, total).filter(
+        and_(EstadisticaDiaria.fecha >= desde, EstadisticaDiaria.fecha <= hasta)
+    ).group_by(EstadisticaDiaria.tipo).having(total > 0).order_by(total.desc()).limit(limite).all()
@@ -0,0 +1,313 @@
+"""
+Proyección del estado actual de los equipos (tabla equipos_estado)
+
+Cada equipo tiene una fila con su préstamo activo, el RUT y la obra de quien lo
+tiene y su último préstamo devuelto. Los endpoints que crean, devuelven o
+eliminan préstamos la actualizan antes de hacer commit, de modo que las
+consultas de disponibilidad no necesitan recorrer la tabla de préstamos.
+También emiten los eventos de cambio (ver eventos.py).
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, select, text, update
+from sqlalchemy.orm import Session
+from .models import Equipo, EquipoEstado, Prestamo, Trabajador, EstadoPrestamo, ESTADOS_ACTIVOS, INDICE_PRESTAMO_ACTIVO, INDICE_PRESTAMO_ACTIVO_ANTERIOR
+from . import eventos
+
+
+# ============ CONSULTAS ============
+
+def _equipos_prestados(obra: Optional[str] = None):
+    prestados = select(EquipoEstado.equipo_id).where(EquipoEstado.prestamo_activo_id.isnot(None))
+    if obra is not None:
+        prestados = prestados.where(EquipoEstado.obra == obra)
+    return prestados
+
+
+def condicion_disponible():
+    """Condición SQL: el equipo no tiene préstamo activo"""
+    return ~Equipo.id.in_(_equipos_prestados())
+
+
+def condicion_prestado(obra: Optional[str] = None):
+    """Condición SQL: el equipo tiene préstamo activo (opcionalmente en una obra)"""
+    return Equipo.id.in_(_equipos_prestados(obra))
+
+
+def ruts_con_equipos():
+    """Subconsulta con los RUT de trabajadores que tienen equipos prestados"""
+    return select(EquipoEstado.trabajador_rut).where(EquipoEstado.prestamo_activo_id.isnot(None)).distinct()
+
+
+def ids_prestados(db: Session) -> set:
+    """Ids de todos los equipos con préstamo activo"""
+    return {
+        fila.equipo_id for fila in db.query(EquipoEstado.equipo_id).filter(
+            EquipoEstado.prestamo_activo_id.isnot(None)
+        )
+    }
+
+
+# ============ ACTUALIZACIÓN ============
+
+def _obtener(db: Session, equipo_id: int) -> EquipoEstado:
+    estado = db.get(EquipoEstado, equipo_id)
+    if estado is None:
+        estado = EquipoEstado(equipo_id=equipo_id)
+        db.add(estado)
+    return estado
+
+
+def registrar_equipo(db: Session, equipo: Equipo) -> None:
+    """Crear la fila de un equipo nuevo o marcar un cambio en el equipo"""
+    if equipo.estado_actual is None:
+        equipo.estado_actual = EquipoEstado()
+    equipo.estado_actual.actualizado_en = datetime.utcnow()
+    if equipo.id is not None:
+        eventos.emitir(db, eventos.EQUIPO_ACTUALIZADO, equipo_id=equipo.id)
+
+
+def registrar_equipos_actualizados(db: Session, equipo_ids: List[int]) -> None:
+    """Marcar un cambio en varios equipos (actualización en lote)"""
+    if not equipo_ids:
+        return
+    db.query(EquipoEstado).filter(EquipoEstado.equipo_id.in_(equipo_ids)).update(
+        {EquipoEstado.actualizado_en: datetime.utcnow()},
+        synchronize_session=False
+    )
+    for equipo_id in equipo_ids:
+        eventos.emitir(db, eventos.EQUIPO_ACTUALIZADO, equipo_id=equipo_id)
+
+
+def registrar_equipos_nuevos(db: Session, equipo_ids: List[int]) -> None:
+    """Crear las filas de equipos insertados en lote"""
+    if not equipo_ids:
+        return
+    ahora = datetime.utcnow()
+    db.execute(EquipoEstado.__table__.insert(), [
+        {"equipo_id": equipo_id, "actualizado_en": ahora} for equipo_id in equipo_ids
+    ])
+    eventos.emitir(db, eventos.EQUIPOS_CREADOS, equipo_ids=equipo_ids)
+
+
+def registrar_prestamo(db: Session, prestamo: Prestamo, trabajador: Trabajador) -> None:
+    """El equipo pasa a estar prestado (requiere prestamo.id, hacer flush antes)"""
+    estado = _obtener(db, prestamo.equipo_id)
+    estado.prestamo_activo_id = prestamo.id
+    estado.trabajador_rut = trabajador.rut
+    estado.obra = trabajador.obra
+    estado.actualizado_en = datetime.utcnow()
+    eventos.emitir(
+        db, eventos.PRESTAMO_CREADO,
+        equipo_id=prestamo.equipo_id, prestamo_id=prestamo.id, rut=trabajador.rut, obra=trabajador.obra
+    )
+
+
+def _guardar_estados(db: Session, filas: List[dict]) -> None:
+    """Escribe filas de la proyección en lote (UPDATE por clave primaria o INSERT si falta)"""
+    existentes = {
+        equipo_id for (equipo_id,) in db.query(EquipoEstado.equipo_id).filter(
+            EquipoEstado.equipo_id.in_([fila["equipo_id"] for fila in filas])
+        )
+    }
+    nuevas = [fila for fila in filas if fila["equipo_id"] not in existentes]
+    if nuevas:
+        db.execute(EquipoEstado.__table__.insert(), nuevas)
+    actualizar = [fila for fila in filas if fila["equipo_id"] in existentes]
+    if actualizar:
+        # UPDATE por clave primaria en lote (executemany)
+        db.execute(update(EquipoEstado), actualizar, execution_options={"synchronize_session": False})
+
+
+def registrar_prestamos(db: Session, prestamos: List[dict]) -> None:
+    """Varios equipos pasan a estar prestados (dicts con equipo_id, prestamo_id, rut y obra)"""
+    if not prestamos:
+        return
+    ahora = datetime.utcnow()
+    _guardar_estados(db, [
+        {
+            "equipo_id": p["equipo_id"],
+            "prestamo_activo_id": p["prestamo_id"],
+            "trabajador_rut": p["rut"],
+            "obra": p["obra"],
+            "actualizado_en": ahora,
+        }
+        for p in prestamos
+    ])
+    for p in prestamos:
+        eventos.emitir(
+            db, eventos.PRESTAMO_CREADO,
+            equipo_id=p["equipo_id"], prestamo_id=p["prestamo_id"], rut=p["rut"], obra=p["obra"]
+        )
+
+
+def registrar_devolucion(db: Session, prestamo: Prestamo) -> None:
+    """El equipo queda libre y el préstamo pasa a ser su último devuelto"""
+    estado = _obtener(db, prestamo.equipo_id)
+    obra = estado.obra
+    if estado.prestamo_activo_id == prestamo.id:
+        estado.prestamo_activo_id = None
+        estado.trabajador_rut = None
+        estado.obra = None
+    estado.ultimo_prestamo_devuelto_id = prestamo.id
+    estado.actualizado_en = datetime.utcnow()
+    eventos.emitir(
+        db, eventos.PRESTAMO_DEVUELTO,
+        equipo_id=prestamo.equipo_id, prestamo_id=prestamo.id, rut=prestamo.trabajador_rut, obra=obra
+    )
+
+
+def registrar_devoluciones(db: Session, prestamos: List[dict]) -> None:
+    """Devolución en lote de préstamos activos (dicts con equipo_id, prestamo_id, rut y obra)"""
+    if not prestamos:
+        return
+    ahora = datetime.utcnow()
+    _guardar_estados(db, [
+        {
+            "equipo_id": p["equipo_id"],
+            "prestamo_activo_id": None,
+            "trabajador_rut": None,
+            "obra": None,
+            "ultimo_prestamo_devuelto_id": p["prestamo_id"],
+            "actualizado_en": ahora,
+        }
+        for p in prestamos
+    ])
+    for p in prestamos:
+        eventos.emitir(
+            db, eventos.PRESTAMO_DEVUELTO,
+            equipo_id=p["equipo_id"], prestamo_id=p["prestamo_id"], rut=p["rut"], obra=p.get("obra")
+        )
+
+
+def registrar_eliminacion_prestamo(db: Session, prestamo: Prestamo) -> None:
+    """Un préstamo se eliminó del historial: recalcular el último devuelto"""
+    estado = _obtener(db, prestamo.equipo_id)
+    if estado.prestamo_activo_id == prestamo.id:
+        estado.prestamo_activo_id = None
+        estado.trabajador_rut = None
+        estado.obra = None
+    if estado.ultimo_prestamo_devuelto_id == prestamo.id:
+        anterior = db.query(Prestamo.id).filter(
+            and_(
+                Prestamo.equipo_id == prestamo.equipo_id,
+                Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
+                Prestamo.id != prestamo.id
+            )
+        ).order_by(Prestamo.fecha_devolucion.desc(), Prestamo.id.desc()).first()
+        estado.ultimo_prestamo_devuelto_id = anterior.id if anterior else None
+    estado.actualizado_en = datetime.utcnow()
+    eventos.emitir(
+        db, eventos.PRESTAMO_ELIMINADO,
+        equipo_id=prestamo.equipo_id, prestamo_id=prestamo.id, rut=prestamo.trabajador_rut
+    )
+
+
+def registrar_cambio_obra(db: Session, rut: str, obra: str) -> None:
+    """El trabajador cambió de obra: sus equipos prestados pasan a esa obra"""
+    db.query(EquipoEstado).filter(EquipoEstado.trabajador_rut == rut).update(
+        {EquipoEstado.obra: obra, EquipoEstado.actualizado_en: datetime.utcnow()},
+        synchronize_session=False
+    )
+
+
+# ============ RECONSTRUCCIÓN Y VERIFICACIÓN ============
+
+def calcular(db: Session) -> Dict[int, dict]:
+    """Calcula el estado de todos los equipos desde la tabla de préstamos"""
+    estados = {
+        equipo_id: {
+            "prestamo_activo_id": None,
+            "trabajador_rut": None,
+            "obra": None,
+            "ultimo_prestamo_devuelto_id": None,
+        }
+        for (equipo_id,) in db.query(Equipo.id)
+    }
+
+    activos = db.query(Prestamo.equipo_id, Prestamo.id, Trabajador.rut, Trabajador.obra).join(
+        Trabajador, Prestamo.trabajador_rut == Trabajador.rut
+    ).filter(Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)).order_by(Prestamo.id.desc())
+    for equipo_id, prestamo_id, rut, obra in activos:
+        if equipo_id in estados:
+            estados[equipo_id].update(prestamo_activo_id=prestamo_id, trabajador_rut=rut, obra=obra)
+
+    orden = func.row_number().over(
+        partition_by=Prestamo.equipo_id,
+        order_by=(Prestamo.fecha_devolucion.desc(), Prestamo.id.desc())
+    ).label("orden")
+    ranking = db.query(Prestamo.equipo_id, Prestamo.id, orden).filter(
+        Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO
+    ).subquery()
+    for equipo_id, prestamo_id in db.query(ranking.c.equipo_id, ranking.c.id).filter(ranking.c.orden == 1):
+        if equipo_id in estados:
+            estados[equipo_id]["ultimo_prestamo_devuelto_id"] = prestamo_id
+
+    return estados
+
+
+def verificar(db: Session) -> List[dict]:
+    """Compara la proyección con el estado real. Retorna las diferencias encontradas."""
+    esperados = calcular(db)
+    actuales = {estado.equipo_id: estado for estado in db.query(EquipoEstado)}
+    diferencias = []
+    for equipo_id, esperado in esperados.items():
+        actual = actuales.get(equipo_id)
+        if actual is None:
+            diferencias.append({"equipo_id": equipo_id, "campo": "fila", "esperado": "existe", "actual": None})
+            continue
+        for campo, valor in esperado.items():
+            if getattr(actual, campo) != valor:
+                diferencias.append({
+                    "equipo_id": equipo_id, "campo": campo,
+                    "esperado": valor, "actual": getattr(actual, campo)
+                })
+    for equipo_id in actuales.keys() - esperados.keys():
+        diferencias.append({"equipo_id": equipo_id, "campo": "fila", "esperado": None, "actual": "existe"})
+    return diferencias
+
+
+def reconstruir(db: Session) -> int:
+    """Reconstruye por completo la proyección. Retorna la cantidad de equipos."""
+    estados = calcular(db)
+    ahora = datetime.utcnow()
+    db.query(EquipoEstado).delete(synchronize_session=False)
+    if estados:
+        db.execute(EquipoEstado.__table__.insert(), [
+            {"equipo_id": equipo_id, "actualizado_en": ahora, **valores}
+            for equipo_id, valores in estados.items()
+        ])
+    return len(estados)
+
+
+def equipos_con_varios_activos(db: Session) -> List[int]:
+    """Equipos con más de un préstamo activo (impiden crear el índice único)"""
+    return [
+        equipo_id for (equipo_id,) in db.query(Prestamo.equipo_id).filter(
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
+        ).group_by(Prestamo.equipo_id).having(func.count(Prestamo.id) > 1)
+    ]
+
+
+def crear_indice_prestamo_activo(engine) -> None:
+    """Crea el índice único parcial de préstamo activo por equipo (idempotente)"""
+    indice = next(i for i in Prestamo.__table__.indexes if i.name == INDICE_PRESTAMO_ACTIVO)
+    indice.create(bind=engine, checkfirst=True)
+    eliminar_indice_prestamo_activo_anterior(engine)
+
+
+def eliminar_indice_prestamo_activo_anterior(engine) -> None:
+    """Elimina la versión anterior del índice (solo consideraba préstamos ASIGNADO)"""
+    with engine.begin() as conexion:
+        conexion.execute(text(f"DROP INDEX IF EXISTS {INDICE_PRESTAMO_ACTIVO_ANTERIOR}"))
+
+
+def reconstruir_si_vacia(db: Session) -> Optional[int]:
+    """Reconstruye la proyección si está vacía y hay equipos (primer despliegue)"""
+    if db.query(EquipoEstado.equipo_id).first() is not None:
+        return None
+    if db.query(Equipo.id).first() is None:
+        return None
+    total = reconstruir(db)
+    db.commit()
+    return total
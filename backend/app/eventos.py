@@ -0,0 +1,58 @@
+"""
+Eventos de cambios en préstamos y equipos
+
+Los endpoints registran eventos en la sesión con emitir(); solo se entregan a
+los suscriptores cuando la transacción hace commit (si hay rollback se
+descartan). Los usan los cachés (escaneo QR, dashboard) para invalidarse y el
+stream SSE de app/difusion.py.
+"""
+from typing import Callable, Dict, List
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Tipos de evento
+EQUIPO_ACTUALIZADO = "equipo_actualizado"
+EQUIPO_ELIMINADO = "equipo_eliminado"
+EQUIPOS_CREADOS = "equipos_creados"
+PRESTAMO_CREADO = "prestamo_creado"
+PRESTAMO_DEVUELTO = "prestamo_devuelto"
+PRESTAMO_ELIMINADO = "prestamo_eliminado"
+PRESTAMO_ACTUALIZADO = "prestamo_actualizado"
+PRESTAMOS_VENCIDOS = "prestamos_vencidos"
+TRABAJADOR_ACTUALIZADO = "trabajador_actualizado"
+TRABAJADOR_DESPEDIDO = "trabajador_despedido"
+ALERTAS_CREADAS = "alertas_creadas"
+
+_CLAVE_PENDIENTES = "eventos_pendientes"
+
+_suscriptores: List[Callable[[Dict], None]] = []
+
+
+def emitir(db: Session, tipo: str, **datos) -> None:
+    """Registrar un evento para entregarlo cuando la sesión haga commit"""
+    db.info.setdefault(_CLAVE_PENDIENTES, []).append({"tipo": tipo, **datos})
+
+
+def suscribir(funcion: Callable[[Dict], None]) -> Callable[[Dict], None]:
+    """Registrar una función que recibe cada evento confirmado (usable como decorador)"""
+    _suscriptores.append(funcion)
+    return funcion
+
+
+@event.listens_for(Session, "after_commit")
+def _entregar_eventos(session):
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    if not pendientes:
+        return
+    for evento in pendientes:
+        for funcion in _suscriptores:
+            try:
+                funcion(evento)
+            except Exception as e:
+                # Un suscriptor con error no debe afectar la respuesta ya confirmada
+                print(f"Error en suscriptor de eventos ({evento['tipo']}): {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_eventos(session):
+    session.info.pop(_CLAVE_PENDIENTES, None)
@@ -0,0 +1,118 @@
+"""
+Lectura incremental de planillas (CSV / XLSX) para importación masiva
+
+Las filas se entregan de a una como diccionarios con los nombres de columna
+normalizados, sin cargar el archivo completo en memoria.
+"""
+import csv
+import io
+import unicodedata
+from typing import BinaryIO, Dict, Iterator, Tuple
+
+# Nombres de columna aceptados (sin tildes, en minúsculas) -> campo del equipo
+COLUMNAS_EQUIPO = {
+    "serie": "serie",
+    "n serie": "serie",
+    "numero de serie": "serie",
+    "marca": "marca",
+    "modelo": "modelo",
+    "tipo": "tipo",
+    "estado": "estado_dispositivo",
+    "estado dispositivo": "estado_dispositivo",
+    "estado_dispositivo": "estado_dispositivo",
+    "ram": "ram_gb",
+    "ram gb": "ram_gb",
+    "ram_gb": "ram_gb",
+    "ssd": "ssd_gb",
+    "ssd gb": "ssd_gb",
+    "ssd_gb": "ssd_gb",
+    "so": "so",
+    "sistema operativo": "so",
+    "observaciones": "observaciones",
+}
+
+# Estados escritos sin tilde o en minúsculas
+ESTADOS_DISPOSITIVO = {
+    "OPERATIVO": "OPERATIVO",
+    "MANTENCION": "MANTENCIÓN",
+    "MANTENCIÓN": "MANTENCIÓN",
+    "BAJA": "BAJA",
+}
+
+
+class FormatoNoSoportado(Exception):
+    pass
+
+
+def _sin_tildes(texto: str) -> str:
+    return "".join(
+        c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn"
+    )
+
+
+def _nombre_columna(encabezado) -> str:
+    nombre = _sin_tildes(str(encabezado or "")).strip().lower().replace(".", "")
+    return COLUMNAS_EQUIPO.get(nombre, nombre)
+
+
+def _limpiar_fila(encabezados, valores) -> Dict[str, object]:
+    fila = {}
+    for campo, valor in zip(encabezados, valores):
+        if not campo:
+            continue
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor == "" or valor is None:
+            valor = None
+        elif campo in ("ram_gb", "ssd_gb") and isinstance(valor, float) and valor.is_integer():
+            valor = int(valor)
+        elif campo == "estado_dispositivo":
+            valor = ESTADOS_DISPOSITIVO.get(str(valor).strip().upper(), str(valor).strip().upper())
+        elif campo in ("serie", "marca", "modelo", "tipo", "so") and not isinstance(valor, str):
+            valor = str(valor)
+        fila[campo] = valor
+    return fila
+
+
+def _leer_csv(archivo: BinaryIO) -> Iterator[Tuple[int, Dict[str, object]]]:
+    texto = io.TextIOWrapper(archivo, encoding="utf-8-sig", newline="")
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    encabezados = [_nombre_columna(c) for c in next(lector, [])]
+    for numero, valores in enumerate(lector, start=2):
+        if not any(v.strip() for v in valores):
+            continue
+        yield numero, _limpiar_fila(encabezados, valores)
+
+
+def _leer_xlsx(archivo: BinaryIO, load_workbook) -> Iterator[Tuple[int, Dict[str, object]]]:
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hoja = libro.active
+        filas = hoja.iter_rows(values_only=True)
+        encabezados = [_nombre_columna(c) for c in next(filas, ())]
+        for numero, valores in enumerate(filas, start=2):
+            if not any(v not in (None, "") for v in valores):
+                continue
+            yield numero, _limpiar_fila(encabezados, valores)
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo: BinaryIO, nombre_archivo: str) -> Iterator[Tuple[int, Dict[str, object]]]:
+    """Itera (número de fila en la planilla, datos) según la extensión del archivo"""
+    nombre = (nombre_archivo or "").lower()
+    if nombre.endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise FormatoNoSoportado("Soporte XLSX no disponible (instalar openpyxl)")
+        return _leer_xlsx(archivo, load_workbook)
+    if nombre.endswith(".csv") or nombre.endswith(".txt"):
+        return _leer_csv(archivo)
+    raise FormatoNoSoportado("Formato no soportado (use .csv o .xlsx)")
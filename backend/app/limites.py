@@ -0,0 +1,74 @@
+"""
+Límite de requests por IP (ventana deslizante en memoria)
+
+Pensado para endpoints públicos como el escaneo de QR. El límite es por
+proceso; con varios workers cada uno lleva su propia cuenta.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+
+
+# Proxies confiables delante de la app (Render agrega 1). Cada uno añade la IP
+# que le envió el request al final de X-Forwarded-For; las entradas anteriores
+# las puede escribir el propio cliente y no se usan. 0: usar la IP de la conexión.
+PROXIES_CONFIABLES = int(os.getenv("PROXIES_CONFIABLES", "0"))
+
+
+def ip_cliente(request: Request, proxies: Optional[int] = None) -> str:
+    """IP del cliente: la agregada por el proxy confiable más externo"""
+    proxies = PROXIES_CONFIABLES if proxies is None else proxies
+    conexion = request.client.host if request.client else "desconocida"
+    if proxies <= 0:
+        return conexion
+    saltos = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+    if len(saltos) < proxies:
+        # Request que no pasó por todos los proxies: la conexión es lo único confiable
+        return conexion
+    return saltos[-proxies]
+
+
+class LimitadorPorIP:
+    """Permite `maximo` requests por IP cada `ventana` segundos"""
+
+    def __init__(self, maximo: int, ventana: float, max_ips: int = 10000):
+        self.maximo = maximo
+        self.ventana = ventana
+        self.max_ips = max_ips
+        self._requests: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def permitir(self, ip: str) -> float:
+        """Registra un request. Retorna 0 si se permite, o los segundos a esperar."""
+        ahora = time.monotonic()
+        with self._lock:
+            tiempos = self._requests.get(ip)
+            if tiempos is None:
+                if len(self._requests) >= self.max_ips:
+                    self._purgar(ahora)
+                tiempos = self._requests[ip] = deque()
+            while tiempos and tiempos[0] <= ahora - self.ventana:
+                tiempos.popleft()
+            if len(tiempos) >= self.maximo:
+                return tiempos[0] + self.ventana - ahora
+            tiempos.append(ahora)
+            return 0
+
+    def _purgar(self, ahora: float) -> None:
+        # Quitar IPs sin requests en la ventana actual
+        for ip in [ip for ip, t in self._requests.items() if not t or t[-1] <= ahora - self.ventana]:
+            del self._requests[ip]
+
+    def __call__(self, request: Request) -> None:
+        """Dependency de FastAPI: responde 429 si la IP excedió su límite"""
+        espera = self.permitir(ip_cliente(request))
+        if espera:
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas solicitudes, intente nuevamente en unos segundos",
+                headers={"Retry-After": str(int(espera) + 1)}
+            )
@@ -1,10 +1,19 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .database import engine, Base
-from .routers import auth, equipos, prestamos, trabajadores, alertas, reportes, config, estadisticas, asistente
+from .database import engine, Base, SessionLocal, crear_indices_faltantes
+from .paginacion import CABECERAS_PAGINACION
+from .busqueda import preparar_indices as preparar_indices_busqueda
+from .estado_equipos import reconstruir_si_vacia as reconstruir_estado_equipos_si_vacia
+from .estado_equipos import eliminar_indice_prestamo_activo_anterior
+from .alertas_activas import reconstruir_si_vacia as reconstruir_alertas_si_vacia
+from .estadisticas_diarias import reconstruir_si_vacia as reconstruir_estadisticas_si_vacia
+from . import qr
+from . import archivo_prestamos, estadisticas_diarias, tareas, vencimientos
+from .routers import auth, equipos, prestamos, trabajadores, alertas, reportes, config, estadisticas, asistente, eventos
 # Importar modelos para asegurar que se registren en Base.metadata
 from . import models  # noqa: F401
+import asyncio
 import time
 
 # Crear tablas (en producción usar Alembic migrations)
@@ -15,6 +24,55 @@ except Exception as e:
     print(f"Advertencia: No se pudieron crear/verificar tablas: {e}")
     print("Asegurate de que Supabase este configurado correctamente")
 
+# Índices de préstamos (único de préstamo activo por equipo, historial y alertas)
+# en bases creadas antes de agregarlos al modelo
+try:
+    errores_indices = crear_indices_faltantes(models.Prestamo.__table__)
+    for nombre_indice, e in errores_indices:
+        print(f"Advertencia: No se pudo crear el índice {nombre_indice}: {e}")
+        if nombre_indice == models.INDICE_PRESTAMO_ACTIVO:
+            print("Ejecute scripts/crear_indice_prestamo_activo.py para ver los equipos con préstamos duplicados")
+    if models.INDICE_PRESTAMO_ACTIVO not in [nombre for nombre, _ in errores_indices]:
+        eliminar_indice_prestamo_activo_anterior(engine)
+except Exception as e:
+    print(f"Advertencia: No se pudieron verificar los índices de préstamos: {e}")
+
+# Índices de búsqueda de equipos (pg_trgm en PostgreSQL, n-gramas en otros motores)
+try:
+    preparar_indices_busqueda(engine)
+except Exception as e:
+    print(f"Advertencia: No se pudieron crear los índices de búsqueda: {e}")
+
+# Proyección de estado actual de equipos (se reconstruye si está vacía)
+try:
+    with SessionLocal() as db:
+        total = reconstruir_estado_equipos_si_vacia(db)
+        if total:
+            print(f"Estado actual reconstruido para {total} equipos")
+except Exception as e:
+    print(f"Advertencia: No se pudo verificar el estado actual de equipos: {e}")
+
+# Alertas vigentes (se reconstruyen si la tabla está vacía)
+try:
+    with SessionLocal() as db:
+        total = reconstruir_alertas_si_vacia(db)
+        if total is not None:
+            print(f"Alertas activas reconstruidas: {total}")
+except Exception as e:
+    print(f"Advertencia: No se pudieron verificar las alertas activas: {e}")
+
+# Resumen diario de préstamos (se reconstruye si la tabla está vacía)
+try:
+    with SessionLocal() as db:
+        total = reconstruir_estadisticas_si_vacia(db)
+        if total is not None:
+            print(f"Estadísticas diarias reconstruidas: {total} filas")
+except Exception as e:
+    print(f"Advertencia: No se pudieron verificar las estadísticas diarias: {e}")
+
+# URL base de los QR (evita detectar la IP local en cada request)
+print(f"URL base de códigos QR: {qr.frontend_url()}")
+
 app = FastAPI(
     title="Aura Minería - API",
     description="Sistema de gestión de equipos tecnológicos",
@@ -38,6 +96,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=CABECERAS_PAGINACION,  # Permitir al frontend leer cursor y totales
 )
 
 # Middleware para logging de peticiones
@@ -65,6 +124,39 @@ app.include_router(reportes.router)
 app.include_router(config.router)
 app.include_router(estadisticas.router)
 app.include_router(asistente.router)
+app.include_router(eventos.router)
+
+
+_tareas_periodicas = []
+
+
+@app.on_event("startup")
+async def iniciar_tareas_periodicas():
+    # Marcar préstamos vencidos, archivar devueltos antiguos y compactar el resumen
+    # diario de préstamos (intervalo 0 las desactiva)
+    programadas = [
+        (vencimientos.TAREA_VENCIDOS, vencimientos.marcar_vencidos, vencimientos.INTERVALO_VENCIDOS),
+        (archivo_prestamos.TAREA_ARCHIVO, archivo_prestamos.archivar_prestamos, archivo_prestamos.INTERVALO_ARCHIVO),
+        (estadisticas_diarias.TAREA_COMPACTACION, estadisticas_diarias.compactar, estadisticas_diarias.INTERVALO_COMPACTACION),
+    ]
+    for nombre, tarea, intervalo in programadas:
+        if intervalo > 0:
+            _tareas_periodicas.append(asyncio.create_task(
+                tareas.ejecutar_periodicamente(nombre, tarea, SessionLocal, intervalo)
+            ))
+
+
+@app.on_event("shutdown")
+async def detener_tareas_periodicas():
+    for tarea in _tareas_periodicas:
+        tarea.cancel()
+    _tareas_periodicas.clear()
+
+
+@app.on_event("shutdown")
+def cerrar_pool_qr():
+    # Terminar los procesos que renderizan hojas de etiquetas QR
+    qr.cerrar_pool()
 
 
 @app.get("/")
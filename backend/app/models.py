@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime, Text, Enum as SQLEnum, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -18,6 +18,10 @@ class EstadoPrestamo(str, enum.Enum):
     VENCIDO = "VENCIDO"
 
 
+# Estados en que el equipo sigue en poder del trabajador
+ESTADOS_ACTIVOS = (EstadoPrestamo.ASIGNADO, EstadoPrestamo.VENCIDO)
+
+
 class RolUsuario(str, enum.Enum):
     INFORMATICA = "INFORMATICA"
     RRHH = "RRHH"
@@ -39,6 +43,33 @@ class Equipo(Base):
     observaciones = Column(Text, nullable=True)
     
     prestamos = relationship("Prestamo", back_populates="equipo", cascade="all, delete-orphan")
+    estado_actual = relationship("EquipoEstado", back_populates="equipo", uselist=False, cascade="all, delete-orphan")
+
+
+class EquipoEstado(Base):
+    """Proyección del estado actual de cada equipo (quién lo tiene y su último préstamo).
+    
+    Se actualiza en la misma transacción que los préstamos; ver app/estado_equipos.py
+    """
+    __tablename__ = "equipos_estado"
+    
+    equipo_id = Column(Integer, ForeignKey("equipos.id", ondelete="CASCADE"), primary_key=True)
+    prestamo_activo_id = Column(Integer, nullable=True, index=True)
+    trabajador_rut = Column(String, nullable=True, index=True)
+    obra = Column(String, nullable=True, index=True)
+    ultimo_prestamo_devuelto_id = Column(Integer, nullable=True)
+    actualizado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    equipo = relationship("Equipo", back_populates="estado_actual")
+
+
+class EquipoNgrama(Base):
+    """Índice de n-gramas para búsqueda por subcadena en motores sin pg_trgm"""
+    __tablename__ = "equipos_ngramas"
+    
+    equipo_id = Column(Integer, ForeignKey("equipos.id", ondelete="CASCADE"), primary_key=True)
+    campo = Column(String, primary_key=True)  # serie, marca, modelo o tipo
+    ngrama = Column(String, primary_key=True, index=True)
 
 
 class Trabajador(Base):
@@ -56,8 +87,29 @@ class Trabajador(Base):
 
 
 
+# Un equipo solo puede tener un préstamo activo, ASIGNADO o VENCIDO (índice único parcial)
+INDICE_PRESTAMO_ACTIVO = "ux_prestamos_equipo_prestado"
+# Versión anterior del índice (solo ASIGNADO), se elimina al crear la actual
+INDICE_PRESTAMO_ACTIVO_ANTERIOR = "ux_prestamos_equipo_activo"
+_PRESTAMO_ACTIVO = text("estado_prestamo IN ('ASIGNADO', 'VENCIDO')")
+
+
 class Prestamo(Base):
     __tablename__ = "prestamos"
+    __table_args__ = (
+        Index(
+            INDICE_PRESTAMO_ACTIVO, "equipo_id", unique=True,
+            postgresql_where=_PRESTAMO_ACTIVO, sqlite_where=_PRESTAMO_ACTIVO
+        ),
+        # Historial: orden por fecha y filtros por estado, trabajador, equipo y devolución
+        Index("ix_prestamos_fecha_prestamo_id", "fecha_prestamo", "id"),
+        Index("ix_prestamos_estado_fecha_prestamo", "estado_prestamo", "fecha_prestamo", "id"),
+        Index("ix_prestamos_trabajador_fecha_prestamo", "trabajador_rut", "fecha_prestamo"),
+        Index("ix_prestamos_equipo_fecha_prestamo", "equipo_id", "fecha_prestamo"),
+        Index("ix_prestamos_fecha_devolucion", "fecha_devolucion"),
+        # Alertas: préstamos por vencer y vencidos
+        Index("ix_prestamos_estado_fecha_vencimiento", "estado_prestamo", "fecha_vencimiento"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     equipo_id = Column(Integer, ForeignKey("equipos.id"), nullable=False)
@@ -83,6 +135,77 @@ class Prestamo(Base):
     trabajador = relationship("Trabajador", back_populates="prestamos")
 
 
+class PrestamoHistorico(Base):
+    """Préstamos devueltos archivados (mismas columnas e id que en prestamos).
+    
+    Los mueve por lotes app/archivo_prestamos.py; los historiales por trabajador
+    y por equipo leen ambas tablas.
+    """
+    __tablename__ = "prestamos_historico"
+    __table_args__ = (
+        Index("ix_prestamos_historico_trabajador_fecha_prestamo", "trabajador_rut", "fecha_prestamo"),
+        Index("ix_prestamos_historico_equipo_fecha_prestamo", "equipo_id", "fecha_prestamo"),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    equipo_id = Column(Integer, ForeignKey("equipos.id", ondelete="CASCADE"), nullable=False)
+    trabajador_rut = Column(String, ForeignKey("trabajadores.rut"), nullable=False)
+    fecha_prestamo = Column(DateTime, nullable=False)
+    fecha_vencimiento = Column(DateTime, nullable=False)
+    estado_prestamo = Column(SQLEnum(EstadoPrestamo), nullable=False)
+    cambiado_por = Column(Text, nullable=True)
+    estado_entrega_bueno = Column(Boolean, nullable=True)
+    estado_entrega_con_cargador = Column(Boolean, nullable=True)
+    observaciones_entrega = Column(Text, nullable=True)
+    fecha_devolucion = Column(DateTime, nullable=True)
+    estado_devolucion_bueno = Column(Boolean, nullable=True)
+    estado_devolucion_con_cargador = Column(Boolean, nullable=True)
+    observaciones_devolucion = Column(Text, nullable=True)
+    cargador_devuelto_despues = Column(Boolean, nullable=True)
+    archivado_en = Column(DateTime, default=func.now(), nullable=False)
+    
+    equipo = relationship("Equipo", viewonly=True)
+    trabajador = relationship("Trabajador", viewonly=True)
+
+
+class AlertaActiva(Base):
+    """Alertas vigentes (vencido, por vencer, despido, problema de devolución), una por préstamo y tipo.
+    
+    Se mantiene en la misma transacción que los cambios de préstamos y trabajadores;
+    ver app/alertas_activas.py
+    """
+    __tablename__ = "alertas_activas"
+    __table_args__ = (
+        Index("ux_alertas_activas_prestamo_tipo", "prestamo_id", "tipo", unique=True),
+        Index("ix_alertas_activas_obra_tipo", "obra", "tipo"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    prestamo_id = Column(Integer, ForeignKey("prestamos.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String, nullable=False)  # VENCIDO, POR_VENCER, DESPIDO, PROBLEMA
+    obra = Column(String, nullable=False)
+    fecha_vencimiento = Column(DateTime, nullable=True)
+    creada_en = Column(DateTime, default=func.now(), nullable=False)
+
+
+class EstadisticaDiaria(Base):
+    """Resumen diario de préstamos por obra y tipo de equipo (gráficos históricos).
+    
+    Los endpoints de préstamos suman los contadores del día en la misma transacción;
+    la compactación nocturna recalcula los últimos días y el campo activos. Ver
+    app/estadisticas_diarias.py
+    """
+    __tablename__ = "estadisticas_diarias"
+    
+    fecha = Column(Date, primary_key=True)
+    obra = Column(String, primary_key=True)  # Obra del trabajador ("" si no tiene)
+    tipo = Column(String, primary_key=True)  # Tipo de equipo ("" si no tiene)
+    prestados = Column(Integer, default=0, nullable=False)  # Préstamos creados ese día
+    devueltos = Column(Integer, default=0, nullable=False)  # Préstamos devueltos ese día
+    vencidos = Column(Integer, default=0, nullable=False)  # Préstamos que vencieron ese día sin devolverse
+    activos = Column(Integer, default=0, nullable=False)  # Préstamos activos al cierre del día
+
+
 class Obra(Base):
     __tablename__ = "obras"
     
@@ -90,6 +213,29 @@ class Obra(Base):
     nombre = Column(String, unique=True, index=True, nullable=False)
 
 
+class CorreoPendiente(Base):
+    """Bandeja de salida de correos (resumen diario de alertas por obra)"""
+    __tablename__ = "correos_pendientes"
+    __table_args__ = (
+        # Un resumen por obra y día (generar dos veces no duplica)
+        Index("ux_correos_pendientes_tipo_obra_fecha", "tipo", "obra", "fecha", unique=True),
+        Index("ix_correos_pendientes_enviado_en", "enviado_en"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False)  # RESUMEN_ALERTAS
+    obra = Column(String, nullable=False)
+    fecha = Column(DateTime, nullable=False)  # Día del resumen (00:00)
+    destinatarios = Column(Text, nullable=True)  # Emails separados por coma
+    asunto = Column(String, nullable=False)
+    texto = Column(Text, nullable=False)
+    html = Column(Text, nullable=False)
+    creado_en = Column(DateTime, default=func.now(), nullable=False)
+    enviado_en = Column(DateTime, nullable=True)
+    intentos = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)
+
+
 class Usuario(Base):
     __tablename__ = "usuarios"
     
@@ -114,3 +260,14 @@ class AuditoriaLog(Base):
     fecha = Column(DateTime, default=datetime.utcnow, nullable=False)
     ip_address = Column(String, nullable=True)
     user_agent = Column(String, nullable=True)
+
+
+class EjecucionTarea(Base):
+    """Última ejecución de cada tarea programada"""
+    __tablename__ = "ejecuciones_tareas"
+    
+    nombre = Column(String, primary_key=True)
+    ultima_ejecucion = Column(DateTime, nullable=False)
+    duracion_ms = Column(Integer, nullable=True)
+    filas_afectadas = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
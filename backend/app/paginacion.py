@@ -0,0 +1,117 @@
+"""
+Paginación por cursor (keyset) y conteo de resultados para los endpoints de listado
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, and_, or_
+from sqlalchemy.orm import Query as ConsultaORM
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 500
+
+# Cabeceras que el navegador debe poder leer (ver CORS en main.py)
+CABECERA_CURSOR = "X-Next-Cursor"
+CABECERA_TOTAL = "X-Total-Count"
+CABECERA_TIPO_TOTAL = "X-Total-Count-Tipo"
+CABECERAS_PAGINACION = [CABECERA_CURSOR, CABECERA_TOTAL, CABECERA_TIPO_TOTAL]
+
+# Cada elemento del orden es (columna, descendente)
+Orden = Sequence[Tuple[object, bool]]
+
+
+def codificar_cursor(valores: list) -> str:
+    """Codifica los valores de la última fila en un cursor opaco"""
+    datos = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in valores],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, orden: Orden) -> list:
+    """Decodifica un cursor y convierte sus valores al tipo de cada columna"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode("utf-8"))
+        if not isinstance(valores, list) or len(valores) != len(orden):
+            raise ValueError("largo incorrecto")
+        return [
+            datetime.fromisoformat(valor) if isinstance(getattr(columna, "type", None), DateTime) else valor
+            for (columna, _), valor in zip(orden, valores)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def filtro_cursor(orden: Orden, valores: list):
+    """Condición "fila posterior al cursor" para un orden compuesto.
+
+    Para (a, b) ascendente equivale a (a > va) OR (a = va AND b > vb).
+    """
+    condiciones = []
+    for i, (columna, descendente) in enumerate(orden):
+        iguales = [col == valores[j] for j, (col, _) in enumerate(orden[:i])]
+        siguiente = columna < valores[i] if descendente else columna > valores[i]
+        condiciones.append(and_(*iguales, siguiente))
+    return or_(*condiciones)
+
+
+def contar(db, query: ConsultaORM, modo: str) -> Tuple[int, str]:
+    """Cuenta los resultados de una consulta.
+
+    El modo "estimado" usa el estimador del planificador de PostgreSQL
+    (EXPLAIN sin ejecutar la consulta); en otros motores se cuenta exacto.
+    """
+    query = query.order_by(None)
+    if modo == "estimado" and db.get_bind().dialect.name == "postgresql":
+        compilada = query.statement.compile(
+            dialect=db.get_bind().dialect,
+            compile_kwargs={"render_postcompile": True}
+        )
+        plan = db.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compilada}", compilada.params
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), "estimado"
+    return query.count(), "exacto"
+
+
+def paginar(
+    db,
+    query: ConsultaORM,
+    orden: Orden,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    conteo: Optional[str] = None,
+    valores_fila: Optional[Callable[[object], list]] = None,
+) -> List:
+    """Aplica orden estable, cursor y límite a una consulta.
+
+    Sin límite se devuelven LIMITE_POR_DEFECTO filas. Si quedan más, el cursor
+    de la página siguiente se envía en la cabecera X-Next-Cursor (los clientes
+    que necesitan la lista completa la recorren con él).
+    """
+    if conteo:
+        total, tipo = contar(db, query, conteo)
+        response.headers[CABECERA_TOTAL] = str(total)
+        response.headers[CABECERA_TIPO_TOTAL] = tipo
+
+    if valores_fila is None:
+        valores_fila = lambda fila: [getattr(fila, columna.key) for columna, _ in orden]
+
+    query = query.order_by(*[columna.desc() if desc else columna.asc() for columna, desc in orden])
+
+    if cursor:
+        query = query.filter(filtro_cursor(orden, decodificar_cursor(cursor, orden)))
+
+    limit = min(limit or LIMITE_POR_DEFECTO, LIMITE_MAXIMO)
+    filas = query.limit(limit + 1).all()
+    if len(filas) > limit:
+        filas = filas[:limit]
+        response.headers[CABECERA_CURSOR] = codificar_cursor(valores_fila(filas[-1]))
+    return filas
@@ -0,0 +1,47 @@
+"""
+Problemas pendientes de préstamos devueltos (sin cargador o equipo en mal estado)
+"""
+from typing import List
+from sqlalchemy import and_, or_, func
+from .models import Prestamo, EstadoPrestamo
+
+
+def condicion_problema_pendiente():
+    """Condición SQL: devuelto sin cargador (y no entregado después) o en mal estado.
+    
+    Nunca es NULL (se puede negar): los devueltos antes de registrar el estado
+    de devolución tienen esos campos en NULL y no cuentan como problema.
+    """
+    return and_(
+        Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
+        or_(
+            and_(
+                Prestamo.estado_devolucion_con_cargador.is_(False),
+                func.coalesce(Prestamo.cargador_devuelto_despues, False).is_(False)
+            ),
+            Prestamo.estado_devolucion_bueno.is_(False)
+        )
+    )
+
+
+def problemas(prestamo: Prestamo) -> List[str]:
+    """Descripción de los problemas pendientes de un préstamo devuelto"""
+    resultado = []
+    if prestamo.estado_devolucion_con_cargador == False and not prestamo.cargador_devuelto_despues:
+        resultado.append("Sin cargador")
+    if prestamo.estado_devolucion_bueno == False:
+        resultado.append("Equipo en mal estado")
+    return resultado
+
+
+def alerta(prestamo: Prestamo) -> dict:
+    """Alerta de un préstamo con problemas (requiere el equipo cargado)"""
+    return {
+        "prestamo_id": prestamo.id,
+        "equipo_serie": prestamo.equipo.serie,
+        "equipo_tipo": prestamo.equipo.tipo,
+        "fecha_devolucion": prestamo.fecha_devolucion,
+        "problemas": problemas(prestamo),
+        "observaciones": prestamo.observaciones_devolucion,
+        "cargador_devuelto": prestamo.cargador_devuelto_despues
+    }
@@ -0,0 +1,321 @@
+"""
+Generación de códigos QR de equipos: imagen individual y hojas de etiquetas
+
+La URL base del frontend se resuelve una sola vez por proceso. Los PNG
+individuales se guardan en un caché LRU en memoria (y opcionalmente en disco,
+QR_CACHE_DIR) indexado por el hash de su contenido de entrada, que sirve
+también como ETag.
+
+Las hojas de etiquetas se renderizan por página en un pool de procesos
+(el renderizado de QR y Pillow son intensivos en CPU) y el PDF se envía a
+medida que cada página está lista.
+"""
+import asyncio
+import hashlib
+import os
+import socket
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import AsyncIterator, List, Optional, Tuple
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+# Parámetros del QR individual
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+
+# Hoja A4 a 150 dpi, 3 columnas x 5 filas de etiquetas
+DPI = 150
+ANCHO_PAGINA_PX = 1240
+ALTO_PAGINA_PX = 1754
+MARGEN_PX = 60
+COLUMNAS = 3
+FILAS = 5
+ETIQUETAS_POR_PAGINA = COLUMNAS * FILAS
+LADO_QR_PX = 240
+
+# Caché de PNG individuales
+MAX_CACHE_QR = int(os.getenv("QR_CACHE_MAX", "512"))
+DIRECTORIO_CACHE_QR = os.getenv("QR_CACHE_DIR", "")
+
+# Procesos para renderizar hojas (0 = usar hilos en el mismo proceso)
+PROCESOS_QR = int(os.getenv("QR_PROCESOS", str(min(4, os.cpu_count() or 1))))
+
+# (url, serie, tipo) de cada etiqueta
+Etiqueta = Tuple[str, str, str]
+
+_pool: Optional[Executor] = None
+_frontend_url: Optional[str] = None
+
+
+def _get_local_ip() -> str:
+    """Obtener la IP local de la red"""
+    try:
+        # Conectar a un servidor externo para obtener la IP local
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+        s.close()
+        return ip
+    except Exception:
+        return "localhost"
+
+
+def resolver_frontend_url() -> str:
+    """URL del frontend que se codifica en los QR.
+
+    Usa FRONTEND_URL si está configurada; en desarrollo usa la IP local para
+    que funcione desde celulares en la misma red.
+    """
+    frontend_url_env = os.getenv("FRONTEND_URL", "")
+    if frontend_url_env and "localhost" not in frontend_url_env:
+        return frontend_url_env
+    local_ip = _get_local_ip()
+    if local_ip and local_ip != "localhost" and local_ip.startswith("192.168"):
+        return f"http://{local_ip}:5173"
+    # Fallback a IP conocida si la detección falla
+    return "http://192.168.1.113:5173"
+
+
+def frontend_url() -> str:
+    """URL del frontend resuelta una sola vez (en el arranque de la app)"""
+    global _frontend_url
+    if _frontend_url is None:
+        _frontend_url = resolver_frontend_url()
+    return _frontend_url
+
+
+def url_equipo(frontend_url: str, equipo_id: int) -> str:
+    # El móvil extrae el ID del equipo de esta URL y lo procesa directamente
+    return f"{frontend_url}/qr/equipo/{equipo_id}"
+
+
+def _imagen_qr(url: str, box_size: int = QR_BOX_SIZE, border: int = QR_BORDER):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white").get_image()
+
+
+def renderizar_qr_png(url: str) -> bytes:
+    """PNG del QR de un equipo"""
+    img_io = BytesIO()
+    _imagen_qr(url).save(img_io, format="PNG")
+    return img_io.getvalue()
+
+
+class _CachePNG:
+    """LRU acotado de PNG en memoria, con respaldo opcional en disco"""
+
+    def __init__(self, maximo: int, directorio: str = ""):
+        self.maximo = maximo
+        self.directorio = directorio
+        self._datos: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.png")
+
+    def _guardar_memoria(self, clave: str, png: bytes) -> None:
+        with self._lock:
+            self._datos[clave] = png
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._datos.get(clave)
+            if png is not None:
+                self._datos.move_to_end(clave)
+                return png
+        if not self.directorio:
+            return None
+        try:
+            with open(self._ruta(clave), "rb") as archivo:
+                png = archivo.read()
+        except OSError:
+            return None
+        self._guardar_memoria(clave, png)
+        return png
+
+    def guardar(self, clave: str, png: bytes) -> None:
+        self._guardar_memoria(clave, png)
+        if not self.directorio:
+            return
+        try:
+            # Escritura atómica: otro proceso nunca lee un archivo a medias
+            temporal = f"{self._ruta(clave)}.{os.getpid()}.tmp"
+            with open(temporal, "wb") as archivo:
+                archivo.write(png)
+            os.replace(temporal, self._ruta(clave))
+        except OSError as e:
+            print(f"Advertencia: No se pudo guardar QR en caché de disco: {e}")
+
+
+_cache_png = _CachePNG(MAX_CACHE_QR, DIRECTORIO_CACHE_QR)
+
+
+def clave_qr(url: str, box_size: int = QR_BOX_SIZE, border: int = QR_BORDER) -> str:
+    """Hash del contenido y parámetros del QR (clave de caché y ETag)"""
+    datos = f"{url}|H|{box_size}|{border}".encode()
+    return hashlib.sha256(datos).hexdigest()[:32]
+
+
+def qr_png_cacheado(url: str, clave: Optional[str] = None) -> bytes:
+    """PNG del QR desde el caché, renderizándolo si no está"""
+    clave = clave or clave_qr(url)
+    png = _cache_png.obtener(clave)
+    if png is None:
+        png = renderizar_qr_png(url)
+        _cache_png.guardar(clave, png)
+    return png
+
+
+def _fuente(tamano: int):
+    try:
+        return ImageFont.load_default(size=tamano)
+    except TypeError:
+        # Pillow < 10.1 no permite elegir tamaño
+        return ImageFont.load_default()
+
+
+def renderizar_pagina(etiquetas: List[Etiqueta]) -> Tuple[int, int, bytes]:
+    """Renderiza una página de etiquetas (se ejecuta en el pool de procesos).
+
+    Retorna ancho, alto y los píxeles en escala de grises comprimidos con zlib,
+    listos para incrustar en el PDF.
+    """
+    pagina = Image.new("L", (ANCHO_PAGINA_PX, ALTO_PAGINA_PX), 255)
+    dibujo = ImageDraw.Draw(pagina)
+    fuente_serie = _fuente(26)
+    fuente_tipo = _fuente(20)
+    ancho_celda = (ANCHO_PAGINA_PX - 2 * MARGEN_PX) // COLUMNAS
+    alto_celda = (ALTO_PAGINA_PX - 2 * MARGEN_PX) // FILAS
+
+    for i, (url, serie, tipo) in enumerate(etiquetas[:ETIQUETAS_POR_PAGINA]):
+        x = MARGEN_PX + (i % COLUMNAS) * ancho_celda
+        y = MARGEN_PX + (i // COLUMNAS) * alto_celda
+        # Línea de corte
+        dibujo.rectangle([x, y, x + ancho_celda - 1, y + alto_celda - 1], outline=200)
+
+        qr = _imagen_qr(url, box_size=4, border=2).convert("L")
+        qr = qr.resize((LADO_QR_PX, LADO_QR_PX), Image.NEAREST)
+        pagina.paste(qr, (x + (ancho_celda - LADO_QR_PX) // 2, y + 12))
+
+        for texto, fuente, desplazamiento in ((serie, fuente_serie, 258), (tipo or "", fuente_tipo, 290)):
+            ancho_texto = dibujo.textlength(texto, font=fuente)
+            dibujo.text((x + (ancho_celda - ancho_texto) / 2, y + desplazamiento), texto, fill=0, font=fuente)
+
+    return ANCHO_PAGINA_PX, ALTO_PAGINA_PX, zlib.compress(pagina.tobytes(), 6)
+
+
+class _EscritorPDF:
+    """Escribe un PDF página a página (cada página es una imagen a hoja completa).
+
+    El objeto /Pages y la tabla xref se escriben al final, así cada página
+    puede enviarse en cuanto está renderizada.
+    """
+    CATALOGO = 1
+    PAGINAS = 2
+
+    def __init__(self):
+        self.posicion = 0
+        self.offsets = {}
+        self.paginas = []
+        self.siguiente = 3
+
+    def _objeto(self, numero: int, cuerpo: bytes) -> bytes:
+        self.offsets[numero] = self.posicion
+        datos = f"{numero} 0 obj\n".encode() + cuerpo + b"\nendobj\n"
+        self.posicion += len(datos)
+        return datos
+
+    def _stream(self, diccionario: str, datos: bytes) -> bytes:
+        return f"<< {diccionario} /Length {len(datos)} >>\nstream\n".encode() + datos + b"\nendstream"
+
+    def inicio(self) -> bytes:
+        cabecera = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.posicion = len(cabecera)
+        return cabecera + self._objeto(self.CATALOGO, f"<< /Type /Catalog /Pages {self.PAGINAS} 0 R >>".encode())
+
+    def pagina(self, ancho_px: int, alto_px: int, pixeles: bytes) -> bytes:
+        imagen, contenido, pagina = self.siguiente, self.siguiente + 1, self.siguiente + 2
+        self.siguiente += 3
+        self.paginas.append(pagina)
+        ancho_pt = round(ancho_px * 72 / DPI, 2)
+        alto_pt = round(alto_px * 72 / DPI, 2)
+        return (
+            self._objeto(imagen, self._stream(
+                f"/Type /XObject /Subtype /Image /Width {ancho_px} /Height {alto_px} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode",
+                pixeles
+            ))
+            + self._objeto(contenido, self._stream("", f"q {ancho_pt} 0 0 {alto_pt} 0 0 cm /Im0 Do Q".encode()))
+            + self._objeto(pagina, (
+                f"<< /Type /Page /Parent {self.PAGINAS} 0 R /MediaBox [0 0 {ancho_pt} {alto_pt}] "
+                f"/Resources << /XObject << /Im0 {imagen} 0 R >> >> /Contents {contenido} 0 R >>"
+            ).encode())
+        )
+
+    def fin(self) -> bytes:
+        kids = " ".join(f"{numero} 0 R" for numero in self.paginas)
+        datos = self._objeto(self.PAGINAS, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>".encode())
+        inicio_xref = self.posicion
+        total = self.siguiente
+        xref = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        xref += [f"{self.offsets[numero]:010d} 00000 n \n" for numero in range(1, total)]
+        xref.append(f"trailer\n<< /Size {total} /Root {self.CATALOGO} 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        return datos + "".join(xref).encode()
+
+
+def _obtener_pool() -> Executor:
+    global _pool
+    if _pool is None:
+        if PROCESOS_QR > 0:
+            _pool = ProcessPoolExecutor(max_workers=PROCESOS_QR)
+        else:
+            _pool = ThreadPoolExecutor(max_workers=2)
+    return _pool
+
+
+def cerrar_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def hoja_etiquetas_pdf(etiquetas: List[Etiqueta]) -> AsyncIterator[bytes]:
+    """Genera el PDF de etiquetas por partes, en el orden de las páginas.
+
+    Todas las páginas se envían al pool de inmediato y se renderizan en
+    paralelo; el event loop solo espera resultados.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _obtener_pool()
+    futuros = [
+        loop.run_in_executor(pool, renderizar_pagina, etiquetas[i:i + ETIQUETAS_POR_PAGINA])
+        for i in range(0, len(etiquetas), ETIQUETAS_POR_PAGINA)
+    ]
+    escritor = _EscritorPDF()
+    try:
+        yield escritor.inicio()
+        for futuro in futuros:
+            ancho, alto, pixeles = await futuro
+            yield escritor.pagina(ancho, alto, pixeles)
+        yield escritor.fin()
+    finally:
+        # Si el cliente se desconecta, no seguir renderizando páginas
+        for futuro in futuros:
+            futuro.cancel()
@@ -0,0 +1,153 @@
+"""
+Resumen diario de alertas por obra (equipos vencidos y de trabajadores despedidos)
+
+generar_resumenes() lee alertas_activas de todas las obras en una sola consulta
+y deja un correo por obra (texto y HTML) en la tabla correos_pendientes, dirigido
+a los JEFE_OBRA activos de esa obra. enviar_pendientes() los entrega por SMTP.
+Se ejecutan desde cron con scripts/generar_resumen_alertas.py y
+scripts/enviar_correos.py.
+"""
+import smtplib
+from datetime import datetime, time
+from email.message import EmailMessage
+from html import escape
+from typing import Dict, List, Optional
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import CorreoPendiente, Usuario, RolUsuario
+from . import alertas_activas
+
+TIPO_RESUMEN = "RESUMEN_ALERTAS"
+TAREA_RESUMEN = "resumen_alertas"
+TAREA_ENVIO = "enviar_correos"
+MAX_INTENTOS_ENVIO = 5
+
+_TITULOS = {
+    alertas_activas.VENCIDO: "Equipos con préstamo vencido",
+    alertas_activas.DESPIDO: "Equipos en poder de trabajadores despedidos",
+}
+
+
+def _agrupar_por_obra(db: Session, ahora: datetime) -> Dict[str, Dict[str, list]]:
+    """Alertas de todas las obras en una consulta, agrupadas por obra y tipo"""
+    filas = alertas_activas.consulta(
+        db, [alertas_activas.VENCIDO, alertas_activas.POR_VENCER, alertas_activas.DESPIDO]
+    ).all()
+    por_obra: Dict[str, Dict[str, list]] = {}
+    for fila in filas:
+        tipo = alertas_activas.tipo_vigente(fila.tipo, fila.fecha_vencimiento, ahora)
+        if tipo not in _TITULOS:
+            continue
+        por_obra.setdefault(fila.obra, {}).setdefault(tipo, []).append(fila)
+    for tipos in por_obra.values():
+        for lista in tipos.values():
+            lista.sort(key=lambda fila: (fila.fecha_vencimiento or ahora, fila.equipo_serie))
+    return por_obra
+
+
+def _destinatarios(db: Session) -> Dict[str, List[str]]:
+    """Emails de los JEFE_OBRA activos por obra"""
+    destinatarios: Dict[str, List[str]] = {}
+    for usuario in db.query(Usuario.obra, Usuario.email).filter(
+        and_(Usuario.rol == RolUsuario.JEFE_OBRA, Usuario.activo == True, Usuario.email.isnot(None))
+    ):
+        destinatarios.setdefault(usuario.obra, []).append(usuario.email)
+    return destinatarios
+
+
+def _linea(tipo: str, fila, ahora: datetime) -> str:
+    if tipo == alertas_activas.VENCIDO:
+        dias = (ahora - fila.fecha_vencimiento).days
+        return f"{fila.equipo_serie} - {fila.trabajador_nombre} (vencido hace {dias} días)"
+    return f"{fila.equipo_serie} - {fila.trabajador_nombre}"
+
+
+def renderizar(obra: str, alertas: Dict[str, list], ahora: datetime) -> Dict[str, str]:
+    """Asunto, texto y HTML del resumen de una obra"""
+    total = sum(len(lista) for lista in alertas.values())
+    asunto = f"[Aura] {total} alertas de equipos en {obra} - {ahora:%d-%m-%Y}"
+    texto = [f"Resumen de alertas de {obra} al {ahora:%d-%m-%Y}", ""]
+    html = [f"<h2>Resumen de alertas de {escape(obra)} al {ahora:%d-%m-%Y}</h2>"]
+    for tipo, titulo in _TITULOS.items():
+        lista = alertas.get(tipo)
+        if not lista:
+            continue
+        lineas = [_linea(tipo, fila, ahora) for fila in lista]
+        texto += [f"{titulo} ({len(lista)}):"] + [f"  - {linea}" for linea in lineas] + [""]
+        html.append(f"<h3>{escape(titulo)} ({len(lista)})</h3>")
+        html.append("<ul>" + "".join(f"<li>{escape(linea)}</li>" for linea in lineas) + "</ul>")
+    return {"asunto": asunto, "texto": "\n".join(texto), "html": "\n".join(html)}
+
+
+def generar_resumenes(db: Session, ahora: Optional[datetime] = None) -> int:
+    """Deja en la bandeja de salida el resumen del día de cada obra con alertas.
+    
+    Es idempotente: las obras que ya tienen resumen ese día no se vuelven a generar.
+    """
+    ahora = ahora or datetime.utcnow()
+    fecha = datetime.combine(ahora.date(), time.min)
+    por_obra = _agrupar_por_obra(db, ahora)
+    if not por_obra:
+        return 0
+    existentes = {
+        obra for (obra,) in db.query(CorreoPendiente.obra).filter(
+            and_(CorreoPendiente.tipo == TIPO_RESUMEN, CorreoPendiente.fecha == fecha)
+        )
+    }
+    destinatarios = _destinatarios(db)
+    nuevos = [
+        {
+            "tipo": TIPO_RESUMEN,
+            "obra": obra,
+            "fecha": fecha,
+            "destinatarios": ",".join(destinatarios.get(obra, [])) or None,
+            "creado_en": ahora,
+            **renderizar(obra, alertas, ahora),
+        }
+        for obra, alertas in sorted(por_obra.items()) if obra not in existentes
+    ]
+    if nuevos:
+        db.execute(CorreoPendiente.__table__.insert(), nuevos)
+    return len(nuevos)
+
+
+def _mensaje(correo: CorreoPendiente) -> EmailMessage:
+    mensaje = EmailMessage()
+    mensaje["Subject"] = correo.asunto
+    mensaje["From"] = settings.SMTP_REMITENTE
+    mensaje["To"] = correo.destinatarios
+    mensaje.set_content(correo.texto)
+    mensaje.add_alternative(correo.html, subtype="html")
+    return mensaje
+
+
+def enviar_pendientes(db: Session, limite: int = 200) -> int:
+    """Envía por SMTP los correos pendientes con destinatarios. Retorna la cantidad enviada."""
+    pendientes = db.query(CorreoPendiente).filter(
+        and_(
+            CorreoPendiente.enviado_en.is_(None),
+            CorreoPendiente.destinatarios.isnot(None),
+            CorreoPendiente.intentos < MAX_INTENTOS_ENVIO
+        )
+    ).order_by(CorreoPendiente.id).limit(limite).all()
+    if not pendientes:
+        return 0
+    enviados = 0
+    with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30) as smtp:
+        if settings.SMTP_TLS:
+            smtp.starttls()
+        if settings.SMTP_USUARIO:
+            smtp.login(settings.SMTP_USUARIO, settings.SMTP_PASSWORD)
+        for correo in pendientes:
+            correo.intentos += 1
+            try:
+                smtp.send_message(_mensaje(correo))
+                correo.enviado_en = datetime.utcnow()
+                correo.error = None
+                enviados += 1
+            except smtplib.SMTPException as e:
+                correo.error = str(e)
+            # Confirmar cada envío para no repetirlo si el proceso se interrumpe
+            db.commit()
+    return enviados
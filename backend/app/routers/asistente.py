@@ -4,10 +4,12 @@ from sqlalchemy import func, or_
 from typing import List, Dict, Tuple, Optional
 from pydantic import BaseModel
 from ..database import get_db
-from ..models import Equipo, Prestamo, Trabajador, EstadoPrestamo, Usuario
+from ..models import Equipo, Prestamo, Trabajador, Usuario, ESTADOS_ACTIVOS
 from ..auth import get_current_user
 from ..config import settings
 from ..motor_ia import motor_ia
+from ..busqueda import buscar_equipos, CAMPOS_SERIE
+from .. import estado_equipos
 import re
 import os
 import json
@@ -93,15 +95,11 @@ def procesar_con_ia(mensaje: str, db: Session, user: Usuario, historial: List[Me
     
     equipos_disponibles_count = len(db.query(Equipo).filter(
         Equipo.estado_dispositivo == "OPERATIVO",
-        ~Equipo.id.in_(
-            db.query(Prestamo.equipo_id).filter(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            )
-        )
+        estado_equipos.condicion_disponible()
     ).all())
     
     equipos_asignados_count = db.query(func.count(Prestamo.id)).filter(
-        Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+        Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
     ).scalar() or 0
     
     # Intentar usar Gemini si está configurado (TEMPORALMENTE DESHABILITADO - modelos no disponibles)
@@ -224,18 +222,14 @@ def obtener_contexto_sistema(db: Session) -> str:
         # Obtener TODOS los equipos disponibles con detalles
         equipos_disponibles_lista = db.query(Equipo).filter(
             Equipo.estado_dispositivo == "OPERATIVO",
-            ~Equipo.id.in_(
-                db.query(Prestamo.equipo_id).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                )
-            )
+            estado_equipos.condicion_disponible()
         ).all()
         
         equipos_disponibles_count = len(equipos_disponibles_lista)
         
         # Obtener equipos asignados (en préstamo)
         equipos_asignados_count = db.query(func.count(Prestamo.id)).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).scalar() or 0
         
         prestamos_activos = equipos_asignados_count
@@ -247,21 +241,13 @@ def obtener_contexto_sistema(db: Session) -> str:
         # Obtener trabajadores con equipos asignados
         trabajadores_con_equipos = db.query(Trabajador).filter(
             Trabajador.activo == True,
-            Trabajador.rut.in_(
-                db.query(Prestamo.trabajador_rut).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).distinct()
-            )
+            Trabajador.rut.in_(estado_equipos.ruts_con_equipos())
         ).all()
         
         # Obtener trabajadores sin equipos asignados
         trabajadores_sin_equipos = db.query(Trabajador).filter(
             Trabajador.activo == True,
-            ~Trabajador.rut.in_(
-                db.query(Prestamo.trabajador_rut).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).distinct()
-            )
+            ~Trabajador.rut.in_(estado_equipos.ruts_con_equipos())
         ).all()
         
         # Construir lista de trabajadores con equipos
@@ -269,7 +255,7 @@ def obtener_contexto_sistema(db: Session) -> str:
         for t in trabajadores_con_equipos:
             prestamos = db.query(Prestamo).filter(
                 Prestamo.trabajador_rut == t.rut,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
             ).all()
             equipos_asignados = [p.equipo.serie for p in prestamos]
             trabajadores_con_equipos_lista.append({
@@ -318,15 +304,13 @@ def obtener_contexto_sistema(db: Session) -> str:
             todos_equipos_por_tipo[tipo].append(eq)
         
         # Construir lista detallada de TODOS los equipos
+        equipos_prestados = estado_equipos.ids_prestados(db)
         todos_equipos_detalle = []
         for tipo, equipos in todos_equipos_por_tipo.items():
             todos_equipos_detalle.append(f"\n{tipo} ({len(equipos)} en total):")
             for eq in equipos:
                 # Verificar si está asignado
-                esta_asignado = db.query(Prestamo).filter(
-                    Prestamo.equipo_id == eq.id,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).first() is not None
+                esta_asignado = eq.id in equipos_prestados
                 
                 estado_texto = "ASIGNADO" if esta_asignado else "DISPONIBLE"
                 marca_modelo = f"{eq.marca} {eq.modelo}".strip() if eq.marca or eq.modelo else "Sin especificar"
@@ -336,7 +320,7 @@ def obtener_contexto_sistema(db: Session) -> str:
         
         # Obtener TODOS los equipos PRESTADOS/ASIGNADOS con detalles
         prestamos_activos_lista = db.query(Prestamo).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).all()
         
         # Agrupar equipos prestados por tipo
@@ -475,11 +459,7 @@ def procesar_mensaje_con_historial(mensaje: str, db: Session, user: Usuario, his
                 # Si hay un equipo mencionado en el historial, usarlo
                 equipos_disponibles = db.query(Equipo).filter(
                     Equipo.estado_dispositivo == "OPERATIVO",
-                    ~Equipo.id.in_(
-                        db.query(Prestamo.equipo_id).filter(
-                            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                        )
-                    )
+                    estado_equipos.condicion_disponible()
                 ).all()
                 if len(equipos_disponibles) == 1:
                     # Si solo hay un equipo disponible, probablemente se refiere a ese
@@ -546,7 +526,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
                 print(f"DEBUG: Buscando equipo con serie: {serie_limpia}")
                 
                 # Buscar por serie (con y sin guiones)
-                equipo = db.query(Equipo).filter(Equipo.serie.ilike(f"%{serie_limpia}%")).first()
+                equipo = buscar_equipos(db, serie_limpia, CAMPOS_SERIE).first()
                 if not equipo:
                     # Buscar sin guiones
                     equipo = db.query(Equipo).filter(
@@ -557,7 +537,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
                     print(f"DEBUG: Equipo encontrado: {equipo.serie}")
                     prestamo_activo = db.query(Prestamo).filter(
                         Prestamo.equipo_id == equipo.id,
-                        Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                        Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
                     ).first()
                     
                     if prestamo_activo:
@@ -582,7 +562,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
             for eq in equipos_tipo:
                 prestamo = db.query(Prestamo).filter(
                     Prestamo.equipo_id == eq.id,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                    Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
                 ).first()
                 if prestamo:
                     prestados.append({'equipo': eq, 'prestamo': prestamo})
@@ -606,7 +586,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
     ]):
         print(f"DEBUG: Detectada pregunta sobre equipos PRESTADOS")
         prestamos_activos = db.query(Prestamo).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).all()
         
         if not prestamos_activos:
@@ -645,11 +625,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         print(f"DEBUG: Detectada pregunta sobre equipos disponibles")
         equipos_disponibles = db.query(Equipo).filter(
             Equipo.estado_dispositivo == "OPERATIVO",
-            ~Equipo.id.in_(
-                db.query(Prestamo.equipo_id).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                )
-            )
+            estado_equipos.condicion_disponible()
         ).all()
         
         if not equipos_disponibles:
@@ -683,11 +659,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         print(f"DEBUG: Detectada pregunta sobre trabajadores CON equipos asignados")
         trabajadores_con_equipos = db.query(Trabajador).filter(
             Trabajador.activo == True,
-            Trabajador.rut.in_(
-                db.query(Prestamo.trabajador_rut).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).distinct()
-            )
+            Trabajador.rut.in_(estado_equipos.ruts_con_equipos())
         ).all()
         
         if not trabajadores_con_equipos:
@@ -697,7 +669,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         for t in trabajadores_con_equipos:
             prestamos = db.query(Prestamo).filter(
                 Prestamo.trabajador_rut == t.rut,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
             ).all()
             equipos_series = [p.equipo.serie for p in prestamos]
             equipos_str = ", ".join(equipos_series)
@@ -715,11 +687,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         print(f"DEBUG: Detectada pregunta sobre trabajadores SIN equipos asignados")
         trabajadores_sin_equipos = db.query(Trabajador).filter(
             Trabajador.activo == True,
-            ~Trabajador.rut.in_(
-                db.query(Prestamo.trabajador_rut).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).distinct()
-            )
+            ~Trabajador.rut.in_(estado_equipos.ruts_con_equipos())
         ).all()
         
         if not trabajadores_sin_equipos:
@@ -750,7 +718,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         for t in trabajadores_activos[:20]:  # Limitar a 20 para no saturar
             prestamos_count = db.query(Prestamo).filter(
                 Prestamo.trabajador_rut == t.rut,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
             ).count()
             respuesta += f"• {t.nombre} (RUT: {t.rut}) - Obra: {t.obra}"
             if prestamos_count > 0:
@@ -770,7 +738,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
     ]):
         print(f"DEBUG: Detectada pregunta sobre préstamos activos")
         prestamos_activos = db.query(Prestamo).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).all()
         
         if not prestamos_activos:
@@ -807,15 +775,13 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
             tipos[tipo].append(eq)
         
         # Verificar estado de cada equipo
+        equipos_prestados = estado_equipos.ids_prestados(db)
         respuesta = f"Hay {len(todos_los_equipos)} equipos en total:\n\n"
         for tipo, equipos_lista in tipos.items():
             respuesta += f"📦 {tipo} ({len(equipos_lista)} en total):\n"
             for eq in equipos_lista:
                 # Verificar si está asignado
-                esta_asignado = db.query(Prestamo).filter(
-                    Prestamo.equipo_id == eq.id,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                ).first() is not None
+                esta_asignado = eq.id in equipos_prestados
                 
                 estado_texto = "ASIGNADO" if esta_asignado else "DISPONIBLE"
                 marca_modelo = f"{eq.marca} {eq.modelo}".strip() if eq.marca or eq.modelo else "Sin especificar"
@@ -834,7 +800,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
         ).scalar() or 0
         
         prestamos_activos = db.query(func.count(Prestamo.id)).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).scalar() or 0
         
         trabajadores_activos = db.query(func.count(Trabajador.rut)).filter(
@@ -855,11 +821,7 @@ def procesar_mensaje_mejorado(mensaje: str, db: Session, user: Usuario) -> str:
     if any(p in mensaje_lower for p in ["disponible", "libre", "puedo usar", "hay algún", "tengo disponible"]):
         equipos = db.query(Equipo).filter(
             Equipo.estado_dispositivo == "OPERATIVO",
-            ~Equipo.id.in_(
-                db.query(Prestamo.equipo_id).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                )
-            )
+            estado_equipos.condicion_disponible()
         ).limit(5).all()
         if equipos:
             respuesta = f"Sí, hay {len(equipos)} equipos disponibles. Por ejemplo:\n"
@@ -884,11 +846,7 @@ def procesar_mensaje(mensaje: str, db: Session, user: Usuario) -> str:
     if any(palabra in mensaje for palabra in ["equipos disponibles", "equipos libres", "qué equipos hay", "equipos disponibles"]):
         equipos_disponibles = db.query(Equipo).filter(
             Equipo.estado_dispositivo == "OPERATIVO",
-            ~Equipo.id.in_(
-                db.query(Prestamo.equipo_id).filter(
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-                )
-            )
+            estado_equipos.condicion_disponible()
         ).all()
         
         if not equipos_disponibles:
@@ -907,7 +865,7 @@ def procesar_mensaje(mensaje: str, db: Session, user: Usuario) -> str:
     # Consultas sobre préstamos activos
     if any(palabra in mensaje for palabra in ["préstamos activos", "equipos prestados", "quién tiene", "prestamos activos"]):
         prestamos_activos = db.query(Prestamo).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).count()
         
         return f"Actualmente hay {prestamos_activos} préstamos activos."
@@ -925,7 +883,7 @@ def procesar_mensaje(mensaje: str, db: Session, user: Usuario) -> str:
             if trabajador:
                 prestamos = db.query(Prestamo).filter(
                     Prestamo.trabajador_rut == trabajador.rut,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                    Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
                 ).count()
                 
                 return f"{trabajador.nombre} (RUT: {trabajador.rut}) - Obra: {trabajador.obra}. Tiene {prestamos} equipos asignados."
@@ -942,7 +900,7 @@ def procesar_mensaje(mensaje: str, db: Session, user: Usuario) -> str:
             if equipo:
                 prestamo_activo = db.query(Prestamo).filter(
                     Prestamo.equipo_id == equipo.id,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                    Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
                 ).first()
                 
                 estado = f"Prestado a {prestamo_activo.trabajador.nombre}" if prestamo_activo else "Disponible"
@@ -957,7 +915,7 @@ def procesar_mensaje(mensaje: str, db: Session, user: Usuario) -> str:
         ).scalar() or 0
         
         prestamos_activos = db.query(func.count(Prestamo.id)).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         ).scalar() or 0
         
         trabajadores_activos = db.query(func.count(Trabajador.rut)).filter(
@@ -1087,7 +1045,7 @@ def buscar_trabajador_por_serie(mensaje: str, db: Session) -> str:
             if len(serie_limpia) < 4:
                 continue
             
-            equipo = db.query(Equipo).filter(Equipo.serie.ilike(f"%{serie_limpia}%")).first()
+            equipo = buscar_equipos(db, serie_limpia, CAMPOS_SERIE).first()
             if not equipo:
                 equipo = db.query(Equipo).filter(
                     func.replace(Equipo.serie, '-', '').ilike(f"%{serie_limpia}%")
@@ -1096,7 +1054,7 @@ def buscar_trabajador_por_serie(mensaje: str, db: Session) -> str:
             if equipo:
                 prestamo_activo = db.query(Prestamo).filter(
                     Prestamo.equipo_id == equipo.id,
-                    Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                    Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
                 ).first()
                 
                 if prestamo_activo:
@@ -1110,11 +1068,7 @@ def listar_equipos_disponibles(db: Session) -> str:
     """Lista los equipos disponibles"""
     equipos_disponibles = db.query(Equipo).filter(
         Equipo.estado_dispositivo == "OPERATIVO",
-        ~Equipo.id.in_(
-            db.query(Prestamo.equipo_id).filter(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            )
-        )
+        estado_equipos.condicion_disponible()
     ).all()
     
     if not equipos_disponibles:
@@ -1140,7 +1094,7 @@ def listar_equipos_disponibles(db: Session) -> str:
 def listar_equipos_prestados(db: Session) -> str:
     """Lista los equipos prestados"""
     prestamos_activos = db.query(Prestamo).filter(
-        Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+        Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
     ).all()
     
     if not prestamos_activos:
@@ -1182,14 +1136,12 @@ def listar_todos_equipos(db: Session) -> str:
             tipos[tipo] = []
         tipos[tipo].append(eq)
     
+    equipos_prestados = estado_equipos.ids_prestados(db)
     respuesta = f"Hay {len(todos_los_equipos)} equipos en total:\n\n"
     for tipo, equipos_lista in tipos.items():
         respuesta += f"📦 {tipo} ({len(equipos_lista)} en total):\n"
         for eq in equipos_lista:
-            esta_asignado = db.query(Prestamo).filter(
-                Prestamo.equipo_id == eq.id,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            ).first() is not None
+            esta_asignado = eq.id in equipos_prestados
             
             estado_texto = "ASIGNADO" if esta_asignado else "DISPONIBLE"
             marca_modelo = f"{eq.marca} {eq.modelo}".strip() if eq.marca or eq.modelo else "Sin especificar"
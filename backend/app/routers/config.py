@@ -6,7 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import distinct, func, and_
 from ..database import get_db
-from ..models import Trabajador, Equipo, Prestamo, EstadoPrestamo, Usuario, RolUsuario, Obra
+from ..models import Trabajador, Equipo, Prestamo, Usuario, RolUsuario, Obra, ESTADOS_ACTIVOS
 from ..auth import require_role, get_current_user
 from ..schemas import ObraCreate, ObraResponse
 from pydantic import BaseModel
@@ -109,7 +109,7 @@ def get_obras_en_uso(db: Session = Depends(get_db)):
         ).filter(
             and_(
                 Trabajador.obra == obra,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
             )
         ).scalar()
         
@@ -1,130 +1,180 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from pydantic import ValidationError
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, func, insert, update
 from ..database import get_db
-from ..models import Equipo, Prestamo, EstadoPrestamo, Usuario, RolUsuario, Trabajador
-from ..schemas import EquipoResponse, EquipoCreate, EquipoUpdate, EquipoConPrestamo
+from ..models import Equipo, EquipoEstado, Prestamo, EstadoPrestamo, Usuario, RolUsuario, Trabajador, PrestamoHistorico, ESTADOS_ACTIVOS
+from ..schemas import EquipoResponse, EquipoCreate, EquipoUpdate, EquipoUpdateLote, EquipoConPrestamo, EquipoCompacto
 from ..auth import get_current_user, require_role
+from ..paginacion import paginar, LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+from .. import busqueda as busqueda_equipos
+from .. import alertas_activas, estadisticas_diarias, estado_equipos
+from ..importacion import leer_filas, FormatoNoSoportado
+from .. import qr, eventos, vistas
+from ..cache import CacheTTL
+from ..limites import LimitadorPorIP
 from datetime import datetime
-import qrcode
-from io import BytesIO
+import csv
+import os
 
 router = APIRouter(prefix="/api/equipos", tags=["equipos"])
 
+# Filas por INSERT en la importación masiva
+LOTE_IMPORTACION = 1000
 
-@router.get("/", response_model=List[EquipoConPrestamo])
+# Escaneo público de QR: caché de la respuesta y límite por IP
+TTL_ESCANEO_QR = int(os.getenv("QR_INFO_TTL", "60"))
+cache_escaneo_qr = CacheTTL(ttl=TTL_ESCANEO_QR, maximo=5000)
+limite_escaneo_qr = LimitadorPorIP(maximo=int(os.getenv("QR_INFO_LIMITE_IP", "60")), ventana=60)
+
+# Etiquetas por hoja QR (una hoja = un PDF de varias páginas)
+MAX_ETIQUETAS_QR = 1000
+
+
+@router.get("/", response_model=Union[List[EquipoConPrestamo], List[EquipoCompacto]])
 def get_equipos(
+    response: Response,
     obra: Optional[str] = Query(None, description="Filtrar por obra"),
     tipo: Optional[str] = Query(None, description="Filtrar por tipo"),
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     serie: Optional[str] = Query(None, description="Buscar por serie"),
     nombre: Optional[str] = Query(None, description="Buscar por nombre (tipo/marca/modelo)"),
     busqueda: Optional[str] = Query(None, description="Buscar por serie o nombre (tipo/marca/modelo)"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación (cabecera X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=f"Cantidad máxima de resultados (por defecto {LIMITE_POR_DEFECTO})"),
+    conteo: Optional[str] = Query(None, pattern="^(exacto|estimado)$", description="Incluir total en cabecera X-Total-Count"),
+    view: Optional[str] = Query(None, pattern=vistas.PATRON_VISTA, description="compact: solo columnas de listado"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """Obtener equipos según rol del usuario"""
-    query = db.query(Equipo)
+    compacta = view == vistas.VISTA_COMPACTA
+    query = vistas.consulta_equipos(db) if compacta else db.query(Equipo)
     
     # JEFE OBRA solo ve equipos de su obra (a través de préstamos activos)
     if current_user.rol == RolUsuario.JEFE_OBRA:
         if not current_user.obra:
             return []
         # Solo equipos prestados a trabajadores de su obra
-        query = query.join(Prestamo, Equipo.id == Prestamo.equipo_id).join(
-            Trabajador, Prestamo.trabajador_rut == Trabajador.rut
-        ).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
-                Trabajador.obra == current_user.obra
-            )
-        ).distinct()
+        query = query.filter(estado_equipos.condicion_prestado(current_user.obra))
     
     # Filtros opcionales
     if obra and current_user.rol != RolUsuario.JEFE_OBRA:
         # Buscar equipos prestados a trabajadores de esa obra
-        query = query.join(Prestamo, Equipo.id == Prestamo.equipo_id).join(
-            Trabajador, Prestamo.trabajador_rut == Trabajador.rut
-        ).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
-                Trabajador.obra == obra
-            )
-        ).distinct()
+        query = query.filter(estado_equipos.condicion_prestado(obra))
     
     if tipo:
         query = query.filter(Equipo.tipo == tipo)
     if estado:
         query = query.filter(Equipo.estado_dispositivo == estado)
-    if serie:
-        query = query.filter(Equipo.serie.ilike(f"%{serie}%"))
-    if nombre:
+    
+    # Búsquedas por texto (índice de trigramas); el último texto define la relevancia
+    busquedas = []
+    if serie and serie.strip():
+        busquedas.append((serie, busqueda_equipos.CAMPOS_SERIE))
+    if nombre and nombre.strip():
         # Buscar en tipo, marca o modelo
-        query = query.filter(
-            or_(
-                Equipo.tipo.ilike(f"%{nombre}%"),
-                Equipo.marca.ilike(f"%{nombre}%"),
-                Equipo.modelo.ilike(f"%{nombre}%")
-            )
-        )
-    if busqueda:
+        busquedas.append((nombre, busqueda_equipos.CAMPOS_NOMBRE))
+    if busqueda and busqueda.strip():
         # Buscar en serie, tipo, marca o modelo
-        query = query.filter(
-            or_(
-                Equipo.serie.ilike(f"%{busqueda}%"),
-                Equipo.tipo.ilike(f"%{busqueda}%"),
-                Equipo.marca.ilike(f"%{busqueda}%"),
-                Equipo.modelo.ilike(f"%{busqueda}%")
-            )
-        )
+        busquedas.append((busqueda, busqueda_equipos.CAMPOS_TODOS))
+    for texto, campos in busquedas:
+        query = query.filter(busqueda_equipos.condicion(db, texto, campos))
+    
+    orden = [(Equipo.id, False)]
+    valores_fila = None
+    if busquedas:
+        texto, campos = busquedas[-1]
+        orden = [(busqueda_equipos.relevancia(texto, campos), False), (Equipo.id, False)]
+        valores_fila = lambda e: [busqueda_equipos.calcular_relevancia(e, texto, campos), e.id]
     
-    equipos = query.all()
+    equipos = paginar(db, query, orden, response, cursor, limit, conteo, valores_fila)
+    if compacta:
+        return vistas.respuesta(equipos, response)
     
     # Agregar información de préstamo activo y último préstamo devuelto
+    # (cargados en lote para no consultar por cada equipo)
+    prestamos_activos, ultimos_devueltos = _cargar_prestamos_equipos(db, [e.id for e in equipos])
+    
     result = []
     for equipo in equipos:
-        prestamo_activo = db.query(Prestamo).filter(
-            and_(
-                Prestamo.equipo_id == equipo.id,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            )
-        ).first()
-        
-        # Obtener el último préstamo devuelto (más reciente)
-        ultimo_prestamo_devuelto = db.query(Prestamo).filter(
-            and_(
-                Prestamo.equipo_id == equipo.id,
-                Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO
-            )
-        ).order_by(Prestamo.fecha_devolucion.desc()).first()
-        
         equipo_dict = {
             **equipo.__dict__,
-            "prestamo_activo": prestamo_activo,
-            "ultimo_prestamo_devuelto": ultimo_prestamo_devuelto
+            "prestamo_activo": prestamos_activos.get(equipo.id),
+            "ultimo_prestamo_devuelto": ultimos_devueltos.get(equipo.id)
         }
         result.append(EquipoConPrestamo(**equipo_dict))
     
     return result
 
 
-@router.get("/libres", response_model=List[EquipoResponse])
+def _cargar_prestamos_equipos(db: Session, equipo_ids: List[int]):
+    """Obtener préstamo activo y último préstamo devuelto de varios equipos.
+    
+    Usa una consulta por cada tipo de préstamo (independiente de la cantidad
+    de equipos) y carga trabajador y equipo de forma anticipada.
+    """
+    if not equipo_ids:
+        return {}, {}
+    
+    activos = db.query(Prestamo).options(
+        joinedload(Prestamo.equipo),
+        joinedload(Prestamo.trabajador)
+    ).filter(
+        and_(
+            Prestamo.equipo_id.in_(equipo_ids),
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
+        )
+    ).order_by(Prestamo.id).all()
+    
+    prestamos_activos = {}
+    for prestamo in activos:
+        prestamos_activos.setdefault(prestamo.equipo_id, prestamo)
+    
+    # Último préstamo devuelto por equipo (el más reciente según fecha de devolución)
+    orden = func.row_number().over(
+        partition_by=Prestamo.equipo_id,
+        order_by=(Prestamo.fecha_devolucion.desc(), Prestamo.id.desc())
+    ).label("orden")
+    ranking = db.query(Prestamo.id.label("id"), orden).filter(
+        and_(
+            Prestamo.equipo_id.in_(equipo_ids),
+            Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO
+        )
+    ).subquery()
+    
+    devueltos = db.query(Prestamo).options(
+        joinedload(Prestamo.equipo),
+        joinedload(Prestamo.trabajador)
+    ).join(
+        ranking, Prestamo.id == ranking.c.id
+    ).filter(ranking.c.orden == 1).all()
+    
+    ultimos_devueltos = {prestamo.equipo_id: prestamo for prestamo in devueltos}
+    
+    return prestamos_activos, ultimos_devueltos
+
+
+@router.get("/libres", response_model=Union[List[EquipoResponse], List[EquipoCompacto]])
 def get_equipos_libres(
+    view: Optional[str] = Query(None, pattern=vistas.PATRON_VISTA, description="compact: solo columnas de listado"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
 ):
     """Obtener equipos libres (solo Informática)"""
-    # Equipos sin préstamos activos
-    equipos_con_prestamo = db.query(Prestamo.equipo_id).filter(
-        Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-    ).subquery()
-    
-    equipos_libres = db.query(Equipo).filter(
-        ~Equipo.id.in_(db.query(equipos_con_prestamo.c.equipo_id))
+    compacta = view == vistas.VISTA_COMPACTA
+    # Los equipos libres no tienen poseedor
+    query = vistas.consulta_equipos(db, con_poseedor=False) if compacta else db.query(Equipo)
+    # Equipos sin préstamos activos (según la proyección de estado actual)
+    equipos_libres = query.filter(
+        estado_equipos.condicion_disponible()
     ).filter(Equipo.estado_dispositivo != "BAJA").all()
     
+    if compacta:
+        return vistas.respuesta(equipos_libres)
     return equipos_libres
 
 
@@ -141,19 +191,14 @@ def get_equipo(
     
     # Verificar permisos JEFE OBRA
     if current_user.rol == RolUsuario.JEFE_OBRA:
-        prestamo = db.query(Prestamo).filter(
-            and_(
-                Prestamo.equipo_id == equipo_id,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            )
-        ).first()
-        if not prestamo or prestamo.trabajador.obra != current_user.obra:
+        estado_actual = equipo.estado_actual
+        if not estado_actual or not estado_actual.prestamo_activo_id or estado_actual.obra != current_user.obra:
             raise HTTPException(status_code=403, detail="No tiene acceso a este equipo")
     
     prestamo_activo = db.query(Prestamo).filter(
         and_(
             Prestamo.equipo_id == equipo_id,
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         )
     ).first()
     
@@ -163,6 +208,33 @@ def get_equipo(
     )
 
 
+def normalizar_equipo(equipo: EquipoCreate) -> dict:
+    """Validar campos requeridos y normalizar strings (serie y tipo en mayúsculas).
+    
+    Lanza ValueError con el mensaje para el usuario si falta un campo.
+    """
+    if not equipo.serie or not equipo.serie.strip():
+        raise ValueError("La serie es requerida")
+    if not equipo.marca or not equipo.marca.strip():
+        raise ValueError("La marca es requerida")
+    if not equipo.modelo or not equipo.modelo.strip():
+        raise ValueError("El modelo es requerido")
+    if not equipo.tipo or not equipo.tipo.strip():
+        raise ValueError("El tipo es requerido")
+    
+    return {
+        "serie": equipo.serie.strip().upper(),
+        "marca": equipo.marca.strip(),
+        "modelo": equipo.modelo.strip(),
+        "tipo": equipo.tipo.strip().upper(),
+        "estado_dispositivo": equipo.estado_dispositivo,
+        "ram_gb": equipo.ram_gb,
+        "ssd_gb": equipo.ssd_gb,
+        "so": equipo.so.strip() if equipo.so else None,
+        "observaciones": equipo.observaciones.strip() if equipo.observaciones else None
+    }
+
+
 @router.post("/", response_model=EquipoResponse)
 def create_equipo(
     equipo: EquipoCreate,
@@ -171,40 +243,20 @@ def create_equipo(
 ):
     """Crear nuevo equipo (solo Informática)"""
     try:
-        # Validar campos requeridos
-        if not equipo.serie or not equipo.serie.strip():
-            raise HTTPException(status_code=400, detail="La serie es requerida")
-        if not equipo.marca or not equipo.marca.strip():
-            raise HTTPException(status_code=400, detail="La marca es requerida")
-        if not equipo.modelo or not equipo.modelo.strip():
-            raise HTTPException(status_code=400, detail="El modelo es requerido")
-        if not equipo.tipo or not equipo.tipo.strip():
-            raise HTTPException(status_code=400, detail="El tipo es requerido")
+        # Validar campos requeridos y normalizar strings
+        try:
+            datos = normalizar_equipo(equipo)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Verificar serie única
-        if db.query(Equipo).filter(Equipo.serie == equipo.serie.strip().upper()).first():
+        if db.query(Equipo).filter(Equipo.serie == datos["serie"]).first():
             raise HTTPException(status_code=400, detail="Serie ya existe")
         
-        # Preparar datos limpios (normalizar strings)
-        serie_clean = equipo.serie.strip().upper()
-        marca_clean = equipo.marca.strip()
-        modelo_clean = equipo.modelo.strip()
-        tipo_clean = equipo.tipo.strip().upper()
-        so_clean = equipo.so.strip() if equipo.so else None
-        observaciones_clean = equipo.observaciones.strip() if equipo.observaciones else None
-        
-        new_equipo = Equipo(
-            serie=serie_clean,
-            marca=marca_clean,
-            modelo=modelo_clean,
-            tipo=tipo_clean,
-            estado_dispositivo=equipo.estado_dispositivo,
-            ram_gb=equipo.ram_gb,
-            ssd_gb=equipo.ssd_gb,
-            so=so_clean,
-            observaciones=observaciones_clean
-        )
+        new_equipo = Equipo(**datos)
         db.add(new_equipo)
+        db.flush()  # id para el evento de equipo actualizado
+        estado_equipos.registrar_equipo(db, new_equipo)
         db.commit()
         db.refresh(new_equipo)
         return new_equipo
@@ -223,6 +275,111 @@ def create_equipo(
         )
 
 
+@router.post("/importar")
+def importar_equipos(
+    archivo: UploadFile = File(..., description="Planilla .csv o .xlsx con encabezados serie, marca, modelo, tipo..."),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Importación masiva de equipos desde CSV o XLSX (solo Informática)
+    
+    Aplica la misma normalización que la creación individual. Las filas con
+    errores (campos faltantes, serie repetida o ya existente) se informan y no
+    impiden importar las demás.
+    """
+    total_filas = 0
+    creados = 0
+    errores = []
+    series_archivo = set()
+    lote = []
+    
+    try:
+        for numero_fila, fila in leer_filas(archivo.file, archivo.filename):
+            total_filas += 1
+            try:
+                datos = normalizar_equipo(EquipoCreate(**_datos_fila_equipo(fila)))
+            except ValidationError as e:
+                error = e.errors()[0]
+                campo = ".".join(str(parte) for parte in error["loc"])
+                errores.append({"fila": numero_fila, "serie": fila.get("serie"), "error": f"{campo}: {error['msg']}"})
+                continue
+            except ValueError as e:
+                errores.append({"fila": numero_fila, "serie": fila.get("serie"), "error": str(e)})
+                continue
+            
+            if datos["serie"] in series_archivo:
+                errores.append({"fila": numero_fila, "serie": datos["serie"], "error": "Serie repetida en el archivo"})
+                continue
+            series_archivo.add(datos["serie"])
+            
+            lote.append((numero_fila, datos))
+            if len(lote) >= LOTE_IMPORTACION:
+                creados += _insertar_lote_equipos(db, lote, errores)
+                lote = []
+        
+        if lote:
+            creados += _insertar_lote_equipos(db, lote, errores)
+        db.commit()
+    except FormatoNoSoportado as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {str(e)}")
+    except Exception as e:
+        db.rollback()
+        import traceback
+        error_msg = str(e)
+        print(f"ERROR al importar equipos: {error_msg}")
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al importar equipos: {error_msg}"
+        )
+    
+    errores.sort(key=lambda error: error["fila"])
+    return {
+        "total_filas": total_filas,
+        "creados": creados,
+        "con_errores": len(errores),
+        "errores": errores
+    }
+
+
+def _datos_fila_equipo(fila: dict) -> dict:
+    """Celdas vacías: los campos requeridos quedan vacíos (para el mensaje de
+    normalizar_equipo) y los opcionales toman su valor por defecto"""
+    datos = {campo: valor for campo, valor in fila.items() if valor is not None}
+    for campo in ("serie", "marca", "modelo", "tipo"):
+        datos.setdefault(campo, "")
+    return datos
+
+
+def _insertar_lote_equipos(db: Session, lote: list, errores: list) -> int:
+    """Insertar un lote de equipos normalizados, omitiendo series ya existentes"""
+    existentes = {
+        serie for (serie,) in db.query(Equipo.serie).filter(
+            Equipo.serie.in_([datos["serie"] for _, datos in lote])
+        )
+    }
+    nuevos = []
+    for numero_fila, datos in lote:
+        if datos["serie"] in existentes:
+            errores.append({"fila": numero_fila, "serie": datos["serie"], "error": "Serie ya existe"})
+        else:
+            nuevos.append(datos)
+    if not nuevos:
+        return 0
+    
+    insertados = db.execute(
+        insert(Equipo).returning(Equipo.id, Equipo.serie, Equipo.marca, Equipo.modelo, Equipo.tipo),
+        nuevos
+    ).all()
+    estado_equipos.registrar_equipos_nuevos(db, [fila.id for fila in insertados])
+    busqueda_equipos.indexar_equipos(db.connection(), [fila._asdict() for fila in insertados])
+    return len(insertados)
+
+
 @router.put("/{equipo_id}", response_model=EquipoResponse)
 def update_equipo(
     equipo_id: int,
@@ -237,15 +394,82 @@ def update_equipo(
     
     update_data = equipo_update.dict(exclude_unset=True)
     cambios = ", ".join([f"{k}: {v}" for k, v in update_data.items()])
+    tipo_anterior = equipo.tipo
     
     for field, value in update_data.items():
         setattr(equipo, field, value)
+    estado_equipos.registrar_equipo(db, equipo)
+    if equipo.tipo != tipo_anterior:
+        estadisticas_diarias.registrar_cambio_tipo(db, {equipo.id: tipo_anterior}, equipo.tipo)
     
     db.commit()
     db.refresh(equipo)
     return equipo
 
 
+@router.patch("/lote", response_model=List[EquipoResponse])
+def update_equipos_lote(
+    datos: EquipoUpdateLote,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Actualizar los mismos campos en varios equipos (solo Informática).
+    
+    Se aplica con un único UPDATE en una transacción sobre la lista de ids y/o
+    el filtro indicado. Retorna los equipos modificados.
+    """
+    cambios = datos.cambios.dict(exclude_unset=True)
+    if not cambios:
+        raise HTTPException(status_code=400, detail="No se indicaron cambios")
+    
+    condiciones = []
+    if datos.ids is not None:
+        if not datos.ids:
+            return []
+        condiciones.append(Equipo.id.in_(datos.ids))
+    filtro = datos.filtro
+    if filtro:
+        if filtro.obra:
+            condiciones.append(estado_equipos.condicion_prestado(filtro.obra))
+        if filtro.tipo:
+            condiciones.append(Equipo.tipo == filtro.tipo)
+        if filtro.estado_dispositivo:
+            condiciones.append(Equipo.estado_dispositivo == filtro.estado_dispositivo)
+        if filtro.busqueda and filtro.busqueda.strip():
+            condiciones.append(busqueda_equipos.condicion(db, filtro.busqueda))
+    # Evitar modificar todo el inventario por un filtro vacío
+    if not condiciones:
+        raise HTTPException(status_code=400, detail="Indique ids o al menos un filtro")
+    
+    try:
+        # Tipos previos para mover los contadores del resumen diario
+        tipos_anteriores = dict(
+            db.query(Equipo.id, Equipo.tipo).filter(and_(*condiciones, Equipo.tipo != cambios["tipo"])).all()
+        ) if cambios.get("tipo") is not None else {}
+        equipos = db.scalars(
+            update(Equipo).where(and_(*condiciones)).values(**cambios).returning(Equipo),
+            execution_options={"synchronize_session": False}
+        ).all()
+        ids = [equipo.id for equipo in equipos]
+        
+        # El UPDATE masivo no dispara los eventos del mapper: mantener índice y proyección
+        if cambios.keys() & set(busqueda_equipos.CAMPOS_TODOS):
+            busqueda_equipos.indexar_equipos(
+                db.connection(), [busqueda_equipos.datos_indice(equipo) for equipo in equipos]
+            )
+        estado_equipos.registrar_equipos_actualizados(db, ids)
+        estadisticas_diarias.registrar_cambio_tipo(db, tipos_anteriores, cambios.get("tipo"))
+        # Serializar antes del commit (después los objetos quedan expirados)
+        resultado = [EquipoResponse.model_validate(equipo) for equipo in equipos]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR en actualización masiva de equipos: {e}")
+        raise HTTPException(status_code=500, detail=f"Error al actualizar equipos: {str(e)}")
+    
+    return resultado
+
+
 @router.delete("/{equipo_id}")
 def delete_equipo(
     equipo_id: int,
@@ -257,7 +481,12 @@ def delete_equipo(
     if not equipo:
         raise HTTPException(status_code=404, detail="Equipo no encontrado")
     
+    # Descontar del resumen diario antes de borrar los préstamos archivados
+    estadisticas_diarias.registrar_eliminacion_equipo(db, equipo_id)
+    db.query(PrestamoHistorico).filter(PrestamoHistorico.equipo_id == equipo_id).delete(synchronize_session=False)
+    alertas_activas.registrar_eliminacion_equipo(db, equipo_id)
     db.delete(equipo)
+    eventos.emitir(db, eventos.EQUIPO_ELIMINADO, equipo_id=equipo_id)
     db.commit()
     return {"message": "Equipo eliminado"}
 
@@ -265,6 +494,7 @@ def delete_equipo(
 @router.get("/{equipo_id}/qr")
 def generar_qr_equipo(
     equipo_id: int,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -274,82 +504,84 @@ def generar_qr_equipo(
         raise HTTPException(status_code=404, detail="Equipo no encontrado")
     
     # URL que se codificará en el QR (para escanear y procesar)
-    # Detectar IP local automáticamente para que funcione desde celulares en la misma red
-    import os
-    import socket
-    
-    def get_local_ip():
-        """Obtener la IP local de la red"""
-        try:
-            # Conectar a un servidor externo para obtener la IP local
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-            s.close()
-            return ip
-        except Exception:
-            return "localhost"
-    
-    # Intentar obtener IP local, o usar la configurada en env
     # IMPORTANTE: El QR solo necesita el ID del equipo, la URL del frontend es solo para referencia
-    # El móvil extraerá el ID y lo procesará directamente
-    frontend_url_env = os.getenv("FRONTEND_URL", "")
-    if frontend_url_env and "localhost" not in frontend_url_env:
-        frontend_url = frontend_url_env
-    else:
-        # En desarrollo, usar IP local para que funcione desde celulares
-        local_ip = get_local_ip()
-        # Asegurar que use la IP correcta (192.168.1.113)
-        if local_ip and local_ip != "localhost" and local_ip.startswith("192.168"):
-            frontend_url = f"http://{local_ip}:5173"
-        else:
-            # Fallback a IP conocida si la detección falla
-            frontend_url = "http://192.168.1.113:5173"
+    qr_url = qr.url_equipo(qr.frontend_url(), equipo_id)
+    clave = qr.clave_qr(qr_url)
+    etag = f'"{clave}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
     
-    qr_url = f"{frontend_url}/qr/equipo/{equipo_id}"
+    # El cliente ya tiene esta imagen
+    if if_none_match and etag in [v.strip().removeprefix("W/") for v in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
     
-    # Crear QR
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
+    headers["Content-Disposition"] = f'attachment; filename="QR_{equipo.serie}.png"'
+    return Response(
+        content=qr.qr_png_cacheado(qr_url, clave),
+        media_type="image/png",
+        headers=headers
     )
-    qr.add_data(qr_url)
-    qr.make(fit=True)
-    
-    # Crear imagen
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convertir a bytes
-    img_io = BytesIO()
-    img.save(img_io, format='PNG')
-    img_io.seek(0)
+
+
+def _etiquetas_qr(
+    db: Session,
+    current_user: Usuario,
+    obra: Optional[str],
+    tipo: Optional[str],
+    ids: Optional[List[int]]
+) -> List[qr.Etiqueta]:
+    query = db.query(Equipo.id, Equipo.serie, Equipo.tipo)
+    if ids:
+        query = query.filter(Equipo.id.in_(ids))
+    if tipo:
+        query = query.filter(Equipo.tipo == tipo)
+    # Jefe de obra solo puede imprimir etiquetas de equipos de su obra
+    if current_user.rol == RolUsuario.JEFE_OBRA:
+        if not current_user.obra:
+            return []
+        obra = current_user.obra
+    if obra:
+        query = query.filter(estado_equipos.condicion_prestado(obra))
+    filas = query.order_by(Equipo.serie, Equipo.id).limit(MAX_ETIQUETAS_QR + 1).all()
+    if len(filas) > MAX_ETIQUETAS_QR:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {MAX_ETIQUETAS_QR} etiquetas por hoja, aplique más filtros"
+        )
+    frontend_url = qr.frontend_url()
+    return [(qr.url_equipo(frontend_url, fila.id), fila.serie, fila.tipo) for fila in filas]
+
+
+@router.get("/qr/etiquetas")
+async def generar_hoja_etiquetas_qr(
+    obra: Optional[str] = None,
+    tipo: Optional[str] = None,
+    ids: Optional[List[int]] = Query(None, description="IDs de equipos (repetir el parámetro)"),
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Hoja PDF imprimible con las etiquetas QR (con serie) de los equipos filtrados"""
+    etiquetas = await run_in_threadpool(_etiquetas_qr, db, current_user, obra, tipo, ids)
+    if not etiquetas:
+        raise HTTPException(status_code=404, detail="No hay equipos para los filtros indicados")
     
     return StreamingResponse(
-        img_io,
-        media_type="image/png",
+        qr.hoja_etiquetas_pdf(etiquetas),
+        media_type="application/pdf",
         headers={
-            "Content-Disposition": f'attachment; filename="QR_{equipo.serie}.png"'
+            "Content-Disposition": 'attachment; filename="etiquetas_qr.pdf"'
         }
     )
 
 
-@router.get("/qr/{equipo_id}/info")
-def obtener_info_equipo_qr(
-    equipo_id: int,
-    db: Session = Depends(get_db)
-):
-    """Obtener información del equipo para cuando se escanea el QR (sin autenticación para facilitar escaneo)"""
-    equipo = db.query(Equipo).filter(Equipo.id == equipo_id).first()
-    if not equipo:
-        raise HTTPException(status_code=404, detail="Equipo no encontrado")
-    
-    prestamo_activo = db.query(Prestamo).filter(
-        Prestamo.equipo_id == equipo_id,
-        Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-    ).first()
-    
+def _info_equipo_qr(db: Session, equipo_id: int) -> Optional[dict]:
+    fila = db.query(Equipo, EquipoEstado.prestamo_activo_id, Trabajador.nombre).outerjoin(
+        EquipoEstado, EquipoEstado.equipo_id == Equipo.id
+    ).outerjoin(
+        Trabajador, Trabajador.rut == EquipoEstado.trabajador_rut
+    ).filter(Equipo.id == equipo_id).first()
+    if not fila:
+        return None
+    equipo, prestamo_activo_id, trabajador_nombre = fila
     return {
         "equipo_id": equipo.id,
         "serie": equipo.serie,
@@ -357,8 +589,29 @@ def obtener_info_equipo_qr(
         "marca": equipo.marca,
         "modelo": equipo.modelo,
         "estado": equipo.estado_dispositivo.value if hasattr(equipo.estado_dispositivo, 'value') else str(equipo.estado_dispositivo),
-        "prestado": prestamo_activo is not None,
-        "prestamo_id": prestamo_activo.id if prestamo_activo else None,
-        "trabajador": prestamo_activo.trabajador.nombre if prestamo_activo else None
+        "prestado": prestamo_activo_id is not None,
+        "prestamo_id": prestamo_activo_id,
+        "trabajador": trabajador_nombre if prestamo_activo_id else None
     }
 
+
+@eventos.suscribir
+def _invalidar_cache_escaneo(evento: dict):
+    if evento.get("equipo_id") is not None:
+        cache_escaneo_qr.invalidar(evento["equipo_id"])
+    else:
+        # Cambios de trabajador: pueden afectar el nombre de cualquier equipo
+        cache_escaneo_qr.limpiar()
+
+
+@router.get("/qr/{equipo_id}/info", dependencies=[Depends(limite_escaneo_qr)])
+def obtener_info_equipo_qr(
+    equipo_id: int,
+    db: Session = Depends(get_db)
+):
+    """Obtener información del equipo para cuando se escanea el QR (sin autenticación para facilitar escaneo)"""
+    # Con caché, los escaneos repetidos no usan conexiones del pool
+    info = cache_escaneo_qr.obtener_o_calcular(equipo_id, lambda: _info_equipo_qr(db, equipo_id))
+    if not info:
+        raise HTTPException(status_code=404, detail="Equipo no encontrado")
+    return info
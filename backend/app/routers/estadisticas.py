@@ -1,60 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from datetime import datetime, timedelta
+from sqlalchemy import func, and_, case, select, true, union_all
+from datetime import date, datetime, timedelta
+from typing import Optional
 from ..database import get_db
-from ..models import Equipo, Prestamo, Trabajador, EstadoPrestamo, Usuario, RolUsuario
-from ..auth import get_current_user
+from ..models import Equipo, Prestamo, PrestamoHistorico, Trabajador, AlertaActiva, EstadoPrestamo, Usuario, RolUsuario, ESTADOS_ACTIVOS
+from ..auth import get_current_user, require_role
+from ..cache import CacheTTL
+from .. import alertas_activas, estadisticas_diarias, eventos, series
+import os
 import traceback
 
 router = APIRouter(prefix="/api/estadisticas", tags=["estadisticas"])
 
+# Respuestas del dashboard por (desde, hasta, granularidad); se vacía con cada
+# evento confirmado (ver app/eventos.py). El dashboard es global: todos los roles
+# y obras ven los mismos contadores, así que comparten la entrada.
+TTL_DASHBOARD = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+cache_dashboard = CacheTTL(ttl=TTL_DASHBOARD, maximo=200)
+
+
+def _contar(condicion):
+    return func.sum(case((condicion, 1), else_=0))
+
+
+def contar_resumen(db: Session, ahora: Optional[datetime] = None):
+    """Contadores del resumen del dashboard en un solo SELECT.
+    
+    Cada tabla se recorre una vez con agregados condicionales y las filas
+    resultantes (una por tabla) se combinan con JOIN ON true.
+    """
+    ahora = ahora or datetime.utcnow()
+    # Préstamos devueltos en los últimos 30 días
+    fecha_limite = ahora - timedelta(days=30)
+    equipos = select(
+        _contar(Equipo.estado_dispositivo != "BAJA").label("total_equipos"),
+        _contar(Equipo.estado_dispositivo == "OPERATIVO").label("equipos_operativos"),
+        _contar(Equipo.estado_dispositivo == "MANTENCIÓN").label("equipos_mantenimiento"),
+    ).select_from(Equipo).subquery()
+    prestamos = select(
+        _contar(Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)).label("prestamos_activos"),
+        _contar(and_(
+            Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
+            Prestamo.fecha_devolucion.isnot(None),
+            Prestamo.fecha_devolucion >= fecha_limite
+        )).label("prestamos_recientes"),
+    ).select_from(Prestamo).subquery()
+    trabajadores = select(
+        _contar(Trabajador.activo == True).label("trabajadores_activos"),
+    ).select_from(Trabajador).subquery()
+    # Alertas pendientes (vencidos, despidos y problemas pendientes de trabajadores)
+    alertas = select(
+        _contar(alertas_activas.condicion_pendiente(ahora)).label("alertas_pendientes"),
+    ).select_from(AlertaActiva).subquery()
+    return db.execute(
+        select(equipos, prestamos, trabajadores, alertas).select_from(
+            equipos.join(prestamos, true()).join(trabajadores, true()).join(alertas, true())
+        )
+    ).one()
+
 
 @router.get("/dashboard")
 def get_dashboard_stats(
+    desde: Optional[date] = Query(None, description="Inicio de la serie de préstamos (por defecto, inicio del mes)"),
+    hasta: Optional[date] = Query(None, description="Fin de la serie de préstamos, inclusive (por defecto, hoy)"),
+    granularidad: str = Query(series.DIA, pattern="^(dia|semana|mes)$", description="Agrupar por dia, semana o mes"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    """Obtener estadísticas del dashboard"""
+    """Obtener estadísticas del dashboard (globales, con caché por rango)"""
+    hoy = datetime.utcnow().date()
+    desde = desde or hoy.replace(day=1)
+    hasta = hasta or hoy
+    if hasta < desde:
+        raise HTTPException(status_code=400, detail="La fecha 'hasta' debe ser posterior a 'desde'")
+    if series.contar_periodos(desde, hasta, granularidad) > series.MAX_PERIODOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El rango supera {series.MAX_PERIODOS} períodos; use una granularidad mayor"
+        )
+    clave = (desde, hasta, granularidad)
+    # Los requests simultáneos con la misma clave esperan un solo cálculo
+    return cache_dashboard.obtener_o_calcular(
+        clave, lambda: _calcular_dashboard(db, desde, hasta, granularidad)
+    )
+
+
+@router.get("/cache")
+def get_estadisticas_cache(
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Aciertos, fallos y cálculos agrupados del caché del dashboard (solo Informática)"""
+    return cache_dashboard.estadisticas()
+
+
+@eventos.suscribir
+def _invalidar_cache_dashboard(evento: dict):
+    # Cualquier cambio confirmado en préstamos, equipos, trabajadores o alertas
+    cache_dashboard.limpiar()
+
+
+def _calcular_dashboard(db: Session, desde: date, hasta: date, granularidad: str):
+    """Estadísticas del dashboard con la serie de préstamos entre desde y hasta"""
     try:
-        # Total de equipos
-        total_equipos = db.query(func.count(Equipo.id)).filter(
-            Equipo.estado_dispositivo != "BAJA"
-        ).scalar() or 0
-        print(f"DEBUG: total_equipos = {total_equipos}")
-        
-        # Equipos por estado
-        equipos_operativos = db.query(func.count(Equipo.id)).filter(
-            Equipo.estado_dispositivo == "OPERATIVO"
-        ).scalar() or 0
-        
-        equipos_mantenimiento = db.query(func.count(Equipo.id)).filter(
-            Equipo.estado_dispositivo == "MANTENCIÓN"
-        ).scalar() or 0
-        
-        # Préstamos activos
-        prestamos_activos = db.query(func.count(Prestamo.id)).filter(
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-        ).scalar() or 0
-        print(f"DEBUG: prestamos_activos = {prestamos_activos}")
-        
-        # Trabajadores activos
-        trabajadores_activos = db.query(func.count(Trabajador.rut)).filter(
-            Trabajador.activo == True
-        ).scalar() or 0
-        print(f"DEBUG: trabajadores_activos = {trabajadores_activos}")
-        
-        # Préstamos devueltos en los últimos 30 días
-        fecha_limite = datetime.utcnow() - timedelta(days=30)
-        prestamos_recientes = db.query(func.count(Prestamo.id)).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
-                Prestamo.fecha_devolucion.isnot(None),
-                Prestamo.fecha_devolucion >= fecha_limite
-            )
-        ).scalar() or 0
-        
-        # Préstamos por día del mes actual
+        # Contadores del resumen en una sola consulta (un agregado condicional por tabla)
+        resumen = contar_resumen(db)
+        total_equipos = resumen.total_equipos or 0
+        equipos_operativos = resumen.equipos_operativos or 0
+        equipos_mantenimiento = resumen.equipos_mantenimiento or 0
+        prestamos_activos = resumen.prestamos_activos or 0
+        prestamos_recientes = resumen.prestamos_recientes or 0
+        trabajadores_activos = resumen.trabajadores_activos or 0
+        alertas_pendientes = resumen.alertas_pendientes or 0
+        
+        # Préstamos por período desde el resumen diario
         ahora = datetime.utcnow()
         fecha_inicio_mes = datetime(ahora.year, ahora.month, 1)
         # Primer día del siguiente mes
@@ -63,45 +122,37 @@ def get_dashboard_stats(
         else:
             fecha_fin_mes = datetime(ahora.year, ahora.month + 1, 1)
         
-        # Obtener préstamos por día
-        prestamos_por_dia = []
-        for dia in range(1, ahora.day + 1):  # Solo hasta el día actual
-            fecha_inicio_dia = datetime(ahora.year, ahora.month, dia)
-            fecha_fin_dia = datetime(ahora.year, ahora.month, dia + 1) if dia < 31 else fecha_fin_mes
-            
-            count = db.query(func.count(Prestamo.id)).filter(
-                and_(
-                    Prestamo.fecha_prestamo >= fecha_inicio_dia,
-                    Prestamo.fecha_prestamo < fecha_fin_dia
-                )
-            ).scalar() or 0
-            
-            prestamos_por_dia.append({
-                "dia": dia,
-                "cantidad": count
-            })
-        
-        # Total del mes para compatibilidad
-        count_mes_actual = sum(p["cantidad"] for p in prestamos_por_dia)
-        
-        prestamos_por_mes = [{
-            "mes": fecha_inicio_mes.strftime("%Y-%m"),
-            "cantidad": count_mes_actual,
-            "por_dia": prestamos_por_dia
-        }]
-        
-        # Equipos más prestados (top 5)
+        prestamos_por_periodo = estadisticas_diarias.prestamos_por_periodo(db, desde, hasta, granularidad)
+        
+        # Agrupado por mes (formato anterior: por_dia solo con granularidad diaria)
+        prestamos_por_mes = []
+        for punto in prestamos_por_periodo:
+            mes = punto["periodo"][:7]
+            if not prestamos_por_mes or prestamos_por_mes[-1]["mes"] != mes:
+                prestamos_por_mes.append({"mes": mes, "cantidad": 0, "por_dia": []})
+            prestamos_por_mes[-1]["cantidad"] += punto["cantidad"]
+            if granularidad == series.DIA:
+                prestamos_por_mes[-1]["por_dia"].append({
+                    "dia": int(punto["periodo"][8:10]),
+                    "cantidad": punto["cantidad"]
+                })
+        
+        # Equipos más prestados (top 5), contando también los préstamos archivados
         try:
+            prestamos_equipo = union_all(
+                select(Prestamo.equipo_id),
+                select(PrestamoHistorico.equipo_id)
+            ).subquery()
             equipos_mas_prestados = db.query(
                 Equipo.serie,
                 Equipo.tipo,
-                func.count(Prestamo.id).label('cantidad')
+                func.count().label('cantidad')
             ).join(
-                Prestamo, Equipo.id == Prestamo.equipo_id
+                prestamos_equipo, Equipo.id == prestamos_equipo.c.equipo_id
             ).group_by(
                 Equipo.id, Equipo.serie, Equipo.tipo
             ).order_by(
-                func.count(Prestamo.id).desc()
+                func.count().desc()
             ).limit(5).all()
             
             equipos_top = [
@@ -112,60 +163,13 @@ def get_dashboard_stats(
             print(f"Error al obtener equipos más prestados: {e}")
             equipos_top = []
         
-        # Alertas pendientes (vencidos, despidos y problemas pendientes de trabajadores)
-        hoy = datetime.utcnow()
-        prestamos_vencidos_count = db.query(func.count(Prestamo.id)).join(Trabajador).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
-                Prestamo.fecha_vencimiento < hoy
-            )
-        ).scalar() or 0
-        
-        trabajadores_despedidos_count = db.query(func.count(Prestamo.id)).join(Trabajador).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
-                Trabajador.activo == False
-            )
-        ).scalar() or 0
-        
-        # Problemas pendientes de trabajadores (equipos devueltos sin cargador o en mal estado)
-        from sqlalchemy import or_
-        problemas_pendientes_count = db.query(func.count(Prestamo.id)).filter(
-            and_(
-                Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
-                # Problemas: sin cargador y no fue devuelto después, o equipo no bueno
-                or_(
-                    and_(
-                        Prestamo.estado_devolucion_con_cargador == False,
-                        Prestamo.cargador_devuelto_despues == False
-                    ),
-                    Prestamo.estado_devolucion_bueno == False
-                )
-            )
-        ).scalar() or 0
-        
-        alertas_pendientes = prestamos_vencidos_count + trabajadores_despedidos_count + problemas_pendientes_count
-        print(f"DEBUG: alertas_pendientes = {alertas_pendientes} (vencidos: {prestamos_vencidos_count}, despidos: {trabajadores_despedidos_count}, problemas: {problemas_pendientes_count})")
-        
         # Datos para gráfico de torta: Dispositivos más usados durante el mes actual
         dispositivos_mas_usados = []
         try:
-            # Obtener préstamos del mes actual agrupados por tipo de equipo
-            prestamos_mes_por_tipo = db.query(
-                Equipo.tipo,
-                func.count(Prestamo.id).label('cantidad')
-            ).join(
-                Prestamo, Equipo.id == Prestamo.equipo_id
-            ).filter(
-                and_(
-                    Prestamo.fecha_prestamo >= fecha_inicio_mes,
-                    Prestamo.fecha_prestamo < fecha_fin_mes
-                )
-            ).group_by(
-                Equipo.tipo
-            ).order_by(
-                func.count(Prestamo.id).desc()
-            ).limit(6).all()  # Top 6 tipos más usados
+            # Préstamos del mes actual agrupados por tipo de equipo (resumen diario)
+            prestamos_mes_por_tipo = estadisticas_diarias.prestados_por_tipo(
+                db, fecha_inicio_mes.date(), fecha_fin_mes.date() - timedelta(days=1), limite=6
+            )  # Top 6 tipos más usados
             
             # Colores para el gráfico de torta
             colores = ["#FF6B35", "#4ECDC4", "#45B7D1", "#96CEB4", "#FFEAA7", "#DDA15E"]
@@ -195,13 +199,15 @@ def get_dashboard_stats(
                 "alertas_pendientes": alertas_pendientes
             },
             "prestamos_por_mes": prestamos_por_mes,
+            "prestamos_por_periodo": prestamos_por_periodo,
+            "granularidad": granularidad,
             "equipos_mas_prestados": equipos_top,
             "dispositivos_mas_usados": dispositivos_mas_usados
         }
     except Exception as e:
         import traceback
         error_msg = str(e)
-        print(f"ERROR en get_dashboard_stats: {error_msg}")
+        print(f"ERROR en _calcular_dashboard: {error_msg}")
         traceback.print_exc()
         # Lanzar el error para que el frontend pueda verlo
         raise HTTPException(
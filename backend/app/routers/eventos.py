@@ -0,0 +1,76 @@
+import asyncio
+import json
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from ..database import SessionLocal
+from ..models import Usuario, RolUsuario
+from ..auth import usuario_desde_token, require_role
+from ..difusion import difusor
+
+router = APIRouter(prefix="/api/eventos", tags=["eventos"])
+
+# Segundos entre comentarios de latido (mantienen abierta la conexión tras proxies)
+LATIDO_SEGUNDOS = 15
+
+
+def _usuario(token: str) -> Usuario:
+    with SessionLocal() as db:
+        usuario = usuario_desde_token(token, db)
+        db.expunge(usuario)
+        return usuario
+
+
+def _mensaje(evento: Dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+
+
+async def _flujo(request: Request, cliente):
+    try:
+        yield "retry: 5000\n\n"
+        yield _mensaje({"tipo": "conectado", "obra": cliente.obra})
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                evento = await asyncio.wait_for(cliente.cola.get(), timeout=LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                continue
+            yield _mensaje(evento)
+    finally:
+        difusor.desconectar(cliente)
+
+
+@router.get("/stream")
+async def stream_eventos(
+    request: Request,
+    token: str = Query(..., description="Token JWT (EventSource no permite cabeceras)")
+):
+    """Stream SSE de préstamos, devoluciones, despidos, alertas nuevas y cambios de equipos.
+    
+    JEFE OBRA solo recibe los eventos de su obra. Ante un evento "resincronizar"
+    el cliente debe recargar sus datos.
+    """
+    usuario = await run_in_threadpool(_usuario, token)
+    if usuario.rol == RolUsuario.JEFE_OBRA and not usuario.obra:
+        raise HTTPException(status_code=403, detail="Usuario sin obra asignada")
+    
+    cliente = difusor.conectar(usuario.rol, usuario.obra)
+    if cliente is None:
+        raise HTTPException(status_code=503, detail="Demasiadas conexiones de eventos, intente más tarde")
+    
+    return StreamingResponse(
+        _flujo(request, cliente),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/estadisticas")
+def get_estadisticas_eventos(
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Clientes conectados y eventos difundidos (solo Informática)"""
+    return difusor.estadisticas()
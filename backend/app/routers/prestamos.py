@@ -1,48 +1,117 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, or_, insert, update
+from sqlalchemy.exc import IntegrityError
+from datetime import date, datetime, time, timedelta, timezone
 from ..database import get_db
-from ..models import Prestamo, Equipo, Trabajador, EstadoPrestamo, Usuario, RolUsuario
-from ..schemas import PrestamoResponse, PrestamoCreate, PrestamoDevolver
+from ..models import Prestamo, Equipo, Trabajador, EstadoPrestamo, Usuario, RolUsuario, ESTADOS_ACTIVOS, INDICE_PRESTAMO_ACTIVO
+from ..schemas import (
+    PrestamoResponse, PrestamoCompacto, PrestamoCreate, PrestamoDevolver,
+    PrestamoLoteCreate, PrestamoLoteResponse, PrestamoLoteResultado,
+    DevolucionLoteCreate, DevolucionLoteResponse, DevolucionLoteResultado
+)
 from ..auth import get_current_user, require_role
+from ..paginacion import paginar, LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+from .. import alertas_activas, archivo_prestamos, estadisticas_diarias, estado_equipos, eventos, problemas_devolucion, vistas
+from .. import busqueda as busqueda_equipos
 
 router = APIRouter(prefix="/api/prestamos", tags=["prestamos"])
 
+# Máximo de pares por préstamo en lote
+MAX_PRESTAMOS_LOTE = 500
+# Error de los pares válidos de un lote todo_o_nada rechazado
+ERROR_LOTE_NO_CREADO = "No creado: el lote tiene préstamos no válidos"
 
-@router.get("/", response_model=List[PrestamoResponse])
+
+def es_prestamo_activo_duplicado(error: IntegrityError) -> bool:
+    """El error corresponde al índice de un préstamo activo por equipo"""
+    mensaje = str(error.orig)
+    # PostgreSQL informa el nombre del índice; SQLite las columnas
+    return INDICE_PRESTAMO_ACTIVO in mensaje or "prestamos.equipo_id" in mensaje
+
+
+def _filtrar_rango(query, columna, desde: Optional[date], hasta: Optional[date]):
+    """Filtra una columna de fecha/hora por días completos [desde, hasta]"""
+    if desde:
+        query = query.filter(columna >= datetime.combine(desde, time.min))
+    if hasta:
+        query = query.filter(columna < datetime.combine(hasta + timedelta(days=1), time.min))
+    return query
+
+
+@router.get("/", response_model=Union[List[PrestamoResponse], List[PrestamoCompacto]])
 def get_prestamos(
+    response: Response,
     obra: Optional[str] = None,
     estado: Optional[str] = None,
+    serie: Optional[str] = Query(None, description="Serie del equipo (contiene)"),
+    rut: Optional[str] = Query(None, description="RUT del trabajador"),
+    prestado_desde: Optional[date] = Query(None, description="Fecha de préstamo desde (inclusive)"),
+    prestado_hasta: Optional[date] = Query(None, description="Fecha de préstamo hasta (inclusive)"),
+    devuelto_desde: Optional[date] = Query(None, description="Fecha de devolución desde (inclusive)"),
+    devuelto_hasta: Optional[date] = Query(None, description="Fecha de devolución hasta (inclusive)"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación (cabecera X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=f"Cantidad máxima de resultados (por defecto {LIMITE_POR_DEFECTO})"),
+    conteo: Optional[str] = Query(None, pattern="^(exacto|estimado)$", description="Incluir total en cabecera X-Total-Count"),
+    view: Optional[str] = Query(None, pattern=vistas.PATRON_VISTA, description="compact: solo columnas de listado"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """Obtener préstamos según rol"""
-    query = db.query(Prestamo)
+    compacta = view == vistas.VISTA_COMPACTA
+    if compacta:
+        query = vistas.consulta_prestamos(db)
+        con_trabajador = con_equipo = True
+    else:
+        # Equipo y trabajador se cargan en lote (evita 2 consultas por préstamo al serializar)
+        query = db.query(Prestamo).options(
+            selectinload(Prestamo.equipo),
+            selectinload(Prestamo.trabajador)
+        )
+        con_trabajador = con_equipo = False
     
     # RRHH solo ve activos
     if current_user.rol == RolUsuario.RRHH:
-        query = query.filter(Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO)
+        query = query.filter(Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS))
     
     # JEFE OBRA solo ve de su obra
     if current_user.rol == RolUsuario.JEFE_OBRA:
         if not current_user.obra:
             return []
-        query = query.join(Trabajador).filter(
+        if not con_trabajador:
+            query = query.join(Trabajador)
+            con_trabajador = True
+        query = query.filter(
             and_(
                 Trabajador.obra == current_user.obra,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
             )
         )
     
     # Filtros opcionales
     if obra:
-        query = query.join(Trabajador).filter(Trabajador.obra == obra)
-    if estado:
+        if not con_trabajador:
+            query = query.join(Trabajador)
+        query = query.filter(Trabajador.obra == obra)
+    if estado == EstadoPrestamo.ASIGNADO.value:
+        # ASIGNADO incluye los vencidos (el equipo sigue en poder del trabajador)
+        query = query.filter(Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS))
+    elif estado:
         query = query.filter(Prestamo.estado_prestamo == estado)
+    if rut:
+        query = query.filter(Prestamo.trabajador_rut == rut)
+    if serie and serie.strip():
+        if not con_equipo:
+            query = query.join(Equipo, Equipo.id == Prestamo.equipo_id)
+        query = query.filter(busqueda_equipos.condicion(db, serie, busqueda_equipos.CAMPOS_SERIE))
+    query = _filtrar_rango(query, Prestamo.fecha_prestamo, prestado_desde, prestado_hasta)
+    query = _filtrar_rango(query, Prestamo.fecha_devolucion, devuelto_desde, devuelto_hasta)
     
-    prestamos = query.all()
+    orden = [(Prestamo.fecha_prestamo, True), (Prestamo.id, True)]
+    prestamos = paginar(db, query, orden, response, cursor, limit, conteo)
+    if compacta:
+        return vistas.respuesta(prestamos, response)
     return prestamos
 
 
@@ -57,8 +126,21 @@ def get_prestamos_por_rut(
     if current_user.rol not in [RolUsuario.INFORMATICA, RolUsuario.RRHH, RolUsuario.JEFE_OBRA]:
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
-    prestamos = db.query(Prestamo).filter(Prestamo.trabajador_rut == rut).all()
-    return prestamos
+    # Incluye los préstamos archivados en prestamos_historico
+    return archivo_prestamos.historial_prestamos(db, rut=rut)
+
+
+@router.get("/equipo/{equipo_id}", response_model=List[PrestamoResponse])
+def get_prestamos_por_equipo(
+    equipo_id: int,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Obtener historial de préstamos de un equipo"""
+    if current_user.rol not in [RolUsuario.INFORMATICA, RolUsuario.RRHH, RolUsuario.JEFE_OBRA]:
+        raise HTTPException(status_code=403, detail="No tiene permisos")
+    
+    return archivo_prestamos.historial_prestamos(db, equipo_id=equipo_id)
 
 
 @router.post("/", response_model=PrestamoResponse)
@@ -77,17 +159,6 @@ def create_prestamo(
             print(f"[PRESTAMO] Equipo {prestamo_data.equipo_id} no encontrado")
             raise HTTPException(status_code=404, detail="Equipo no encontrado")
         
-        # Verificar que no tenga préstamo activo
-        prestamo_activo = db.query(Prestamo).filter(
-            and_(
-                Prestamo.equipo_id == prestamo_data.equipo_id,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
-            )
-        ).first()
-        if prestamo_activo:
-            print(f"[PRESTAMO] Equipo {prestamo_data.equipo_id} ya está prestado")
-            raise HTTPException(status_code=400, detail="Equipo ya está prestado")
-        
         # Verificar trabajador existe y está activo
         trabajador = db.query(Trabajador).filter(Trabajador.rut == prestamo_data.trabajador_rut).first()
         if not trabajador:
@@ -103,6 +174,8 @@ def create_prestamo(
             raise HTTPException(status_code=400, detail="Obra del trabajador no coincide")
         
         # Crear préstamo (+30 días)
+        # Que el equipo no tenga préstamo activo lo garantiza el índice único parcial
+        # ux_prestamos_equipo_prestado: si ya está prestado, el INSERT falla
         print(f"[PRESTAMO] Creando préstamo...")
         fecha_vencimiento = datetime.utcnow() + timedelta(days=30)
         new_prestamo = Prestamo(
@@ -117,11 +190,29 @@ def create_prestamo(
         db.add(new_prestamo)
         print(f"[PRESTAMO] Haciendo commit...")
         try:
+            db.flush()
+            estado_equipos.registrar_prestamo(db, new_prestamo, trabajador)
+            alertas_activas.registrar_prestamos(db, [{
+                "prestamo_id": new_prestamo.id,
+                "obra": trabajador.obra,
+                "fecha_vencimiento": new_prestamo.fecha_vencimiento,
+            }])
+            estadisticas_diarias.registrar_prestamos(db, [{
+                "fecha": new_prestamo.fecha_prestamo,
+                "obra": trabajador.obra,
+                "tipo": equipo.tipo,
+            }])
             db.commit()
             print(f"[PRESTAMO] Commit exitoso, refrescando...")
             db.refresh(new_prestamo)
             print(f"[PRESTAMO] Préstamo creado exitosamente: ID {new_prestamo.id}")
             return new_prestamo
+        except IntegrityError as integrity_error:
+            db.rollback()
+            if not es_prestamo_activo_duplicado(integrity_error):
+                raise
+            print(f"[PRESTAMO] Equipo {prestamo_data.equipo_id} ya está prestado")
+            raise HTTPException(status_code=400, detail="Equipo ya está prestado")
         except Exception as commit_error:
             print(f"[PRESTAMO] ERROR en commit: {str(commit_error)}")
             import traceback
@@ -146,6 +237,157 @@ def create_prestamo(
         )
 
 
+def _validar_lote_prestamos(db: Session, datos: PrestamoLoteCreate) -> Tuple[List[Optional[str]], Dict, Dict]:
+    """Error de cada par del lote (None si es válido), trabajadores por RUT y tipo de cada equipo, con consultas por conjunto"""
+    equipo_ids = {item.equipo_id for item in datos.prestamos}
+    ruts = {item.trabajador_rut for item in datos.prestamos}
+    
+    tipos = {
+        equipo_id: tipo for equipo_id, tipo in db.query(Equipo.id, Equipo.tipo).filter(Equipo.id.in_(equipo_ids))
+    }
+    prestados = {
+        equipo_id for (equipo_id,) in db.query(Prestamo.equipo_id).filter(
+            and_(
+                Prestamo.equipo_id.in_(equipo_ids),
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
+            )
+        )
+    }
+    trabajadores = {
+        t.rut: t for t in db.query(Trabajador.rut, Trabajador.activo, Trabajador.obra).filter(
+            Trabajador.rut.in_(ruts)
+        )
+    }
+    
+    errores = []
+    vistos = set()
+    for item in datos.prestamos:
+        trabajador = trabajadores.get(item.trabajador_rut)
+        if item.equipo_id not in tipos:
+            error = "Equipo no encontrado"
+        elif item.equipo_id in prestados:
+            error = "Equipo ya está prestado"
+        elif item.equipo_id in vistos:
+            error = "Equipo repetido en el lote"
+        elif trabajador is None:
+            error = "Trabajador no encontrado"
+        elif not trabajador.activo:
+            error = "Trabajador inactivo"
+        elif datos.obra is not None and trabajador.obra != datos.obra:
+            error = "Obra del trabajador no coincide"
+        else:
+            error = None
+        vistos.add(item.equipo_id)
+        errores.append(error)
+    return errores, trabajadores, tipos
+
+
+@router.post("/lote", response_model=PrestamoLoteResponse)
+def create_prestamos_lote(
+    datos: PrestamoLoteCreate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Crear varios préstamos en una transacción (solo Informática).
+    
+    Modo todo_o_nada: si algún par no es válido no se crea ninguno (400 con el
+    detalle por par). Modo parcial: se crean los válidos y se informan los rechazados.
+    """
+    if not datos.prestamos:
+        return PrestamoLoteResponse(creados=0, rechazados=0, resultados=[])
+    if len(datos.prestamos) > MAX_PRESTAMOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PRESTAMOS_LOTE} préstamos por lote")
+    
+    # Si otro request presta un equipo entre la validación y el INSERT, el índice
+    # único lo rechaza: se vuelve a validar (en modo parcial ese par queda rechazado)
+    ids_prestamos = {}
+    for intento in range(3):
+        errores, trabajadores, tipos = _validar_lote_prestamos(db, datos)
+        validos = [item for item, error in zip(datos.prestamos, errores) if error is None]
+        if datos.modo == "todo_o_nada" and len(validos) < len(datos.prestamos):
+            break
+        
+        fecha_vencimiento = datetime.utcnow() + timedelta(days=30)
+        try:
+            if validos:
+                insertados = db.execute(
+                    insert(Prestamo).returning(Prestamo.id, Prestamo.equipo_id, Prestamo.fecha_prestamo),
+                    [
+                        {
+                            "equipo_id": item.equipo_id,
+                            "trabajador_rut": item.trabajador_rut,
+                            "fecha_vencimiento": fecha_vencimiento,
+                            "estado_prestamo": EstadoPrestamo.ASIGNADO,
+                            "cambiado_por": current_user.username,
+                            "estado_entrega_bueno": item.estado_entrega_bueno,
+                            "estado_entrega_con_cargador": item.estado_entrega_con_cargador,
+                            "observaciones_entrega": item.observaciones_entrega,
+                        }
+                        for item in validos
+                    ]
+                ).all()
+                ids_prestamos = {fila.equipo_id: fila.id for fila in insertados}
+                fechas_prestamo = {fila.equipo_id: fila.fecha_prestamo for fila in insertados}
+                estado_equipos.registrar_prestamos(db, [
+                    {
+                        "equipo_id": item.equipo_id,
+                        "prestamo_id": ids_prestamos[item.equipo_id],
+                        "rut": item.trabajador_rut,
+                        "obra": trabajadores[item.trabajador_rut].obra,
+                    }
+                    for item in validos
+                ])
+                alertas_activas.registrar_prestamos(db, [
+                    {
+                        "prestamo_id": ids_prestamos[item.equipo_id],
+                        "obra": trabajadores[item.trabajador_rut].obra,
+                        "fecha_vencimiento": fecha_vencimiento,
+                    }
+                    for item in validos
+                ])
+                estadisticas_diarias.registrar_prestamos(db, [
+                    {
+                        "fecha": fechas_prestamo[item.equipo_id],
+                        "obra": trabajadores[item.trabajador_rut].obra,
+                        "tipo": tipos[item.equipo_id],
+                    }
+                    for item in validos
+                ])
+            db.commit()
+            break
+        except IntegrityError as e:
+            db.rollback()
+            if not es_prestamo_activo_duplicado(e):
+                print(f"[PRESTAMO] ERROR en préstamo en lote: {e}")
+                raise HTTPException(status_code=500, detail=f"Error al crear préstamos: {str(e.orig)}")
+            print(f"[PRESTAMO] Préstamo concurrente durante lote, revalidando (intento {intento + 1})")
+    else:
+        raise HTTPException(status_code=409, detail="No se pudo crear el lote por préstamos concurrentes, reintente")
+    
+    # En todo_o_nada rechazado los pares válidos tampoco se crean: se informa el motivo
+    rechazado = datos.modo == "todo_o_nada" and any(error is not None for error in errores)
+    resultados = [
+        PrestamoLoteResultado(
+            equipo_id=item.equipo_id,
+            trabajador_rut=item.trabajador_rut,
+            ok=error is None and item.equipo_id in ids_prestamos,
+            prestamo_id=ids_prestamos.get(item.equipo_id) if error is None else None,
+            error=ERROR_LOTE_NO_CREADO if error is None and rechazado else error
+        )
+        for item, error in zip(datos.prestamos, errores)
+    ]
+    creados = sum(1 for resultado in resultados if resultado.ok)
+    respuesta = PrestamoLoteResponse(creados=creados, rechazados=len(resultados) - creados, resultados=resultados)
+    
+    if datos.modo == "todo_o_nada" and creados < len(resultados):
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Hay préstamos no válidos, no se creó ninguno", **respuesta.model_dump()}
+        )
+    print(f"[PRESTAMO] Lote: {creados} préstamos creados, {respuesta.rechazados} rechazados")
+    return respuesta
+
+
 @router.put("/{prestamo_id}/devolver", response_model=PrestamoResponse)
 def devolver_prestamo(
     prestamo_id: int,
@@ -154,7 +396,8 @@ def devolver_prestamo(
     current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
 ):
     """Devolver préstamo (solo Informática)"""
-    prestamo = db.query(Prestamo).filter(Prestamo.id == prestamo_id).first()
+    # Bloqueado hasta el commit para no pisar una devolución en lote concurrente
+    prestamo = db.query(Prestamo).filter(Prestamo.id == prestamo_id).with_for_update().first()
     if not prestamo:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
@@ -163,17 +406,139 @@ def devolver_prestamo(
     
     # Guardar la hora actual en UTC
     # La guardamos en UTC y el frontend la mostrará en hora local de Chile
+    ahora = datetime.utcnow()
+    vencido_sin_marcar = estadisticas_diarias.vencido_sin_marcar(prestamo.estado_prestamo, prestamo.fecha_vencimiento, ahora)
     prestamo.estado_prestamo = EstadoPrestamo.DEVUELTO
-    prestamo.fecha_devolucion = datetime.utcnow()
+    prestamo.fecha_devolucion = ahora
     prestamo.cambiado_por = current_user.username
     prestamo.estado_devolucion_bueno = devolucion_data.estado_devolucion_bueno
     prestamo.estado_devolucion_con_cargador = devolucion_data.estado_devolucion_con_cargador
     prestamo.observaciones_devolucion = devolucion_data.observaciones_devolucion
+    estado_equipos.registrar_devolucion(db, prestamo)
+    alertas_activas.registrar_devoluciones(db, [{
+        "prestamo_id": prestamo.id,
+        "obra": prestamo.trabajador.obra,
+        "problema": bool(problemas_devolucion.problemas(prestamo)),
+    }])
+    estadisticas_diarias.registrar_devoluciones(db, [{
+        "fecha": ahora,
+        "obra": prestamo.trabajador.obra,
+        "tipo": prestamo.equipo.tipo,
+        "fecha_vencimiento": prestamo.fecha_vencimiento,
+        "vencido_sin_marcar": vencido_sin_marcar,
+    }])
     db.commit()
     db.refresh(prestamo)
     return prestamo
 
 
+@router.post("/devolver-lote", response_model=DevolucionLoteResponse)
+def devolver_prestamos_lote(
+    datos: DevolucionLoteCreate,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
+):
+    """Devolver varios equipos escaneados (por serie o equipo_id) en una transacción (solo Informática).
+    
+    Los equipos sin préstamo activo se informan como rechazados; el resto se devuelve.
+    """
+    if len(datos.devoluciones) > MAX_PRESTAMOS_LOTE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_PRESTAMOS_LOTE} devoluciones por lote")
+    
+    series = {item.serie.strip().upper() for item in datos.devoluciones if item.serie and item.serie.strip()}
+    equipo_ids = {item.equipo_id for item in datos.devoluciones if item.equipo_id is not None}
+    
+    # Préstamos activos de todos los equipos escaneados, en una consulta. Se bloquean
+    # hasta el commit: una devolución individual concurrente espera y luego los ve
+    # devueltos; si ella confirmó antes, la relectura del bloqueo los excluye.
+    activos = db.query(
+        Prestamo.id, Prestamo.equipo_id, Prestamo.trabajador_rut, Prestamo.estado_prestamo,
+        Prestamo.fecha_vencimiento, Equipo.serie, Equipo.tipo, Trabajador.obra
+    ).join(Equipo, Equipo.id == Prestamo.equipo_id).join(
+        Trabajador, Trabajador.rut == Prestamo.trabajador_rut
+    ).filter(
+        and_(
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS),
+            or_(Equipo.serie.in_(series), Equipo.id.in_(equipo_ids))
+        )
+    ).with_for_update(of=Prestamo).all() if series or equipo_ids else []
+    por_serie = {fila.serie.upper(): fila for fila in activos}
+    por_equipo = {fila.equipo_id: fila for fila in activos}
+    obras = {fila.id: fila.obra for fila in activos}
+    por_id = {fila.id: fila for fila in activos}
+    
+    ahora = datetime.utcnow()
+    cambios = []
+    resultados = []
+    vistos = set()
+    for item in datos.devoluciones:
+        serie = item.serie.strip().upper() if item.serie and item.serie.strip() else None
+        if serie is None and item.equipo_id is None:
+            resultados.append(DevolucionLoteResultado(ok=False, error="Indique serie o equipo_id"))
+            continue
+        activo = por_serie.get(serie) if serie is not None else por_equipo.get(item.equipo_id)
+        resultado = DevolucionLoteResultado(serie=item.serie, equipo_id=item.equipo_id, ok=False)
+        if activo is None:
+            resultado.error = "Equipo sin préstamo activo"
+        elif activo.id in vistos:
+            resultado.error = "Equipo repetido en el lote"
+        else:
+            vistos.add(activo.id)
+            resultado.ok = True
+            resultado.serie = activo.serie
+            resultado.equipo_id = activo.equipo_id
+            resultado.prestamo_id = activo.id
+            resultado.trabajador_rut = activo.trabajador_rut
+            cambios.append({
+                "id": activo.id,
+                "estado_prestamo": EstadoPrestamo.DEVUELTO,
+                "fecha_devolucion": ahora,
+                "cambiado_por": current_user.username,
+                "estado_devolucion_bueno": item.estado_devolucion_bueno,
+                "estado_devolucion_con_cargador": item.estado_devolucion_con_cargador,
+                "observaciones_devolucion": item.observaciones_devolucion,
+            })
+        resultados.append(resultado)
+    
+    if cambios:
+        try:
+            # UPDATE por clave primaria en lote (executemany)
+            db.execute(update(Prestamo), cambios, execution_options={"synchronize_session": False})
+            estado_equipos.registrar_devoluciones(db, [
+                {"equipo_id": r.equipo_id, "prestamo_id": r.prestamo_id, "rut": r.trabajador_rut, "obra": obras[r.prestamo_id]}
+                for r in resultados if r.ok
+            ])
+            alertas_activas.registrar_devoluciones(db, [
+                {
+                    "prestamo_id": cambio["id"],
+                    "obra": obras[cambio["id"]],
+                    "problema": not cambio["estado_devolucion_bueno"] or not cambio["estado_devolucion_con_cargador"],
+                }
+                for cambio in cambios
+            ])
+            estadisticas_diarias.registrar_devoluciones(db, [
+                {
+                    "fecha": ahora,
+                    "obra": fila.obra,
+                    "tipo": fila.tipo,
+                    "fecha_vencimiento": fila.fecha_vencimiento,
+                    "vencido_sin_marcar": estadisticas_diarias.vencido_sin_marcar(
+                        fila.estado_prestamo, fila.fecha_vencimiento, ahora
+                    ),
+                }
+                for fila in (por_id[cambio["id"]] for cambio in cambios)
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[PRESTAMO] ERROR en devolución en lote: {e}")
+            raise HTTPException(status_code=500, detail=f"Error al devolver préstamos: {str(e)}")
+    
+    devueltos = len(cambios)
+    print(f"[PRESTAMO] Devolución en lote: {devueltos} devueltos, {len(resultados) - devueltos} rechazados")
+    return DevolucionLoteResponse(devueltos=devueltos, rechazados=len(resultados) - devueltos, resultados=resultados)
+
+
 @router.get("/{prestamo_id}", response_model=PrestamoResponse)
 def get_prestamo(
     prestamo_id: int,
@@ -181,7 +546,7 @@ def get_prestamo(
     current_user: Usuario = Depends(get_current_user)
 ):
     """Obtener préstamo por ID"""
-    prestamo = db.query(Prestamo).filter(Prestamo.id == prestamo_id).first()
+    prestamo = archivo_prestamos.obtener_prestamo(db, prestamo_id)
     if not prestamo:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
@@ -209,6 +574,11 @@ def marcar_cargador_devuelto(
     
     prestamo.cargador_devuelto_despues = True
     prestamo.cambiado_por = current_user.username
+    alertas_activas.registrar_cargador_devuelto(db, prestamo)
+    eventos.emitir(
+        db, eventos.PRESTAMO_ACTUALIZADO,
+        prestamo_id=prestamo.id, equipo_id=prestamo.equipo_id, obra=prestamo.trabajador.obra
+    )
     db.commit()
     db.refresh(prestamo)
     return prestamo
@@ -226,41 +596,16 @@ def get_alertas_trabajador(
         raise HTTPException(status_code=403, detail="No tiene permisos")
     
     # Buscar préstamos devueltos con problemas pendientes
-    prestamos_problema = db.query(Prestamo).filter(
+    prestamos_problema = db.query(Prestamo).options(
+        selectinload(Prestamo.equipo)
+    ).filter(
         and_(
             Prestamo.trabajador_rut == rut,
-            Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO,
-            # Problemas: sin cargador y no fue devuelto después, o equipo no bueno
-            or_(
-                and_(
-                    Prestamo.estado_devolucion_con_cargador == False,
-                    Prestamo.cargador_devuelto_despues == False
-                ),
-                Prestamo.estado_devolucion_bueno == False
-            )
+            problemas_devolucion.condicion_problema_pendiente()
         )
     ).order_by(Prestamo.fecha_devolucion.desc()).all()
     
-    alertas = []
-    for prestamo in prestamos_problema:
-        problemas = []
-        if prestamo.estado_devolucion_con_cargador == False and not prestamo.cargador_devuelto_despues:
-            problemas.append("Sin cargador")
-        if prestamo.estado_devolucion_bueno == False:
-            problemas.append("Equipo en mal estado")
-        
-        if problemas:
-            alertas.append({
-                "prestamo_id": prestamo.id,
-                "equipo_serie": prestamo.equipo.serie,
-                "equipo_tipo": prestamo.equipo.tipo,
-                "fecha_devolucion": prestamo.fecha_devolucion.isoformat() if prestamo.fecha_devolucion else None,
-                "problemas": problemas,
-                "observaciones": prestamo.observaciones_devolucion,
-                "cargador_devuelto": prestamo.cargador_devuelto_despues
-            })
-    
-    return alertas
+    return [problemas_devolucion.alerta(prestamo) for prestamo in prestamos_problema]
 
 
 @router.delete("/{prestamo_id}", status_code=204)
@@ -270,7 +615,7 @@ def delete_prestamo(
     current_user: Usuario = Depends(require_role([RolUsuario.INFORMATICA]))
 ):
     """Eliminar préstamo del historial (solo Informática)"""
-    prestamo = db.query(Prestamo).filter(Prestamo.id == prestamo_id).first()
+    prestamo = archivo_prestamos.obtener_prestamo(db, prestamo_id)
     if not prestamo:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
@@ -278,6 +623,9 @@ def delete_prestamo(
     if prestamo.estado_prestamo != EstadoPrestamo.DEVUELTO:
         raise HTTPException(status_code=400, detail="Solo se pueden eliminar préstamos devueltos del historial")
     
+    estado_equipos.registrar_eliminacion_prestamo(db, prestamo)
+    alertas_activas.registrar_eliminacion_prestamo(db, prestamo)
+    estadisticas_diarias.registrar_eliminacion_prestamo(db, prestamo)
     db.delete(prestamo)
     db.commit()
     return None
@@ -6,6 +6,7 @@ from ..database import get_db
 from ..models import Equipo, Usuario, RolUsuario
 from ..schemas import ReporteFallaCreate
 from ..auth import get_current_user
+from .. import estado_equipos
 import base64
 from typing import Optional
 
@@ -28,11 +29,11 @@ def reportar_falla(
     # Verificar permisos JEFE OBRA
     if current_user.rol == RolUsuario.JEFE_OBRA:
         # Verificar que el equipo esté prestado a su obra
-        from ..models import Prestamo, Trabajador, EstadoPrestamo
+        from ..models import Prestamo, Trabajador, ESTADOS_ACTIVOS
         prestamo = db.query(Prestamo).join(Trabajador).filter(
             and_(
                 Prestamo.equipo_id == equipo_id,
-                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
+                Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS),
                 Trabajador.obra == current_user.obra
             )
         ).first()
@@ -49,6 +50,7 @@ def reportar_falla(
         foto_base64 = base64.b64encode(foto_data).decode('utf-8')
         equipo.observaciones += f"\n[FOTO: {foto.filename}]"
     equipo.estado_dispositivo = "MANTENCIÓN"
+    estado_equipos.registrar_equipo(db, equipo)
     
     db.commit()
     db.refresh(equipo)
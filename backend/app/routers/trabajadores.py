@@ -1,19 +1,30 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from datetime import datetime
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, and_, or_, case
 from ..database import get_db
-from ..models import Trabajador, Usuario, RolUsuario, Prestamo, EstadoPrestamo
-from ..schemas import TrabajadorResponse, TrabajadorCreate, TrabajadorUpdate
+from ..models import Trabajador, Usuario, RolUsuario, Prestamo, PrestamoHistorico, EstadoPrestamo, ESTADOS_ACTIVOS
+from ..schemas import TrabajadorResponse, TrabajadorCreate, TrabajadorUpdate, TrabajadorResumen, ConteosTrabajador
 from ..auth import get_current_user, require_role
+from ..paginacion import paginar, LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+from .. import alertas_activas, estadisticas_diarias, estado_equipos, eventos, problemas_devolucion
+from ..vencimientos import condicion_vencido
 
 router = APIRouter(prefix="/api/trabajadores", tags=["trabajadores"])
 
+# Devoluciones incluidas en el resumen del trabajador
+HISTORIAL_RESUMEN = 10
+
 
 @router.get("/", response_model=List[TrabajadorResponse])
 def get_trabajadores(
+    response: Response,
     obra: Optional[str] = Query(None),
     activo: Optional[bool] = Query(None),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación (cabecera X-Next-Cursor)"),
+    limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description=f"Cantidad máxima de resultados (por defecto {LIMITE_POR_DEFECTO})"),
+    conteo: Optional[str] = Query(None, pattern="^(exacto|estimado)$", description="Incluir total en cabecera X-Total-Count"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -31,7 +42,7 @@ def get_trabajadores(
     if activo is not None:
         query = query.filter(Trabajador.activo == activo)
     
-    trabajadores = query.all()
+    trabajadores = paginar(db, query, [(Trabajador.rut, False)], response, cursor, limit, conteo)
     return trabajadores
 
 
@@ -54,6 +65,88 @@ def get_trabajador(
     return trabajador
 
 
+@router.get("/{rut}/resumen", response_model=TrabajadorResumen)
+def get_resumen_trabajador(
+    rut: str,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Perfil del trabajador: préstamos activos, historial reciente, problemas pendientes y conteos.
+    
+    Usa una cantidad fija de consultas, independiente de la cantidad de préstamos.
+    """
+    trabajador = db.query(Trabajador).filter(Trabajador.rut == rut).first()
+    if not trabajador:
+        raise HTTPException(status_code=404, detail="Trabajador no encontrado")
+    
+    if current_user.rol == RolUsuario.JEFE_OBRA:
+        if trabajador.obra != current_user.obra:
+            raise HTTPException(status_code=403, detail="No tiene acceso a este trabajador")
+    
+    ahora = datetime.utcnow()
+    problema = problemas_devolucion.condicion_problema_pendiente()
+    
+    # Conteos en una sola consulta (los archivados son todos devueltos)
+    conteos = db.query(
+        func.count(Prestamo.id).label("total"),
+        func.sum(case((Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS), 1), else_=0)).label("activos"),
+        func.sum(case((condicion_vencido(ahora), 1), else_=0)).label("vencidos"),
+        func.sum(case((Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO, 1), else_=0)).label("devueltos"),
+        func.sum(case((problema, 1), else_=0)).label("problemas"),
+    ).filter(Prestamo.trabajador_rut == rut).one()
+    archivados = db.query(func.count(PrestamoHistorico.id)).filter(
+        PrestamoHistorico.trabajador_rut == rut
+    ).scalar() or 0
+    
+    # Préstamos activos y devueltos con problemas en una consulta
+    pendientes = db.query(Prestamo).options(
+        selectinload(Prestamo.equipo)
+    ).filter(
+        and_(
+            Prestamo.trabajador_rut == rut,
+            or_(Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS), problema)
+        )
+    ).order_by(Prestamo.fecha_prestamo.desc(), Prestamo.id.desc()).all()
+    activos = [p for p in pendientes if p.estado_prestamo in ESTADOS_ACTIVOS]
+    con_problemas = sorted(
+        (p for p in pendientes if p.estado_prestamo == EstadoPrestamo.DEVUELTO),
+        key=lambda p: p.fecha_devolucion or datetime.min,
+        reverse=True
+    )
+    
+    # Últimas devoluciones (el archivo solo se consulta si faltan)
+    recientes = db.query(Prestamo).options(
+        selectinload(Prestamo.equipo)
+    ).filter(
+        and_(
+            Prestamo.trabajador_rut == rut,
+            Prestamo.estado_prestamo == EstadoPrestamo.DEVUELTO
+        )
+    ).order_by(Prestamo.fecha_devolucion.desc(), Prestamo.id.desc()).limit(HISTORIAL_RESUMEN).all()
+    if len(recientes) < HISTORIAL_RESUMEN and archivados:
+        recientes += db.query(PrestamoHistorico).options(
+            selectinload(PrestamoHistorico.equipo)
+        ).filter(
+            PrestamoHistorico.trabajador_rut == rut
+        ).order_by(
+            PrestamoHistorico.fecha_devolucion.desc(), PrestamoHistorico.id.desc()
+        ).limit(HISTORIAL_RESUMEN - len(recientes)).all()
+    
+    return TrabajadorResumen(
+        trabajador=trabajador,
+        prestamos_activos=activos,
+        historial_reciente=recientes,
+        problemas_pendientes=[problemas_devolucion.alerta(p) for p in con_problemas],
+        conteos=ConteosTrabajador(
+            total_prestamos=conteos.total + archivados,
+            prestamos_activos=conteos.activos or 0,
+            prestamos_vencidos=conteos.vencidos or 0,
+            prestamos_devueltos=(conteos.devueltos or 0) + archivados,
+            problemas_pendientes=conteos.problemas or 0
+        )
+    )
+
+
 @router.post("/", response_model=TrabajadorResponse)
 def create_trabajador(
     trabajador: TrabajadorCreate,
@@ -66,6 +159,7 @@ def create_trabajador(
     
     new_trabajador = Trabajador(**trabajador.dict())
     db.add(new_trabajador)
+    eventos.emitir(db, eventos.TRABAJADOR_ACTUALIZADO, rut=new_trabajador.rut, obra=new_trabajador.obra)
     db.commit()
     db.refresh(new_trabajador)
     return new_trabajador
@@ -84,9 +178,24 @@ def update_trabajador(
         raise HTTPException(status_code=404, detail="Trabajador no encontrado")
     
     update_data = trabajador_update.dict(exclude_unset=True)
+    estaba_activo = trabajador.activo
+    obra_anterior = trabajador.obra
     for field, value in update_data.items():
         setattr(trabajador, field, value)
     
+    # Los equipos que tiene prestados (y sus alertas) pasan a la nueva obra
+    if "obra" in update_data:
+        estado_equipos.registrar_cambio_obra(db, rut, trabajador.obra)
+        alertas_activas.registrar_cambio_obra(db, rut, trabajador.obra)
+        estadisticas_diarias.registrar_cambio_obra(db, rut, obra_anterior, trabajador.obra)
+    if "activo" in update_data and trabajador.activo != estaba_activo:
+        alertas_activas.registrar_cambio_activo(db, rut, trabajador.activo)
+        if not trabajador.activo:
+            eventos.emitir(db, eventos.TRABAJADOR_DESPEDIDO, rut=rut, obra=trabajador.obra)
+    # Si cambió de obra, ambas obras se enteran (sale de una y entra a la otra)
+    for obra in dict.fromkeys([obra_anterior, trabajador.obra]):
+        eventos.emitir(db, eventos.TRABAJADOR_ACTUALIZADO, rut=rut, obra=obra)
+    
     db.commit()
     db.refresh(trabajador)
     return trabajador
@@ -103,7 +212,10 @@ def marcar_despido(
     if not trabajador:
         raise HTTPException(status_code=404, detail="Trabajador no encontrado")
     
-    trabajador.activo = False
+    if trabajador.activo:
+        trabajador.activo = False
+        alertas_activas.registrar_cambio_activo(db, rut, False)
+        eventos.emitir(db, eventos.TRABAJADOR_DESPEDIDO, rut=rut, obra=trabajador.obra)
     db.commit()
     return {"message": "Trabajador marcado como despedido", "trabajador": trabajador}
 
@@ -123,7 +235,7 @@ def delete_trabajador(
     prestamos_activos = db.query(func.count(Prestamo.id)).filter(
         and_(
             Prestamo.trabajador_rut == rut,
-            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO
+            Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
         )
     ).scalar()
     
@@ -134,6 +246,7 @@ def delete_trabajador(
         )
     
     db.delete(trabajador)
+    eventos.emitir(db, eventos.TRABAJADOR_ACTUALIZADO, rut=rut, obra=trabajador.obra)
     db.commit()
     return {"message": "Trabajador eliminado exitosamente"}
 
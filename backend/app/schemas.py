@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from .models import EstadoDispositivo, EstadoPrestamo, RolUsuario
 
@@ -32,6 +32,19 @@ class EquipoUpdate(BaseModel):
     observaciones: Optional[str] = None
 
 
+class EquipoFiltroLote(BaseModel):
+    obra: Optional[str] = None
+    tipo: Optional[str] = None
+    estado_dispositivo: Optional[EstadoDispositivo] = None
+    busqueda: Optional[str] = None  # serie, tipo, marca o modelo
+
+
+class EquipoUpdateLote(BaseModel):
+    ids: Optional[List[int]] = None
+    filtro: Optional[EquipoFiltroLote] = None
+    cambios: EquipoUpdate
+
+
 class EquipoResponse(EquipoBase):
     id: int
     
@@ -87,6 +100,34 @@ class PrestamoCreate(BaseModel):
     observaciones_entrega: Optional[str] = None
 
 
+class PrestamoLoteItem(BaseModel):
+    equipo_id: int
+    trabajador_rut: str
+    estado_entrega_bueno: bool = True
+    estado_entrega_con_cargador: bool = True
+    observaciones_entrega: Optional[str] = None
+
+
+class PrestamoLoteCreate(BaseModel):
+    prestamos: List[PrestamoLoteItem]
+    obra: Optional[str] = None  # Si se indica, todos los trabajadores deben ser de esta obra
+    modo: Literal["todo_o_nada", "parcial"] = "todo_o_nada"
+
+
+class PrestamoLoteResultado(BaseModel):
+    equipo_id: int
+    trabajador_rut: str
+    ok: bool
+    prestamo_id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class PrestamoLoteResponse(BaseModel):
+    creados: int
+    rechazados: int
+    resultados: List[PrestamoLoteResultado]
+
+
 class PrestamoResponse(BaseModel):
     id: int
     equipo_id: int
@@ -110,6 +151,61 @@ class PrestamoResponse(BaseModel):
         from_attributes = True
 
 
+# ============ RESUMEN DE TRABAJADOR ============
+class ProblemaDevolucion(BaseModel):
+    prestamo_id: int
+    equipo_serie: str
+    equipo_tipo: str
+    fecha_devolucion: Optional[datetime] = None
+    problemas: List[str]
+    observaciones: Optional[str] = None
+    cargador_devuelto: Optional[bool] = None
+
+
+class ConteosTrabajador(BaseModel):
+    total_prestamos: int
+    prestamos_activos: int
+    prestamos_vencidos: int
+    prestamos_devueltos: int
+    problemas_pendientes: int
+
+
+class TrabajadorResumen(BaseModel):
+    trabajador: TrabajadorResponse
+    prestamos_activos: List[PrestamoResponse]
+    historial_reciente: List[PrestamoResponse]
+    problemas_pendientes: List[ProblemaDevolucion]
+    conteos: ConteosTrabajador
+
+
+# ============ VISTA COMPACTA (listados) ============
+class EquipoCompacto(BaseModel):
+    id: int
+    serie: str
+    tipo: str
+    marca: str
+    modelo: str
+    estado_dispositivo: EstadoDispositivo
+    prestamo_activo_id: Optional[int] = None
+    trabajador_rut: Optional[str] = None
+    trabajador_nombre: Optional[str] = None
+    obra: Optional[str] = None
+
+
+class PrestamoCompacto(BaseModel):
+    id: int
+    equipo_id: int
+    serie: str
+    tipo: str
+    trabajador_rut: str
+    trabajador_nombre: str
+    obra: str
+    fecha_prestamo: datetime
+    fecha_vencimiento: datetime
+    fecha_devolucion: Optional[datetime] = None
+    estado_prestamo: EstadoPrestamo
+
+
 # ============ USUARIOS / AUTH ============
 class UsuarioLogin(BaseModel):
     username: str
@@ -165,6 +261,33 @@ class PrestamoDevolver(BaseModel):
     observaciones_devolucion: Optional[str] = None
 
 
+class DevolucionLoteItem(BaseModel):
+    serie: Optional[str] = None  # Serie escaneada (o equipo_id)
+    equipo_id: Optional[int] = None
+    estado_devolucion_bueno: bool = True
+    estado_devolucion_con_cargador: bool = True
+    observaciones_devolucion: Optional[str] = None
+
+
+class DevolucionLoteCreate(BaseModel):
+    devoluciones: List[DevolucionLoteItem]
+
+
+class DevolucionLoteResultado(BaseModel):
+    serie: Optional[str] = None
+    equipo_id: Optional[int] = None
+    ok: bool
+    prestamo_id: Optional[int] = None
+    trabajador_rut: Optional[str] = None
+    error: Optional[str] = None
+
+
+class DevolucionLoteResponse(BaseModel):
+    devueltos: int
+    rechazados: int
+    resultados: List[DevolucionLoteResultado]
+
+
 # ============ REPORTE FALLA ============
 class ReporteFallaCreate(BaseModel):
     equipo_id: int
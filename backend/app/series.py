@@ -0,0 +1,81 @@
+"""
+Períodos de las series de tiempo del dashboard (día, semana o mes)
+
+Las consultas agrupan por período con expresion_periodo() (date_trunc en
+PostgreSQL, date/strftime en SQLite) y los períodos sin datos se completan con
+cero en Python recorriendo periodos(), así que un gráfico de varios meses
+cuesta una consulta. Las semanas empiezan el lunes.
+"""
+from datetime import date, datetime, timedelta
+from typing import List
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+DIA = "dia"
+SEMANA = "semana"
+MES = "mes"
+GRANULARIDADES = (DIA, SEMANA, MES)
+
+# Cantidad máxima de períodos por serie (evita rangos de años por día)
+MAX_PERIODOS = 1000
+
+_DATE_TRUNC = {DIA: "day", SEMANA: "week", MES: "month"}
+
+
+def inicio_periodo(fecha: date, granularidad: str) -> date:
+    """Primer día del período que contiene la fecha"""
+    if granularidad == SEMANA:
+        return fecha - timedelta(days=fecha.weekday())
+    if granularidad == MES:
+        return fecha.replace(day=1)
+    return fecha
+
+
+def siguiente_periodo(inicio: date, granularidad: str) -> date:
+    if granularidad == SEMANA:
+        return inicio + timedelta(days=7)
+    if granularidad == MES:
+        return date(inicio.year + 1, 1, 1) if inicio.month == 12 else date(inicio.year, inicio.month + 1, 1)
+    return inicio + timedelta(days=1)
+
+
+def periodos(desde: date, hasta: date, granularidad: str) -> List[date]:
+    """Inicios de los períodos que cubren [desde, hasta] (ambos inclusive)"""
+    resultado = []
+    actual = inicio_periodo(desde, granularidad)
+    while actual <= hasta:
+        resultado.append(actual)
+        actual = siguiente_periodo(actual, granularidad)
+    return resultado
+
+
+def contar_periodos(desde: date, hasta: date, granularidad: str) -> int:
+    """Cantidad de períodos sin generarlos (para validar el rango)"""
+    if hasta < desde:
+        return 0
+    inicio = inicio_periodo(desde, granularidad)
+    if granularidad == MES:
+        return (hasta.year - inicio.year) * 12 + hasta.month - inicio.month + 1
+    dias = 7 if granularidad == SEMANA else 1
+    return (hasta - inicio).days // dias + 1
+
+
+def expresion_periodo(db: Session, columna, granularidad: str):
+    """Expresión SQL con el inicio del período de la columna"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(_DATE_TRUNC[granularidad], columna)
+    if granularidad == SEMANA:
+        # weekday 0 avanza al domingo siguiente (o se queda); -6 días da el lunes
+        return func.date(columna, "weekday 0", "-6 days")
+    if granularidad == MES:
+        return func.strftime("%Y-%m-01", columna)
+    return func.date(columna)
+
+
+def como_fecha(valor) -> date:
+    """date_trunc retorna datetime y SQLite texto 'YYYY-MM-DD'"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
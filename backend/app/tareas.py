@@ -0,0 +1,67 @@
+"""
+Tareas programadas (vencimientos, archivo de préstamos)
+
+Cada tarea es una función que recibe una sesión y retorna la cantidad de filas
+afectadas. Se ejecutan periódicamente dentro de la app o desde cron con los
+scripts de scripts/, y cada ejecución queda registrada en ejecuciones_tareas.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy.orm import Session
+from .models import EjecucionTarea
+
+
+def registrar_ejecucion(
+    db: Session,
+    nombre: str,
+    inicio: float,
+    filas: Optional[int] = None,
+    error: Optional[str] = None
+) -> None:
+    ejecucion = db.get(EjecucionTarea, nombre)
+    if ejecucion is None:
+        ejecucion = EjecucionTarea(nombre=nombre)
+        db.add(ejecucion)
+    ejecucion.ultima_ejecucion = datetime.utcnow()
+    ejecucion.duracion_ms = int((time.monotonic() - inicio) * 1000)
+    ejecucion.filas_afectadas = filas
+    ejecucion.error = error
+
+
+def ejecutar_tarea(nombre: str, tarea: Callable[[Session], int], session_factory) -> int:
+    """Ejecuta la tarea en su propia sesión y registra el resultado"""
+    inicio = time.monotonic()
+    db = session_factory()
+    try:
+        try:
+            total = tarea(db)
+            registrar_ejecucion(db, nombre, inicio, filas=total)
+            db.commit()
+            if total:
+                print(f"[TAREAS] {nombre}: {total} filas")
+        except Exception as e:
+            db.rollback()
+            registrar_ejecucion(db, nombre, inicio, error=str(e))
+            db.commit()
+            raise
+        return total
+    finally:
+        db.close()
+
+
+async def ejecutar_periodicamente(
+    nombre: str,
+    tarea: Callable[[Session], int],
+    session_factory,
+    intervalo: int
+) -> None:
+    """Loop de la tarea dentro de la app (en un hilo para no bloquear el event loop)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, ejecutar_tarea, nombre, tarea, session_factory)
+        except Exception as e:
+            print(f"[TAREAS] ERROR en {nombre}: {e}")
+        await asyncio.sleep(intervalo)
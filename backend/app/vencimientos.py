@@ -0,0 +1,67 @@
+"""
+Tarea de vencimientos: marca como VENCIDO los préstamos ASIGNADO cuya fecha de
+vencimiento ya pasó y actualiza las alertas de vencimiento (alertas_activas) y
+los vencidos del resumen diario (estadisticas_diarias)
+
+Se ejecuta periódicamente dentro de la app (TAREA_VENCIDOS_INTERVALO segundos,
+0 para desactivar) o desde cron con scripts/marcar_prestamos_vencidos.py. Ver
+app/tareas.py.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+from .models import Prestamo, EstadoPrestamo, Trabajador
+from . import alertas_activas, estadisticas_diarias, eventos
+
+TAREA_VENCIDOS = "marcar_vencidos"
+INTERVALO_VENCIDOS = int(os.getenv("TAREA_VENCIDOS_INTERVALO", "900"))
+
+
+def condicion_vencido(ahora: Optional[datetime] = None):
+    """Condición SQL: préstamo vencido y no devuelto.
+
+    Incluye los ASIGNADO con fecha pasada que la tarea aún no marca.
+    """
+    ahora = ahora or datetime.utcnow()
+    return or_(
+        Prestamo.estado_prestamo == EstadoPrestamo.VENCIDO,
+        and_(
+            Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
+            Prestamo.fecha_vencimiento < ahora
+        )
+    )
+
+
+def marcar_vencidos(db: Session, ahora: Optional[datetime] = None) -> int:
+    """Marca como VENCIDO los préstamos vencidos con un solo UPDATE y sincroniza
+    alertas_activas. Retorna la cantidad de préstamos marcados."""
+    ahora = ahora or datetime.utcnow()
+    filas = db.execute(
+        update(Prestamo).where(
+            and_(
+                Prestamo.estado_prestamo == EstadoPrestamo.ASIGNADO,
+                Prestamo.fecha_vencimiento < ahora
+            )
+        ).values(estado_prestamo=EstadoPrestamo.VENCIDO).returning(
+            Prestamo.id, Prestamo.equipo_id,
+            select(Trabajador.obra).where(Trabajador.rut == Prestamo.trabajador_rut).scalar_subquery()
+        ),
+        execution_options={"synchronize_session": False}
+    ).all()
+    # Alertas que dependen del reloj (incluye las de los préstamos recién marcados)
+    alertas_activas.sincronizar_vencimientos(db, ahora)
+    estadisticas_diarias.registrar_vencidos(db, [fila.id for fila in filas])
+    # Un evento por obra: los jefes de obra solo reciben los de la suya
+    por_obra = {}
+    for prestamo_id, equipo_id, obra in filas:
+        por_obra.setdefault(obra, []).append((prestamo_id, equipo_id))
+    for obra, vencidos in por_obra.items():
+        eventos.emitir(
+            db, eventos.PRESTAMOS_VENCIDOS, obra=obra,
+            prestamo_ids=[prestamo_id for prestamo_id, _ in vencidos],
+            equipo_ids=[equipo_id for _, equipo_id in vencidos]
+        )
+    return len(filas)
+
@@ -0,0 +1,86 @@
+"""
+Vista compacta de listados (?view=compact)
+
+Selecciona solo las columnas que muestran las tablas del frontend, sin
+cargar entidades ORM ni objetos anidados, y serializa las filas
+directamente a JSON (sin validación de response_model).
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Iterable, Optional
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Query, Session
+from .models import Equipo, EquipoEstado, Prestamo, Trabajador
+
+VISTA_COMPACTA = "compact"
+PATRON_VISTA = f"^({VISTA_COMPACTA})$"
+
+
+def consulta_equipos(db: Session, con_poseedor: bool = True) -> Query:
+    """Equipos con su poseedor actual (columnas de EquipoCompacto)"""
+    columnas = (
+        Equipo.id,
+        Equipo.serie,
+        Equipo.tipo,
+        Equipo.marca,
+        Equipo.modelo,
+        Equipo.estado_dispositivo,
+    )
+    if not con_poseedor:
+        return db.query(*columnas)
+    return db.query(
+        *columnas,
+        EquipoEstado.prestamo_activo_id,
+        EquipoEstado.trabajador_rut,
+        Trabajador.nombre.label("trabajador_nombre"),
+        EquipoEstado.obra,
+    ).outerjoin(
+        EquipoEstado, EquipoEstado.equipo_id == Equipo.id
+    ).outerjoin(
+        Trabajador, Trabajador.rut == EquipoEstado.trabajador_rut
+    )
+
+
+def consulta_prestamos(db: Session) -> Query:
+    """Préstamos con serie/tipo del equipo y nombre/obra del trabajador (columnas de PrestamoCompacto).
+
+    Ya incluye el join con Trabajador.
+    """
+    return db.query(
+        Prestamo.id,
+        Prestamo.equipo_id,
+        Equipo.serie,
+        Equipo.tipo,
+        Prestamo.trabajador_rut,
+        Trabajador.nombre.label("trabajador_nombre"),
+        Trabajador.obra,
+        Prestamo.fecha_prestamo,
+        Prestamo.fecha_vencimiento,
+        Prestamo.fecha_devolucion,
+        Prestamo.estado_prestamo,
+    ).join(
+        Equipo, Equipo.id == Prestamo.equipo_id
+    ).join(
+        Trabajador, Trabajador.rut == Prestamo.trabajador_rut
+    )
+
+
+def _valor_json(valor):
+    if isinstance(valor, Enum):
+        return valor.value
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def respuesta(filas: Iterable, response: Optional[Response] = None) -> JSONResponse:
+    """Respuesta JSON con las filas, conservando las cabeceras de paginación"""
+    contenido = [
+        {clave: _valor_json(valor) for clave, valor in fila._mapping.items()}
+        for fila in filas
+    ]
+    cabeceras = {
+        clave: valor for clave, valor in response.headers.items() if clave != "content-length"
+    } if response is not None else None
+    return JSONResponse(content=contenido, headers=cabeceras)
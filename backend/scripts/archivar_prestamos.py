@@ -0,0 +1,44 @@
+"""
+Script para mover los préstamos devueltos antiguos a prestamos_historico
+Mueve por lotes (un commit por lote) los devueltos hace más de `dias` días (PRESTAMOS_ARCHIVO_DIAS por defecto),
+salvo el último devuelto de cada equipo y los que tienen problemas pendientes.
+Crea la tabla prestamos_historico si no existe.
+Ejecutar: python scripts/archivar_prestamos.py [dias]
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import EjecucionTarea, PrestamoHistorico
+from app.tareas import ejecutar_tarea
+from app.archivo_prestamos import TAREA_ARCHIVO, ARCHIVO_DIAS, ARCHIVO_LOTE, archivar_prestamos as archivar
+
+
+def archivar_prestamos(dias: int, lote: int):
+    """Ejecutar la tarea de archivo"""
+    try:
+        EjecucionTarea.__table__.create(bind=engine, checkfirst=True)
+        PrestamoHistorico.__table__.create(bind=engine, checkfirst=True)
+        total = ejecutar_tarea(
+            TAREA_ARCHIVO, lambda db: archivar(db, dias=dias, lote=lote), SessionLocal
+        )
+        print(f"OK: {total} prestamos movidos a prestamos_historico")
+    except Exception as e:
+        print(f"ERROR: Error al archivar prestamos: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    dias = int(sys.argv[1]) if len(sys.argv) > 1 else ARCHIVO_DIAS
+    
+    print(f"Archivando prestamos devueltos hace mas de {dias} dias...")
+    if archivar_prestamos(dias, ARCHIVO_LOTE):
+        print("OK: Tarea completada exitosamente")
+    else:
+        print("ERROR: Error en la tarea")
+        sys.exit(1)
@@ -0,0 +1,77 @@
+"""
+Script para compactar o reconstruir el resumen diario de préstamos (estadisticas_diarias)
+Recalcula desde prestamos y prestamos_historico los últimos `dias` días (ESTADISTICAS_DIAS_COMPACTACION
+por defecto), corrigiendo diferencias y los activos al cierre de cada día.
+Crea la tabla estadisticas_diarias si no existe.
+Ejecutar:
+    python scripts/compactar_estadisticas.py [dias]           (compactación nocturna)
+    python scripts/compactar_estadisticas.py --todo           (reconstruye todo el historial)
+    python scripts/compactar_estadisticas.py --verificar [dias]  (solo reporta diferencias, 30 días por defecto)
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import EjecucionTarea, EstadisticaDiaria
+from app.tareas import ejecutar_tarea
+from app import estadisticas_diarias
+
+
+def verificar_estadisticas(dias: int):
+    """Reportar diferencias entre la tabla y los contadores calculados desde préstamos"""
+    db = SessionLocal()
+    try:
+        hasta = datetime.utcnow().date()
+        diferencias = estadisticas_diarias.verificar(db, hasta - timedelta(days=dias - 1), hasta)
+        for diferencia in diferencias[:50]:
+            print(f"  {diferencia['fecha']} {diferencia['obra']} {diferencia['tipo']}: "
+                  f"esperado={diferencia['esperado']} actual={diferencia['actual']}")
+        if len(diferencias) > 50:
+            print(f"  ... y {len(diferencias) - 50} diferencias mas")
+        print(f"Diferencias encontradas: {len(diferencias)}")
+        return len(diferencias) == 0
+    finally:
+        db.close()
+
+
+def compactar_estadisticas(dias: int = None):
+    """Recalcular los últimos `dias` días, o todo el historial si dias es None"""
+    try:
+        EjecucionTarea.__table__.create(bind=engine, checkfirst=True)
+        EstadisticaDiaria.__table__.create(bind=engine, checkfirst=True)
+        if dias is None:
+            tarea = estadisticas_diarias.reconstruir
+        else:
+            tarea = lambda db: estadisticas_diarias.compactar(db, dias=dias)
+        total = ejecutar_tarea(estadisticas_diarias.TAREA_COMPACTACION, tarea, SessionLocal)
+        print(f"OK: {total} filas de estadisticas diarias recalculadas")
+    except Exception as e:
+        print(f"ERROR: Error al compactar estadisticas: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    argumentos = [argumento for argumento in sys.argv[1:] if not argumento.startswith("--")]
+    if "--verificar" in sys.argv:
+        dias = int(argumentos[0]) if argumentos else 30
+        print(f"Verificando estadisticas diarias de los ultimos {dias} dias...")
+        sys.exit(0 if verificar_estadisticas(dias) else 1)
+    
+    if "--todo" in sys.argv:
+        print("Reconstruyendo todo el historial de estadisticas diarias...")
+        ok = compactar_estadisticas()
+    else:
+        dias = int(argumentos[0]) if argumentos else estadisticas_diarias.DIAS_COMPACTACION
+        print(f"Compactando estadisticas diarias de los ultimos {dias} dias...")
+        ok = compactar_estadisticas(dias)
+    if ok:
+        print("OK: Tarea completada exitosamente")
+    else:
+        print("ERROR: Error en la tarea")
+        sys.exit(1)
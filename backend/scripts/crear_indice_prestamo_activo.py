@@ -0,0 +1,45 @@
+"""
+Script para crear el índice único parcial de préstamo activo por equipo
+(prestamos.equipo_id WHERE estado_prestamo IN ('ASIGNADO', 'VENCIDO'))
+Si hay equipos con más de un préstamo activo se listan y no se crea el índice.
+Reemplaza la versión anterior del índice, que solo consideraba ASIGNADO.
+Ejecutar: python scripts/crear_indice_prestamo_activo.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.estado_equipos import equipos_con_varios_activos, crear_indice_prestamo_activo as crear_indice
+
+
+def crear_indice_prestamo_activo():
+    """Verificar duplicados y crear el índice"""
+    try:
+        db = SessionLocal()
+        try:
+            duplicados = equipos_con_varios_activos(db)
+        finally:
+            db.close()
+        if duplicados:
+            print(f"ERROR: {len(duplicados)} equipos tienen mas de un prestamo activo: {duplicados[:50]}")
+            print("Devuelva o elimine los prestamos sobrantes y vuelva a ejecutar")
+            return False
+        crear_indice(engine)
+        print("OK: Indice ux_prestamos_equipo_prestado creado")
+    except Exception as e:
+        print(f"ERROR: Error al crear indice: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Creando indice de prestamo activo por equipo...")
+    if crear_indice_prestamo_activo():
+        print("OK: Migracion completada exitosamente")
+    else:
+        print("ERROR: Error en la migracion")
+        sys.exit(1)
@@ -0,0 +1,46 @@
+"""
+Script para crear los índices de búsqueda de equipos
+- PostgreSQL: extensión pg_trgm e índices GIN de trigramas en serie/marca/modelo/tipo
+- Otros motores: reconstruye la tabla equipos_ngramas
+Ejecutar: python scripts/crear_indices_busqueda.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import EquipoNgrama
+from app.busqueda import preparar_indices, reindexar
+
+
+def crear_indices_busqueda():
+    """Crear índices de búsqueda y reindexar equipos"""
+    try:
+        EquipoNgrama.__table__.create(bind=engine, checkfirst=True)
+        preparar_indices(engine)
+        db = SessionLocal()
+        try:
+            total = reindexar(db)
+            db.commit()
+        finally:
+            db.close()
+        if engine.dialect.name == "postgresql":
+            print("OK: Indices de trigramas (pg_trgm) creados")
+        else:
+            print(f"OK: {total} equipos indexados en equipos_ngramas")
+    except Exception as e:
+        print(f"ERROR: Error al crear indices de busqueda: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Creando indices de busqueda de equipos...")
+    if crear_indices_busqueda():
+        print("OK: Migracion completada exitosamente")
+    else:
+        print("ERROR: Error en la migracion")
+        sys.exit(1)
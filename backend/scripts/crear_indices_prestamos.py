@@ -0,0 +1,39 @@
+"""
+Script para crear los índices de la tabla prestamos declarados en el modelo
+(historial por fecha, estado, trabajador, equipo y devolución; préstamo activo único;
+vencimientos para alertas)
+Ejecutar: python scripts/crear_indices_prestamos.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import crear_indices_faltantes
+from app.models import Prestamo
+
+
+def crear_indices_prestamos():
+    """Crear índices faltantes de prestamos"""
+    try:
+        errores = crear_indices_faltantes(Prestamo.__table__)
+        for nombre, e in errores:
+            print(f"ERROR: No se pudo crear {nombre}: {e}")
+        if errores:
+            return False
+        print(f"OK: {len(Prestamo.__table__.indexes)} indices de prestamos verificados")
+    except Exception as e:
+        print(f"ERROR: Error al crear indices de prestamos: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Creando indices de prestamos...")
+    if crear_indices_prestamos():
+        print("OK: Migracion completada exitosamente")
+    else:
+        print("ERROR: Error en la migracion")
+        sys.exit(1)
@@ -0,0 +1,37 @@
+"""
+Script para enviar por SMTP los correos pendientes (tabla correos_pendientes)
+Usa SMTP_HOST, SMTP_PORT, SMTP_USUARIO, SMTP_PASSWORD, SMTP_TLS y SMTP_REMITENTE.
+Para pruebas locales se puede usar un servidor SMTP de desarrollo, por ejemplo:
+    python -m aiosmtpd -n -l localhost:1025
+Ejecutar: python scripts/enviar_correos.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.tareas import ejecutar_tarea
+from app.resumen_alertas import TAREA_ENVIO, enviar_pendientes
+
+
+def enviar_correos():
+    """Enviar los correos pendientes"""
+    try:
+        total = ejecutar_tarea(TAREA_ENVIO, enviar_pendientes, SessionLocal)
+        print(f"OK: {total} correos enviados")
+    except Exception as e:
+        print(f"ERROR: Error al enviar correos: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Enviando correos pendientes...")
+    if enviar_correos():
+        print("OK: Tarea completada exitosamente")
+    else:
+        print("ERROR: Error en la tarea")
+        sys.exit(1)
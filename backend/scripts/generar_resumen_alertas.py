@@ -0,0 +1,39 @@
+"""
+Script para generar el resumen diario de alertas de cada obra (tabla correos_pendientes)
+Pensado para cron en la mañana, seguido de scripts/enviar_correos.py.
+Crea las tablas correos_pendientes y ejecuciones_tareas si no existen.
+Ejecutar: python scripts/generar_resumen_alertas.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import CorreoPendiente, EjecucionTarea
+from app.tareas import ejecutar_tarea
+from app.resumen_alertas import TAREA_RESUMEN, generar_resumenes
+
+
+def generar_resumen_alertas():
+    """Generar los resúmenes del día"""
+    try:
+        EjecucionTarea.__table__.create(bind=engine, checkfirst=True)
+        CorreoPendiente.__table__.create(bind=engine, checkfirst=True)
+        total = ejecutar_tarea(TAREA_RESUMEN, generar_resumenes, SessionLocal)
+        print(f"OK: {total} resumenes de obra generados")
+    except Exception as e:
+        print(f"ERROR: Error al generar resumenes: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Generando resumen diario de alertas...")
+    if generar_resumen_alertas():
+        print("OK: Tarea completada exitosamente")
+    else:
+        print("ERROR: Error en la tarea")
+        sys.exit(1)
@@ -0,0 +1,38 @@
+"""
+Script para marcar como VENCIDO los préstamos ASIGNADO con fecha de vencimiento pasada
+Para ejecutar desde cron cuando la tarea periódica de la app está desactivada
+(TAREA_VENCIDOS_INTERVALO=0). Crea la tabla ejecuciones_tareas si no existe.
+Ejecutar: python scripts/marcar_prestamos_vencidos.py
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import EjecucionTarea
+from app.tareas import ejecutar_tarea
+from app.vencimientos import TAREA_VENCIDOS, marcar_vencidos
+
+
+def marcar_prestamos_vencidos():
+    """Ejecutar la tarea de vencimientos"""
+    try:
+        EjecucionTarea.__table__.create(bind=engine, checkfirst=True)
+        total = ejecutar_tarea(TAREA_VENCIDOS, marcar_vencidos, SessionLocal)
+        print(f"OK: {total} prestamos marcados como VENCIDO")
+    except Exception as e:
+        print(f"ERROR: Error al marcar prestamos vencidos: {e}")
+        return False
+    
+    return True
+
+
+if __name__ == "__main__":
+    print("Marcando prestamos vencidos...")
+    if marcar_prestamos_vencidos():
+        print("OK: Tarea completada exitosamente")
+    else:
+        print("ERROR: Error en la tarea")
+        sys.exit(1)
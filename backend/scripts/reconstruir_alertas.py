@@ -0,0 +1,57 @@
+"""
+Script para verificar o reconstruir las alertas vigentes (alertas_activas)
+Ejecutar:
+    python scripts/reconstruir_alertas.py --verificar   (solo reporta diferencias)
+    python scripts/reconstruir_alertas.py               (reconstruye la tabla)
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import AlertaActiva
+from app import alertas_activas
+
+
+def verificar_alertas():
+    """Reportar diferencias entre la tabla y las alertas calculadas desde préstamos"""
+    db = SessionLocal()
+    try:
+        diferencias = alertas_activas.verificar(db)
+        for diferencia in diferencias[:50]:
+            print(f"  Prestamo {diferencia['prestamo_id']} {diferencia['tipo']}: "
+                  f"esperado={diferencia['esperado']} actual={diferencia['actual']}")
+        if len(diferencias) > 50:
+            print(f"  ... y {len(diferencias) - 50} diferencias mas")
+        print(f"Diferencias encontradas: {len(diferencias)}")
+        return len(diferencias) == 0
+    finally:
+        db.close()
+
+
+def reconstruir_alertas():
+    """Reconstruir la tabla completa"""
+    db = SessionLocal()
+    try:
+        AlertaActiva.__table__.create(bind=engine, checkfirst=True)
+        total = alertas_activas.reconstruir(db)
+        db.commit()
+        print(f"OK: {total} alertas activas reconstruidas")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: Error al reconstruir alertas: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    if "--verificar" in sys.argv:
+        print("Verificando alertas activas...")
+        sys.exit(0 if verificar_alertas() else 1)
+    print("Reconstruyendo alertas activas...")
+    if not reconstruir_alertas():
+        sys.exit(1)
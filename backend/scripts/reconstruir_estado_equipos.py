@@ -0,0 +1,57 @@
+"""
+Script para verificar o reconstruir la proyección de estado actual de equipos (equipos_estado)
+Ejecutar:
+    python scripts/reconstruir_estado_equipos.py --verificar   (solo reporta diferencias)
+    python scripts/reconstruir_estado_equipos.py               (reconstruye la tabla)
+"""
+import sys
+import os
+
+# Agregar el directorio raiz al path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models import EquipoEstado
+from app import estado_equipos
+
+
+def verificar_estado_equipos():
+    """Reportar diferencias entre la proyección y la tabla de préstamos"""
+    db = SessionLocal()
+    try:
+        diferencias = estado_equipos.verificar(db)
+        for diferencia in diferencias[:50]:
+            print(f"  Equipo {diferencia['equipo_id']}: {diferencia['campo']} "
+                  f"esperado={diferencia['esperado']} actual={diferencia['actual']}")
+        if len(diferencias) > 50:
+            print(f"  ... y {len(diferencias) - 50} diferencias mas")
+        print(f"Diferencias encontradas: {len(diferencias)}")
+        return len(diferencias) == 0
+    finally:
+        db.close()
+
+
+def reconstruir_estado_equipos():
+    """Reconstruir la proyección completa"""
+    db = SessionLocal()
+    try:
+        EquipoEstado.__table__.create(bind=engine, checkfirst=True)
+        total = estado_equipos.reconstruir(db)
+        db.commit()
+        print(f"OK: Estado actual reconstruido para {total} equipos")
+        return True
+    except Exception as e:
+        db.rollback()
+        print(f"ERROR: Error al reconstruir estado de equipos: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    if "--verificar" in sys.argv:
+        print("Verificando estado actual de equipos...")
+        sys.exit(0 if verificar_estado_equipos() else 1)
+    print("Reconstruyendo estado actual de equipos...")
+    if not reconstruir_estado_equipos():
+        sys.exit(1)
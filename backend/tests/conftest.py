@@ -0,0 +1,79 @@
+"""
+Configuración de pruebas: la app sobre SQLite en memoria, sin Supabase
+
+Se reemplaza el engine de app.database antes de importar app.main, para que
+la creación de tablas y las tareas de inicio usen la base de prueba.
+"""
+import os
+import sys
+import tempfile
+
+# URL de archivo para que app.database acepte sus opciones de pool; nunca se conecta
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "aura_pruebas.db"))
+os.environ.setdefault("JWT_SECRET_KEY", "pruebas")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+import app.database as database
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+database.engine = engine
+database.SessionLocal.configure(bind=engine)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from app.main import app  # noqa: E402
+from app.auth import get_current_user  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import Usuario, RolUsuario  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Sesión sobre una base vacía (las tablas se recrean en cada prueba)"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    sesion = database.SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def usuario():
+    """Usuario autenticado de las pruebas (Informática; se puede cambiar rol y obra)"""
+    return Usuario(id=1, username="admin", email="admin@aura.cl", password_hash="x",
+                   rol=RolUsuario.INFORMATICA, obra=None, activo=True)
+
+
+@pytest.fixture
+def cliente(db, usuario):
+    """TestClient autenticado como `usuario`"""
+    app.dependency_overrides[get_current_user] = lambda: usuario
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def contar_consultas():
+    """Cuenta las sentencias SQL ejecutadas dentro del bloque `with contar_consultas() as total`"""
+    class Contador:
+        def __init__(self):
+            self.total = 0
+
+        def __enter__(self):
+            event.listen(engine, "before_cursor_execute", self._contar)
+            return self
+
+        def __exit__(self, *args):
+            event.remove(engine, "before_cursor_execute", self._contar)
+
+        def _contar(self, *args, **kwargs):
+            self.total += 1
+
+    return Contador
@@ -0,0 +1,56 @@
+"""
+El listado de equipos carga préstamos activos y últimos devueltos en lote:
+la cantidad de consultas no crece con la cantidad de equipos.
+"""
+from datetime import datetime, timedelta
+
+from app import estado_equipos
+from app.models import Equipo, Prestamo, Trabajador, EstadoPrestamo
+
+
+def _agregar_equipos(db, desde: int, cantidad: int):
+    """Equipos con un préstamo devuelto y, los pares, uno activo"""
+    ahora = datetime.utcnow()
+    for i in range(desde, desde + cantidad):
+        equipo = Equipo(serie=f"SER{i:04d}", marca="Dell", modelo=f"Latitude {i}", tipo="NOTEBOOK")
+        db.add(equipo)
+        db.flush()
+        db.add(Prestamo(
+            equipo_id=equipo.id, trabajador_rut="1-9",
+            fecha_prestamo=ahora - timedelta(days=60), fecha_vencimiento=ahora - timedelta(days=30),
+            fecha_devolucion=ahora - timedelta(days=40), estado_prestamo=EstadoPrestamo.DEVUELTO,
+            estado_devolucion_bueno=True, estado_devolucion_con_cargador=True
+        ))
+        if i % 2 == 0:
+            db.add(Prestamo(
+                equipo_id=equipo.id, trabajador_rut="1-9",
+                fecha_prestamo=ahora, fecha_vencimiento=ahora + timedelta(days=30),
+                estado_prestamo=EstadoPrestamo.ASIGNADO
+            ))
+    db.flush()
+    estado_equipos.reconstruir(db)
+    db.commit()
+
+
+def _consultas_listado(cliente, contar_consultas, esperados: int) -> int:
+    with contar_consultas() as contador:
+        respuesta = cliente.get("/api/equipos/", params={"limit": 500})
+    assert respuesta.status_code == 200
+    equipos = respuesta.json()
+    assert len(equipos) == esperados
+    assert all(equipo["ultimo_prestamo_devuelto"] is not None for equipo in equipos)
+    assert sum(equipo["prestamo_activo"] is not None for equipo in equipos) == (esperados + 1) // 2
+    return contador.total
+
+
+def test_listado_equipos_consultas_constantes(db, cliente, contar_consultas):
+    db.add(Trabajador(rut="1-9", nombre="Juan Pérez", obra="OBRA NORTE"))
+    db.commit()
+
+    _agregar_equipos(db, 0, 10)
+    consultas_pocos = _consultas_listado(cliente, contar_consultas, 10)
+
+    _agregar_equipos(db, 10, 30)
+    consultas_muchos = _consultas_listado(cliente, contar_consultas, 40)
+
+    assert consultas_muchos == consultas_pocos
@@ -0,0 +1,31 @@
+"""
+El dashboard es global: todos los roles y obras comparten la entrada del caché
+y cualquier evento confirmado la invalida.
+"""
+from app.models import Equipo, RolUsuario
+from app.routers.estadisticas import cache_dashboard
+
+
+def test_dashboard_compartido_entre_roles(db, cliente, usuario, contar_consultas):
+    cache_dashboard.limpiar()
+    db.add(Equipo(serie="SER0001", marca="Dell", modelo="Latitude", tipo="NOTEBOOK"))
+    db.commit()
+
+    global_ = cliente.get("/api/estadisticas/dashboard")
+    assert global_.status_code == 200
+
+    usuario.rol, usuario.obra = RolUsuario.JEFE_OBRA, "OBRA NORTE"
+    with contar_consultas() as contador:
+        jefe = cliente.get("/api/estadisticas/dashboard")
+    assert jefe.status_code == 200
+    assert contador.total == 0
+    assert jefe.json() == global_.json()
+
+
+def test_dashboard_se_invalida_con_eventos(db, cliente, usuario):
+    cache_dashboard.limpiar()
+    assert cliente.get("/api/estadisticas/dashboard").json()["resumen"]["total_equipos"] == 0
+
+    creado = cliente.post("/api/equipos/", json={"serie": "SER0002", "marca": "HP", "modelo": "ProDesk", "tipo": "AIO"})
+    assert creado.status_code == 200
+    assert cliente.get("/api/estadisticas/dashboard").json()["resumen"]["total_equipos"] == 1
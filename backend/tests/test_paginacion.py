@@ -0,0 +1,85 @@
+"""
+Paginación por cursor de los listados de equipos, préstamos y trabajadores:
+límite por defecto y páginas contiguas (sin duplicados ni saltos).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Equipo, Prestamo, Trabajador, EstadoPrestamo
+from app.paginacion import LIMITE_POR_DEFECTO
+
+CANTIDAD = LIMITE_POR_DEFECTO + 20
+
+# (url, clave de cada fila, orden esperado de las claves)
+LISTADOS = [
+    ("/api/equipos/", lambda fila: fila["id"], lambda claves: sorted(claves)),
+    ("/api/prestamos/", lambda fila: fila["id"], None),
+    ("/api/trabajadores/", lambda fila: fila["rut"], lambda claves: sorted(claves)),
+]
+
+
+@pytest.fixture
+def datos(db):
+    """CANTIDAD trabajadores, equipos y préstamos devueltos (de a tres con la misma fecha)"""
+    base = datetime.utcnow() - timedelta(days=365)
+    for i in range(CANTIDAD):
+        db.add(Trabajador(rut=f"{i:04d}-K", nombre=f"Trabajador {i}", obra="OBRA NORTE"))
+        db.add(Equipo(serie=f"SER{i:04d}", marca="Dell", modelo="Latitude", tipo="NOTEBOOK"))
+    db.flush()
+    equipos = [equipo.id for equipo in db.query(Equipo.id)]
+    for i in range(CANTIDAD):
+        fecha = base + timedelta(days=i // 3)
+        db.add(Prestamo(
+            equipo_id=equipos[i], trabajador_rut=f"{i:04d}-K",
+            fecha_prestamo=fecha, fecha_vencimiento=fecha + timedelta(days=30),
+            fecha_devolucion=fecha + timedelta(days=10), estado_prestamo=EstadoPrestamo.DEVUELTO,
+            estado_devolucion_bueno=True, estado_devolucion_con_cargador=True
+        ))
+    db.commit()
+    # Préstamos: fecha_prestamo descendente y, a igual fecha, id descendente
+    orden_prestamos = [
+        prestamo.id for prestamo in db.query(Prestamo.id).order_by(Prestamo.fecha_prestamo.desc(), Prestamo.id.desc())
+    ]
+    return {"/api/prestamos/": orden_prestamos}
+
+
+def _recorrer(cliente, url, clave, limite):
+    paginas = []
+    cursor = None
+    while True:
+        params = {"limit": limite}
+        if cursor:
+            params["cursor"] = cursor
+        respuesta = cliente.get(url, params=params)
+        assert respuesta.status_code == 200
+        paginas.append([clave(fila) for fila in respuesta.json()])
+        cursor = respuesta.headers.get("X-Next-Cursor")
+        if not cursor:
+            return paginas
+
+
+@pytest.mark.parametrize("url, clave, ordenar", LISTADOS)
+def test_limite_por_defecto(cliente, datos, url, clave, ordenar):
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 200
+    assert len(respuesta.json()) == LIMITE_POR_DEFECTO
+    assert respuesta.headers.get("X-Next-Cursor")
+
+
+@pytest.mark.parametrize("url, clave, ordenar", LISTADOS)
+def test_paginas_contiguas(cliente, datos, url, clave, ordenar):
+    completa = [clave(fila) for fila in cliente.get(url, params={"limit": 500}).json()]
+    assert len(completa) == CANTIDAD
+    esperado = datos[url] if ordenar is None else ordenar(completa)
+    assert completa == esperado
+
+    paginas = _recorrer(cliente, url, clave, 7)
+    assert all(len(pagina) == 7 for pagina in paginas[:-1])
+    # Cada página empieza justo después de la anterior: concatenadas dan la lista completa
+    assert [valor for pagina in paginas for valor in pagina] == esperado
+
+
+@pytest.mark.parametrize("url, clave, ordenar", LISTADOS)
+def test_cursor_invalido(cliente, datos, url, clave, ordenar):
+    assert cliente.get(url, params={"cursor": "no-es-un-cursor"}).status_code == 400
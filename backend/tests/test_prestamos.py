@@ -0,0 +1,195 @@
+"""
+Préstamos individuales y en lote
+
+Un equipo con préstamo activo (ASIGNADO o VENCIDO) no se puede volver a
+prestar; lo garantiza el índice único parcial ux_prestamos_equipo_prestado.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import alertas_activas, estado_equipos
+from app.models import AlertaActiva, Equipo, Obra, Prestamo, Trabajador, EstadoPrestamo, ESTADOS_ACTIVOS
+
+
+@pytest.fixture
+def inventario(db):
+    """Dos obras con un trabajador cada una y cuatro equipos libres"""
+    for obra in ("OBRA NORTE", "OBRA SUR"):
+        db.add(Obra(nombre=obra))
+    db.add(Trabajador(rut="1-9", nombre="Juan Pérez", obra="OBRA NORTE"))
+    db.add(Trabajador(rut="2-7", nombre="Ana Soto", obra="OBRA SUR"))
+    for i in range(4):
+        db.add(Equipo(serie=f"SER{i:04d}", marca="Dell", modelo="Latitude", tipo="NOTEBOOK"))
+    db.commit()
+    estado_equipos.reconstruir(db)
+    db.commit()
+    return [equipo.id for equipo in db.query(Equipo).order_by(Equipo.id)]
+
+
+def _prestar(cliente, equipo_id, rut="1-9", obra="OBRA NORTE"):
+    return cliente.post("/api/prestamos/", json={"equipo_id": equipo_id, "trabajador_rut": rut, "obra": obra})
+
+
+def _activos(db, equipo_id):
+    db.expire_all()
+    return db.query(Prestamo).filter(
+        Prestamo.equipo_id == equipo_id, Prestamo.estado_prestamo.in_(ESTADOS_ACTIVOS)
+    ).count()
+
+
+@pytest.mark.parametrize("estado", [EstadoPrestamo.ASIGNADO, EstadoPrestamo.VENCIDO])
+def test_segundo_prestamo_de_equipo_prestado(db, cliente, inventario, estado):
+    equipo_id = inventario[0]
+    primero = _prestar(cliente, equipo_id)
+    assert primero.status_code == 200
+    if estado == EstadoPrestamo.VENCIDO:
+        db.query(Prestamo).filter(Prestamo.id == primero.json()["id"]).update({
+            "estado_prestamo": EstadoPrestamo.VENCIDO,
+            "fecha_vencimiento": datetime.utcnow() - timedelta(days=1),
+        })
+        db.commit()
+
+    segundo = _prestar(cliente, equipo_id, rut="2-7", obra="OBRA SUR")
+    assert segundo.status_code == 400
+    assert segundo.json()["detail"] == "Equipo ya está prestado"
+    assert _activos(db, equipo_id) == 1
+
+
+# ============ PRÉSTAMOS EN LOTE ============
+
+def _lote(cliente, pares, modo, obra=None):
+    return cliente.post("/api/prestamos/lote", json={
+        "modo": modo,
+        "obra": obra,
+        "prestamos": [{"equipo_id": equipo_id, "trabajador_rut": rut} for equipo_id, rut in pares],
+    })
+
+
+def test_lote_todo_o_nada_rechazado(db, cliente, inventario):
+    respuesta = _lote(cliente, [(inventario[0], "1-9"), (inventario[0], "1-9"), (inventario[1], "2-7")], "todo_o_nada", obra="OBRA NORTE")
+    assert respuesta.status_code == 400
+    detalle = respuesta.json()["detail"]
+    assert detalle["creados"] == 0
+    assert [(r["ok"], r["error"]) for r in detalle["resultados"]] == [
+        (False, "No creado: el lote tiene préstamos no válidos"),
+        (False, "Equipo repetido en el lote"),
+        (False, "Obra del trabajador no coincide"),
+    ]
+    assert db.query(Prestamo).count() == 0
+
+
+def test_lote_todo_o_nada_valido(db, cliente, inventario):
+    respuesta = _lote(cliente, [(inventario[0], "1-9"), (inventario[1], "2-7")], "todo_o_nada")
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert (cuerpo["creados"], cuerpo["rechazados"]) == (2, 0)
+    assert all(r["ok"] and r["prestamo_id"] and r["error"] is None for r in cuerpo["resultados"])
+    assert _activos(db, inventario[0]) == 1 and _activos(db, inventario[1]) == 1
+
+
+def test_lote_parcial(db, cliente, inventario):
+    assert _prestar(cliente, inventario[2]).status_code == 200
+    respuesta = _lote(cliente, [
+        (inventario[0], "1-9"),
+        (inventario[0], "1-9"),
+        (inventario[1], "2-7"),
+        (inventario[2], "1-9"),
+        (inventario[3], "1-9"),
+    ], "parcial", obra="OBRA NORTE")
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert (cuerpo["creados"], cuerpo["rechazados"]) == (2, 3)
+    assert [(r["ok"], r["error"]) for r in cuerpo["resultados"]] == [
+        (True, None),
+        (False, "Equipo repetido en el lote"),
+        (False, "Obra del trabajador no coincide"),
+        (False, "Equipo ya está prestado"),
+        (True, None),
+    ]
+    assert [_activos(db, equipo_id) for equipo_id in inventario] == [1, 0, 1, 1]
+
+
+def _ocultar_prestados(monkeypatch, veces):
+    """La validación no ve los préstamos activos las primeras `veces` llamadas
+    (otro request prestó el equipo entre la validación y el INSERT)"""
+    from app.routers import prestamos as router_prestamos
+    validar = router_prestamos._validar_lote_prestamos
+    llamadas = []
+
+    def validar_con_carrera(db, datos):
+        errores, trabajadores, tipos = validar(db, datos)
+        llamadas.append(1)
+        if len(llamadas) <= veces:
+            errores = [None if error == "Equipo ya está prestado" else error for error in errores]
+        return errores, trabajadores, tipos
+
+    monkeypatch.setattr(router_prestamos, "_validar_lote_prestamos", validar_con_carrera)
+    return llamadas
+
+
+def test_lote_revalida_tras_prestamo_concurrente(db, cliente, inventario, monkeypatch):
+    assert _prestar(cliente, inventario[0]).status_code == 200
+    llamadas = _ocultar_prestados(monkeypatch, veces=1)
+    respuesta = _lote(cliente, [(inventario[0], "1-9"), (inventario[1], "1-9")], "parcial")
+    assert respuesta.status_code == 200
+    assert len(llamadas) == 2
+    assert [(r["ok"], r["error"]) for r in respuesta.json()["resultados"]] == [
+        (False, "Equipo ya está prestado"),
+        (True, None),
+    ]
+    assert _activos(db, inventario[0]) == 1 and _activos(db, inventario[1]) == 1
+
+
+def test_lote_409_tras_tres_intentos(db, cliente, inventario, monkeypatch):
+    assert _prestar(cliente, inventario[0]).status_code == 200
+    llamadas = _ocultar_prestados(monkeypatch, veces=3)
+    respuesta = _lote(cliente, [(inventario[0], "1-9"), (inventario[1], "1-9")], "parcial")
+    assert respuesta.status_code == 409
+    assert len(llamadas) == 3
+    assert _activos(db, inventario[0]) == 1 and _activos(db, inventario[1]) == 0
+
+
+# ============ DEVOLUCIÓN EN LOTE ============
+
+def test_devolucion_lote_mixta(db, cliente, inventario):
+    prestamo_ids = [_prestar(cliente, equipo_id).json()["id"] for equipo_id in inventario[:3]]
+
+    respuesta = cliente.post("/api/prestamos/devolver-lote", json={"devoluciones": [
+        {"serie": "ser0000"},                                               # minúsculas: se normaliza
+        {"serie": " SER0001 ", "estado_devolucion_con_cargador": False},    # sin cargador
+        {"equipo_id": inventario[0]},                                       # repetido (por id)
+        {"serie": "NOEXISTE"},                                              # desconocido
+        {"equipo_id": inventario[3]},                                       # sin préstamo activo
+        {},                                                                 # sin serie ni id
+        {"equipo_id": inventario[2]},
+    ]})
+    assert respuesta.status_code == 200
+    cuerpo = respuesta.json()
+    assert (cuerpo["devueltos"], cuerpo["rechazados"]) == (3, 4)
+    assert [(r["ok"], r["prestamo_id"], r["error"]) for r in cuerpo["resultados"]] == [
+        (True, prestamo_ids[0], None),
+        (True, prestamo_ids[1], None),
+        (False, None, "Equipo repetido en el lote"),
+        (False, None, "Equipo sin préstamo activo"),
+        (False, None, "Equipo sin préstamo activo"),
+        (False, None, "Indique serie o equipo_id"),
+        (True, prestamo_ids[2], None),
+    ]
+    assert [r["serie"] for r in cuerpo["resultados"][:2]] == ["SER0000", "SER0001"]
+
+    db.expire_all()
+    devueltos = db.query(Prestamo).filter(Prestamo.id.in_(prestamo_ids)).all()
+    assert all(p.estado_prestamo == EstadoPrestamo.DEVUELTO and p.fecha_devolucion for p in devueltos)
+    assert all(_activos(db, equipo_id) == 0 for equipo_id in inventario)
+
+    # Solo la devolución sin cargador queda como problema pendiente
+    problemas = db.query(AlertaActiva.prestamo_id).filter(AlertaActiva.tipo == alertas_activas.PROBLEMA).all()
+    assert problemas == [(prestamo_ids[1],)]
+    assert alertas_activas.verificar(db) == []
+
+    # Una devolución individual posterior ve el préstamo ya devuelto
+    repetida = cliente.put(f"/api/prestamos/{prestamo_ids[0]}/devolver", json={
+        "estado_devolucion_bueno": True, "estado_devolucion_con_cargador": True
+    })
+    assert repetida.status_code == 400
@@ -1,15 +1,28 @@
-import { useState } from 'react'
-import { useQuery } from '@tanstack/react-query'
+import { useEffect, useState } from 'react'
+import { useQuery, useQueryClient } from '@tanstack/react-query'
 import { estadisticasService } from '../../services/estadisticas'
+import { conectarEventos } from '../../services/eventos'
 
 export default function DashboardStats() {
   const [tooltip, setTooltip] = useState<{ x: number, y: number, dia: number, cantidad: number } | null>(null)
   const [mostrarRegresion, setMostrarRegresion] = useState(false)
 
+  const queryClient = useQueryClient()
+  const [eventosConectados, setEventosConectados] = useState(false)
+
+  // Cambios en préstamos, alertas y equipos llegan por SSE en vez de consultar cada 30 segundos
+  useEffect(() => {
+    return conectarEventos((evento) => {
+      if (evento.tipo === 'conectado') return
+      queryClient.invalidateQueries({ queryKey: ['dashboard-stats'] })
+      queryClient.invalidateQueries({ queryKey: ['alertas'] })
+    }, setEventosConectados)
+  }, [queryClient])
+
   const { data: stats, isLoading, error } = useQuery({
     queryKey: ['dashboard-stats'],
     queryFn: () => estadisticasService.getDashboard(),
-    refetchInterval: 30000, // Refrescar cada 30 segundos
+    refetchInterval: eventosConectados ? false : 30000, // Sin stream de eventos, refrescar cada 30 segundos
     refetchOnWindowFocus: true, // Refrescar al enfocar la ventana
   })
 
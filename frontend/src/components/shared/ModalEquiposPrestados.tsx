@@ -97,7 +97,7 @@ export default function ModalEquiposPrestados({ trabajador, onClose }: Props) {
   }
 
   // Filtrar préstamos
-  const prestamosActivos = prestamos.filter(p => p.estado_prestamo === 'ASIGNADO')
+  const prestamosActivos = prestamos.filter(p => p.estado_prestamo === 'ASIGNADO' || p.estado_prestamo === 'VENCIDO')
   const prestamosDevueltos = prestamos
     .filter(p => p.estado_prestamo === 'DEVUELTO')
     .sort((a, b) => {
@@ -1,10 +1,9 @@
-import api from './api'
+import api, { obtenerTodas } from './api'
 import { Equipo, EquipoConPrestamo } from '../types'
 
 export const equiposService = {
   getAll: async (params?: { obra?: string; tipo?: string; estado?: string; serie?: string; nombre?: string; busqueda?: string }) => {
-    const { data } = await api.get<EquipoConPrestamo[]>('/api/equipos/', { params })
-    return data
+    return obtenerTodas<EquipoConPrestamo>('/api/equipos/', params)
   },
   
   getLibres: async () => {
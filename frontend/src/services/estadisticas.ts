@@ -1,5 +1,13 @@
 import api from './api'
 
+export type Granularidad = 'dia' | 'semana' | 'mes'
+
+export interface RangoSerie {
+  desde?: string
+  hasta?: string
+  granularidad?: Granularidad
+}
+
 export interface DashboardStats {
   resumen: {
     total_equipos: number
@@ -18,6 +26,13 @@ export interface DashboardStats {
       cantidad: number
     }>
   }>
+  prestamos_por_periodo: Array<{
+    periodo: string // Inicio del período (YYYY-MM-DD)
+    cantidad: number // Préstamos creados
+    devueltos: number
+    vencidos: number
+  }>
+  granularidad: Granularidad
   equipos_mas_prestados: Array<{
     serie: string
     tipo: string
@@ -31,8 +46,8 @@ export interface DashboardStats {
 }
 
 export const estadisticasService = {
-  getDashboard: async () => {
-    const { data } = await api.get<DashboardStats>('/api/estadisticas/dashboard')
+  getDashboard: async (rango?: RangoSerie) => {
+    const { data } = await api.get<DashboardStats>('/api/estadisticas/dashboard', { params: rango })
     return data
   },
 }
@@ -0,0 +1,52 @@
+import api from './api'
+
+export type EventoServidor = {
+  tipo: string
+  obra?: string | null
+  [clave: string]: unknown
+}
+
+const TIPOS = [
+  'conectado',
+  'prestamo_creado',
+  'prestamo_devuelto',
+  'prestamo_eliminado',
+  'prestamo_actualizado',
+  'prestamos_vencidos',
+  'trabajador_actualizado',
+  'trabajador_despedido',
+  'alertas_creadas',
+  'equipo_actualizado',
+  'equipo_eliminado',
+  'equipos_creados',
+  'resincronizar',
+]
+
+// Abre el stream SSE del backend; retorna la función para cerrarlo
+export function conectarEventos(
+  onEvento: (evento: EventoServidor) => void,
+  onEstado?: (conectado: boolean) => void
+): () => void {
+  const token = localStorage.getItem('token')
+  if (!token || typeof EventSource === 'undefined') {
+    return () => {}
+  }
+
+  const url = `${api.defaults.baseURL}/api/eventos/stream?token=${encodeURIComponent(token)}`
+  const fuente = new EventSource(url)
+
+  TIPOS.forEach((tipo) => {
+    fuente.addEventListener(tipo, (mensaje) => {
+      try {
+        onEvento(JSON.parse((mensaje as MessageEvent).data))
+      } catch (error) {
+        console.error('Evento inválido del servidor:', error)
+      }
+    })
+  })
+  fuente.onopen = () => onEstado?.(true)
+  // EventSource reintenta solo; mientras tanto se vuelve a consultar periódicamente
+  fuente.onerror = () => onEstado?.(false)
+
+  return () => fuente.close()
+}
@@ -1,10 +1,9 @@
-import api from './api'
+import api, { obtenerTodas } from './api'
 import { Prestamo } from '../types'
 
 export const prestamosService = {
   getAll: async (params?: { obra?: string; estado?: string }) => {
-    const { data } = await api.get<Prestamo[]>('/api/prestamos/', { params })
-    return data
+    return obtenerTodas<Prestamo>('/api/prestamos/', params)
   },
   
   getByRut: async (rut: string) => {
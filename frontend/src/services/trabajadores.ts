@@ -1,10 +1,9 @@
-import api from './api'
+import api, { obtenerTodas } from './api'
 import { Trabajador } from '../types'
 
 export const trabajadoresService = {
   getAll: async (params?: { obra?: string; activo?: boolean }) => {
-    const { data } = await api.get<Trabajador[]>('/api/trabajadores/', { params })
-    return data
+    return obtenerTodas<Trabajador>('/api/trabajadores/', params)
   },
   
   getByRut: async (rut: string) => {
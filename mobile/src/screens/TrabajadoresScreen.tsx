@@ -198,7 +198,7 @@ export default function TrabajadoresScreen() {
     setShowEquiposModal(true);
   };
 
-  const prestamosActivos = prestamos.filter((p: any) => p.estado_prestamo === 'ASIGNADO');
+  const prestamosActivos = prestamos.filter((p: any) => p.estado_prestamo === 'ASIGNADO' || p.estado_prestamo === 'VENCIDO');
   const prestamosDevueltos = prestamos.filter((p: any) => p.estado_prestamo === 'DEVUELTO');
 
   useEffect(() => {
@@ -201,3 +201,18 @@ class ApiService {
 export const apiService = new ApiService();
 export default apiService.instance;
 
+// Filas por página al recorrer un listado completo (máximo del backend)
+const LIMITE_PAGINA = 500;
+
+// Recorre un listado paginado siguiendo la cabecera X-Next-Cursor y retorna todas las filas
+export async function obtenerTodas<T>(url: string, params?: object): Promise<T[]> {
+  const filas: T[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await apiService.instance.get<T[]>(url, { params: { ...params, limit: LIMITE_PAGINA, cursor } });
+    filas.push(...response.data);
+    cursor = response.headers['x-next-cursor'] || undefined;
+  } while (cursor);
+  return filas;
+}
+
@@ -1,4 +1,4 @@
-import api from './api';
+import api, { obtenerTodas } from './api';
 import * as FileSystem from 'expo-file-system';
 import * as Sharing from 'expo-sharing';
 
@@ -29,8 +29,7 @@ export const equiposService = {
     if (filters?.obra) params.obra = filters.obra;
     if (filters?.serie) params.serie = filters.serie;
 
-    const response = await api.get<Equipo[]>('/api/equipos/', { params });
-    return response.data;
+    return obtenerTodas<Equipo>('/api/equipos/', params);
   },
 
   async getById(id: number): Promise<Equipo> {
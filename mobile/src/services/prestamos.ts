@@ -1,4 +1,4 @@
-import api from './api';
+import api, { obtenerTodas } from './api';
 
 export interface PrestamoCreate {
   equipo_id: number;
@@ -48,8 +48,7 @@ export const prestamosService = {
     const params: any = {};
     if (filters?.estado) params.estado = filters.estado;
 
-    const response = await api.get('/api/prestamos/', { params });
-    return response.data;
+    return obtenerTodas<any>('/api/prestamos/', params);
   },
 };
 
@@ -1,4 +1,4 @@
-import api from './api';
+import api, { obtenerTodas } from './api';
 
 export interface Trabajador {
   rut: string;
@@ -16,8 +16,7 @@ export const trabajadoresService = {
     if (filters?.obra) params.obra = filters.obra;
     if (filters?.activo !== undefined) params.activo = filters.activo;
 
-    const response = await api.get<Trabajador[]>('/api/trabajadores/', { params });
-    return response.data;
+    return obtenerTodas<Trabajador>('/api/trabajadores/', params);
   },
 
   async getByRut(rut: string): Promise<Trabajador> {